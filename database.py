@@ -1,11 +1,13 @@
 import sqlite3
 import os
 
+from database.connection import get_connection
+from database.migrations import migrate
+
 DB_PATH = os.path.join("database", "users.db")
 
-def initialize_database():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+def _create_tables(cursor):
+    """Version 1: the table as it was before versioned migrations."""
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS users (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -15,42 +17,46 @@ def initialize_database():
             password TEXT NOT NULL
         )
     """)
-    conn.commit()
-    conn.close()
+
+# Applied in order, each once per database; append new versions, never edit applied ones.
+# The UNIQUE constraints already index every column users are looked up by.
+MIGRATIONS = [
+    (1, "Create tables", _create_tables),
+]
+
+def initialize_database():
+    migrate(get_connection(DB_PATH), MIGRATIONS)
 
 initialize_database()
 
 def register_user(username, email, phone, password_hash):
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection(DB_PATH)
         cursor = conn.cursor()
         cursor.execute(
             "INSERT INTO users (username, email, phone, password) VALUES (?, ?, ?, ?)",
             (username, email, phone, password_hash)
         )
         conn.commit()
-        conn.close()
         return True
     except sqlite3.IntegrityError:
         return False
 
 def get_user_by_identifier(identifier):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection(DB_PATH)
     cursor = conn.cursor()
     cursor.execute(
         "SELECT * FROM users WHERE username = ? OR email = ? OR phone = ?",
         (identifier, identifier, identifier)
     )
     user = cursor.fetchone()
-    conn.close()
     return user
 
 def update_password(identifier, new_password_hash):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection(DB_PATH)
     cursor = conn.cursor()
     cursor.execute(
         "UPDATE users SET password = ? WHERE username = ? OR email = ? OR phone = ?",
         (new_password_hash, identifier, identifier, identifier)
     )
     conn.commit()
-    conn.close()
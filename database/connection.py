@@ -0,0 +1,75 @@
+import sqlite3
+import threading
+
+# Settings applied to every connection
+BUSY_TIMEOUT_MS = 5000  # Wait this long for another connection's write lock instead of failing
+CACHE_SIZE_KIB = 8192  # Page cache per connection
+MMAP_SIZE = 64 * 1024 ** 2  # Read the database through a memory map up to this size
+CACHED_STATEMENTS = 256  # Prepared statements kept per connection, keyed by SQL text
+
+_local = threading.local()
+_registry = {}  # thread -> {path: connection}, so connections can be closed at shutdown
+_registry_lock = threading.Lock()
+_generation = 0  # Bumped by close_connections(); threads holding older connections reopen
+
+
+def _open(path):
+    conn = sqlite3.connect(
+        path, timeout=BUSY_TIMEOUT_MS / 1000, cached_statements=CACHED_STATEMENTS,
+        check_same_thread=False  # Only ever used by its own thread; closed from others at shutdown
+    )
+    # WAL lets readers run alongside the writer; with synchronous=NORMAL a commit appends
+    # to the log without an fsync (the log is synced at checkpoints), which is still safe
+    # against corruption and only risks the last commits on power loss
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KIB}")
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+def _prune_locked():
+    """Close the connections of threads that have exited."""
+    for thread in [thread for thread in _registry if not thread.is_alive()]:
+        for conn in _registry.pop(thread).values():
+            conn.close()
+
+
+def get_connection(path):
+    """
+    Return this thread's long-lived connection to the database at path, opening and
+    configuring it on first use. Callers commit but never close it. Work a previous
+    call on this thread left uncommitted (because it raised) is rolled back first.
+    """
+    path = str(path)
+    connections = getattr(_local, "connections", None)
+    if connections is None or _local.generation != _generation:
+        connections = _local.connections = {}
+        _local.generation = _generation
+    conn = connections.get(path)
+    if conn is None:
+        conn = _open(path)
+        connections[path] = conn
+        with _registry_lock:
+            _prune_locked()
+            _registry.setdefault(threading.current_thread(), {})[path] = conn
+    elif conn.in_transaction:
+        conn.rollback()
+    return conn
+
+
+def close_connections():
+    """Close every connection (on application shutdown); later calls reopen lazily."""
+    global _generation
+    with _registry_lock:
+        registry = list(_registry.items())
+        _registry.clear()
+        _generation += 1
+    for thread, connections in registry:
+        for conn in connections.values():
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                print(f"Error closing database connection: {str(e)}")
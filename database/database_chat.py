@@ -5,16 +5,16 @@ import datetime
 import uuid
 from pathlib import Path
 
+from .connection import get_connection
+from .migrations import add_column, epoch_ms, iso_to_epoch_ms, migrate
+
 # Ensure database directory exists
 DB_DIR = Path("database")
 DB_DIR.mkdir(exist_ok=True)
 DB_PATH = DB_DIR / "chatdata.db"
 
-def init_db():
-    """Initialize the database with necessary tables for chat persistence"""
-    conn = sqlite3.connect(str(DB_PATH))
-    cursor = conn.cursor()
-    
+def _create_tables(cursor):
+    """Version 1: the tables as they were before versioned migrations, patched up in place."""
     # Create chats table
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS chats (
@@ -26,7 +26,7 @@ def init_db():
         updated_at TEXT NOT NULL
     )
     ''')
-    
+
     # Create messages table
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS messages (
@@ -38,7 +38,7 @@ def init_db():
         FOREIGN KEY (chat_id) REFERENCES chats (id) ON DELETE CASCADE
     )
     ''')
-    
+
     # Create usage_logs table
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS usage_logs (
@@ -49,7 +49,7 @@ def init_db():
         timestamp TEXT NOT NULL
     )
     ''')
-    
+
     # Create users table
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS users (
@@ -72,9 +72,89 @@ def init_db():
         FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
     )
     ''')
-    
-    conn.commit()
-    conn.close()
+
+    # Create chat_summaries table (rolling summary of a chat's older turns)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS chat_summaries (
+        chat_id TEXT PRIMARY KEY,
+        summary TEXT NOT NULL,
+        covered_messages INTEGER NOT NULL,
+        last_covered_id INTEGER,
+        token_count INTEGER,
+        model TEXT NOT NULL,
+        updated_at TEXT NOT NULL,
+        FOREIGN KEY (chat_id) REFERENCES chats (id) ON DELETE CASCADE
+    )
+    ''')
+
+    # Columns added to earlier versions of the tables
+    add_column(cursor, "users", "phone", "TEXT")
+    # Token counts for context budgeting
+    add_column(cursor, "messages", "token_count", "INTEGER")
+    # Reasoning traces (<think> blocks) are kept apart from the answer text
+    add_column(cursor, "messages", "reasoning", "TEXT")
+    # Messages form a tree (edits and regenerations branch off); NULL marks a root.
+    # Existing chats are linear, so each message's parent is the one before it.
+    if add_column(cursor, "messages", "parent_id", "INTEGER"):
+        cursor.execute('''
+        UPDATE messages SET parent_id = (
+            SELECT MAX(previous.id) FROM messages AS previous
+            WHERE previous.chat_id = messages.chat_id AND previous.id < messages.id
+        )
+        ''')
+    # The model that actually answered (the router may pick another than the chat's)
+    add_column(cursor, "messages", "model", "TEXT")
+    # The leaf of the branch a chat currently shows
+    add_column(cursor, "chats", "active_message_id", "INTEGER")
+    add_column(cursor, "chat_summaries", "last_covered_id", "INTEGER")
+
+
+def _epoch_timestamps(cursor):
+    """
+    Version 2: integer epoch-millisecond copies of the timestamps that queries sort and
+    filter on. The ISO TEXT columns stay for display and export.
+    """
+    for table, text_column, ms_column in EPOCH_COLUMNS:
+        add_column(cursor, table, ms_column, "INTEGER")
+        cursor.execute(
+            f"UPDATE {table} SET {ms_column} = {iso_to_epoch_ms(text_column)} WHERE {ms_column} IS NULL"
+        )
+
+
+def _create_indexes(cursor):
+    """Version 3: indexes for the per-chat and per-user lookups."""
+    # Loading a chat; the second index also covers the usage statistics counts
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_chat ON messages (chat_id, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_chat_time ON messages (chat_id, timestamp_ms, role)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_chats_user_updated ON chats (user_id, updated_ms)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_usage_logs_user_time ON usage_logs (user_id, timestamp_ms)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_documents_user_uploaded ON documents (user_id, uploaded_ms)")
+    # Sign-up and sign-in look users up by these
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_username ON users (username)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_email ON users (email)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_phone ON users (phone)")
+
+
+# (table, ISO text column, epoch-millisecond column)
+EPOCH_COLUMNS = [
+    ("chats", "created_at", "created_ms"),
+    ("chats", "updated_at", "updated_ms"),
+    ("messages", "timestamp", "timestamp_ms"),
+    ("usage_logs", "timestamp", "timestamp_ms"),
+    ("documents", "uploaded_at", "uploaded_ms"),
+]
+
+# Applied in order, each once per database; append new versions, never edit applied ones
+MIGRATIONS = [
+    (1, "Create tables", _create_tables),
+    (2, "Integer epoch timestamps", _epoch_timestamps),
+    (3, "Per-chat and per-user indexes", _create_indexes),
+]
+
+
+def init_db():
+    """Initialize the database with necessary tables for chat persistence"""
+    migrate(get_connection(DB_PATH), MIGRATIONS)
 
 
 # Initialize database on import
@@ -82,20 +162,25 @@ init_db()
 
 # ------------------- Logging -------------------
 
-def log_user_action(user_id, action, details=None):
-    """Log user actions for tracking usage."""
-    conn = sqlite3.connect(str(DB_PATH))
-    cursor = conn.cursor()
-    
+def log_user_action(user_id, action, details=None, cursor=None):
+    """
+    Log user actions for tracking usage. Pass the cursor of a write in progress to
+    record the entry in the same transaction (the caller commits).
+    """
     timestamp = datetime.datetime.now().isoformat()
     
-    cursor.execute(
-        "INSERT INTO usage_logs (user_id, action, details, timestamp) VALUES (?, ?, ?, ?)",
-        (user_id, action, details, timestamp)
-    )
-    
-    conn.commit()
-    conn.close()
+    if cursor is None:
+        conn = get_connection(DB_PATH)
+        conn.execute(
+            "INSERT INTO usage_logs (user_id, action, details, timestamp, timestamp_ms) VALUES (?, ?, ?, ?, ?)",
+            (user_id, action, details, timestamp, epoch_ms())
+        )
+        conn.commit()
+    else:
+        cursor.execute(
+            "INSERT INTO usage_logs (user_id, action, details, timestamp, timestamp_ms) VALUES (?, ?, ?, ?, ?)",
+            (user_id, action, details, timestamp, epoch_ms())
+        )
     
     # Also write to log file for easier viewing
     log_dir = Path("logs")
@@ -112,7 +197,7 @@ def add_phone_column_to_users():
     """
     Add the 'phone' column to the 'users' table if it doesn't already exist.
     """
-    conn = sqlite3.connect(str(DB_PATH))
+    conn = get_connection(DB_PATH)
     cursor = conn.cursor()
 
     # Check if the 'phone' column exists
@@ -124,38 +209,38 @@ def add_phone_column_to_users():
         conn.commit()
         print("Added 'phone' column to 'users' table.")
 
-    conn.close()
 
 # ------------------- Chat Management -------------------
 
 def create_chat(user_id, chat_id, chat_name, model="mistral:7b"):
     """Create a new chat session in the database"""
-    conn = sqlite3.connect(str(DB_PATH))
+    conn = get_connection(DB_PATH)
     cursor = conn.cursor()
     
     timestamp = datetime.datetime.now().isoformat()
+    timestamp_ms = epoch_ms()
     
     cursor.execute(
-        "INSERT INTO chats (id, user_id, name, model, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
-        (chat_id, user_id, chat_name, model, timestamp, timestamp)
+        "INSERT INTO chats (id, user_id, name, model, created_at, updated_at, created_ms, updated_ms) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (chat_id, user_id, chat_name, model, timestamp, timestamp, timestamp_ms, timestamp_ms)
     )
     
     conn.commit()
-    conn.close()
     
     log_user_action(user_id, "Created chat", f"Chat: {chat_name}, Model: {model}")
     return chat_id
 
 def update_chat_name(chat_id, new_name):
     """Update the name of an existing chat"""
-    conn = sqlite3.connect(str(DB_PATH))
+    conn = get_connection(DB_PATH)
     cursor = conn.cursor()
     
     timestamp = datetime.datetime.now().isoformat()
     
     cursor.execute(
-        "UPDATE chats SET name = ?, updated_at = ? WHERE id = ?",
-        (new_name, timestamp, chat_id)
+        "UPDATE chats SET name = ?, updated_at = ?, updated_ms = ? WHERE id = ?",
+        (new_name, timestamp, epoch_ms(), chat_id)
     )
     
     # Get user_id for logging
@@ -163,21 +248,20 @@ def update_chat_name(chat_id, new_name):
     user_id = cursor.fetchone()[0]
     
     conn.commit()
-    conn.close()
     
     log_user_action(user_id, "Renamed chat", f"Chat ID: {chat_id}, New name: {new_name}")
     return True
 
 def update_chat_model(chat_id, new_model):
     """Update the model of an existing chat"""
-    conn = sqlite3.connect(str(DB_PATH))
+    conn = get_connection(DB_PATH)
     cursor = conn.cursor()
     
     timestamp = datetime.datetime.now().isoformat()
     
     cursor.execute(
-        "UPDATE chats SET model = ?, updated_at = ? WHERE id = ?",
-        (new_model, timestamp, chat_id)
+        "UPDATE chats SET model = ?, updated_at = ?, updated_ms = ? WHERE id = ?",
+        (new_model, timestamp, epoch_ms(), chat_id)
     )
     
     # Get user_id for logging
@@ -185,14 +269,13 @@ def update_chat_model(chat_id, new_model):
     user_id = cursor.fetchone()[0]
     
     conn.commit()
-    conn.close()
     
     log_user_action(user_id, "Changed chat model", f"Chat ID: {chat_id}, New model: {new_model}")
     return True
 
 def delete_chat(chat_id):
     """Delete a chat and all its messages"""
-    conn = sqlite3.connect(str(DB_PATH))
+    conn = get_connection(DB_PATH)
     cursor = conn.cursor()
     
     # Get user_id for logging before deletion
@@ -200,16 +283,15 @@ def delete_chat(chat_id):
     result = cursor.fetchone()
     
     if not result:
-        conn.close()
         return False
         
     user_id, chat_name = result
     
     # Delete the chat (messages will cascade delete)
     cursor.execute("DELETE FROM chats WHERE id = ?", (chat_id,))
+    cursor.execute("DELETE FROM chat_summaries WHERE chat_id = ?", (chat_id,))
     
     conn.commit()
-    conn.close()
     
     log_user_action(user_id, "Deleted chat", f"Chat: {chat_name} (ID: {chat_id})")
     return True
@@ -219,62 +301,72 @@ def delete_chat(chat_id):
 
 def get_chats_by_user(user_id):
     """Get all chats for a specific user"""
-    conn = sqlite3.connect(str(DB_PATH))
-    conn.row_factory = sqlite3.Row  # Return rows as dictionaries
+    conn = get_connection(DB_PATH)
     cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row  # Return rows as dictionaries
     
     cursor.execute(
-        "SELECT id, name, model, created_at, updated_at FROM chats WHERE user_id = ? ORDER BY updated_at DESC",
+        "SELECT id, name, model, created_at, updated_at FROM chats WHERE user_id = ? ORDER BY updated_ms DESC",
         (user_id,)
     )
     
     chats = [dict(row) for row in cursor.fetchall()]
-    conn.close()
     
     log_user_action(user_id, "Loaded chats", f"Found {len(chats)} chats")
     return chats
 
 # ------------------- Message Management -------------------
 
-def insert_message(chat_id, role, content):
-    """Insert a new message into the database"""
-    conn = sqlite3.connect(str(DB_PATH))
+def insert_message(chat_id, role, content, token_count=None, reasoning=None, parent_id=None, model=None):
+    """
+    Insert a new message into the database as a child of parent_id (None for the first
+    message) and make it the chat's active branch. model records which model wrote a
+    reply. Returns the new message id.
+    """
+    conn = get_connection(DB_PATH)
     cursor = conn.cursor()
     
     timestamp = datetime.datetime.now().isoformat()
+    timestamp_ms = epoch_ms()
     
     cursor.execute(
-        "INSERT INTO messages (chat_id, role, content, timestamp) VALUES (?, ?, ?, ?)",
-        (chat_id, role, content, timestamp)
+        "INSERT INTO messages "
+        "(chat_id, role, content, timestamp, timestamp_ms, token_count, reasoning, parent_id, model) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (chat_id, role, content, timestamp, timestamp_ms, token_count, reasoning, parent_id, model)
     )
+    message_id = cursor.lastrowid
     
-    # Update the chat's updated_at timestamp
+    # Update the chat's updated_at timestamp and active branch
     cursor.execute(
-        "UPDATE chats SET updated_at = ? WHERE id = ?",
-        (timestamp, chat_id)
+        "UPDATE chats SET updated_at = ?, updated_ms = ?, active_message_id = ? WHERE id = ?",
+        (timestamp, timestamp_ms, message_id, chat_id)
     )
     
     # Get user_id for logging
     cursor.execute("SELECT user_id FROM chats WHERE id = ?", (chat_id,))
     user_id = cursor.fetchone()[0]
     
-    conn.commit()
-    conn.close()
-    
+    # Logged in the same transaction, so sending a message costs a single commit
     role_type = "user" if role == "user" else "assistant"
     content_preview = content[:30] + "..." if len(content) > 30 else content
-    log_user_action(user_id, f"Added {role_type} message", f"Chat ID: {chat_id}, Content: {content_preview}")
+    log_user_action(
+        user_id, f"Added {role_type} message", f"Chat ID: {chat_id}, Content: {content_preview}", cursor=cursor
+    )
     
-    return True
+    conn.commit()
+    
+    return message_id
 
 def get_messages(chat_id):
     """Get all messages for a specific chat"""
-    conn = sqlite3.connect(str(DB_PATH))
-    conn.row_factory = sqlite3.Row
+    conn = get_connection(DB_PATH)
     cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
     
     cursor.execute(
-        "SELECT role, content, timestamp FROM messages WHERE chat_id = ? ORDER BY id ASC",
+        "SELECT id, parent_id, role, content, timestamp, token_count, reasoning, model FROM messages "
+        "WHERE chat_id = ? ORDER BY id ASC",
         (chat_id,)
     )
     
@@ -285,31 +377,94 @@ def get_messages(chat_id):
     result = cursor.fetchone()
     user_id = result["user_id"] if result else "unknown"
     
-    conn.close()
-    
     log_user_action(user_id, "Retrieved messages", f"Chat ID: {chat_id}, Count: {len(messages)}")
     return messages
 
+def get_active_message(chat_id):
+    """Get the id of the last message on the chat's active branch (None if not recorded)"""
+    conn = get_connection(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("SELECT active_message_id FROM chats WHERE id = ?", (chat_id,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def set_active_message(chat_id, message_id):
+    """Switch the chat's active branch to the one ending at message_id"""
+    conn = get_connection(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("UPDATE chats SET active_message_id = ? WHERE id = ?", (message_id, chat_id))
+    conn.commit()
+    return True
+
+# ------------------- Chat Summaries -------------------
+
+def get_chat_summary(chat_id):
+    """
+    Get the rolling summary of a chat's older turns, or None if it has none yet.
+    covered_messages is how many of the chat's first messages the summary replaces.
+    """
+    conn = get_connection(DB_PATH)
+    cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
+
+    cursor.execute(
+        "SELECT summary, covered_messages, last_covered_id, token_count, model, updated_at "
+        "FROM chat_summaries WHERE chat_id = ?",
+        (chat_id,)
+    )
+    row = cursor.fetchone()
+    return dict(row) if row else None
+
+def save_chat_summary(chat_id, summary, covered_messages, token_count, model, last_covered_id=None):
+    """Insert or replace the rolling summary of a chat"""
+    conn = get_connection(DB_PATH)
+    cursor = conn.cursor()
+
+    timestamp = datetime.datetime.now().isoformat()
+
+    cursor.execute(
+        "INSERT OR REPLACE INTO chat_summaries "
+        "(chat_id, summary, covered_messages, last_covered_id, token_count, model, updated_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (chat_id, summary, covered_messages, last_covered_id, token_count, model, timestamp)
+    )
+
+    conn.commit()
+    return True
+
 def export_chat(chat_id, format="txt"):
     """
     Export a chat to a file format (txt or json).
     """
-    conn = sqlite3.connect(str(DB_PATH))
-    conn.row_factory = sqlite3.Row
+    conn = get_connection(DB_PATH)
     cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
 
     # Get chat info
-    cursor.execute("SELECT user_id, name, model FROM chats WHERE id = ?", (chat_id,))
+    cursor.execute("SELECT user_id, name, model, active_message_id FROM chats WHERE id = ?", (chat_id,))
     chat_info = dict(cursor.fetchone())
 
-    # Get messages
-    cursor.execute(
-        "SELECT role, content, timestamp FROM messages WHERE chat_id = ? ORDER BY id ASC",
-        (chat_id,)
-    )
+    # Get messages (the active branch when the chat has edits or regenerations)
+    if chat_info["active_message_id"] is not None:
+        cursor.execute(
+            """
+            WITH RECURSIVE branch(id) AS (
+                SELECT ?
+                UNION ALL
+                SELECT messages.parent_id FROM messages JOIN branch ON messages.id = branch.id
+                WHERE messages.parent_id IS NOT NULL
+            )
+            SELECT role, content, timestamp, model FROM messages WHERE id IN branch ORDER BY id ASC
+            """,
+            (chat_info["active_message_id"],)
+        )
+    else:
+        cursor.execute(
+            "SELECT role, content, timestamp, model FROM messages WHERE chat_id = ? ORDER BY id ASC",
+            (chat_id,)
+        )
     messages = [dict(row) for row in cursor.fetchall()]
 
-    conn.close()
 
     # Create export directory if it doesn't exist
     export_dir = Path(f"user_documents/{chat_info['user_id']}/exports")
@@ -352,47 +507,46 @@ def export_chat(chat_id, format="txt"):
 
 def get_usage_statistics(user_id, days=30):
     """Get usage statistics for a user over the past X days"""
-    conn = sqlite3.connect(str(DB_PATH))
+    conn = get_connection(DB_PATH)
     cursor = conn.cursor()
     
     # Calculate date threshold
-    threshold_date = (datetime.datetime.now() - datetime.timedelta(days=days)).isoformat()
+    threshold_ms = epoch_ms() - days * 24 * 60 * 60 * 1000
     
     # Get message counts
     cursor.execute("""
         SELECT COUNT(*) as count FROM messages m
         JOIN chats c ON m.chat_id = c.id
-        WHERE c.user_id = ? AND m.role = 'user' AND m.timestamp >= ?
-    """, (user_id, threshold_date))
+        WHERE c.user_id = ? AND m.role = 'user' AND m.timestamp_ms >= ?
+    """, (user_id, threshold_ms))
     user_messages = cursor.fetchone()[0]
     
     cursor.execute("""
         SELECT COUNT(*) as count FROM messages m
         JOIN chats c ON m.chat_id = c.id
-        WHERE c.user_id = ? AND m.role = 'assistant' AND m.timestamp >= ?
-    """, (user_id, threshold_date))
+        WHERE c.user_id = ? AND m.role = 'assistant' AND m.timestamp_ms >= ?
+    """, (user_id, threshold_ms))
     assistant_messages = cursor.fetchone()[0]
     
     # Get model usage
     cursor.execute("""
-        SELECT model, COUNT(*) as count FROM messages m
+        SELECT COALESCE(m.model, c.model) as model, COUNT(*) as count FROM messages m
         JOIN chats c ON m.chat_id = c.id
-        WHERE c.user_id = ? AND m.role = 'assistant' AND m.timestamp >= ?
-        GROUP BY model
-    """, (user_id, threshold_date))
+        WHERE c.user_id = ? AND m.role = 'assistant' AND m.timestamp_ms >= ?
+        GROUP BY COALESCE(m.model, c.model)
+    """, (user_id, threshold_ms))
     model_usage = {row[0]: row[1] for row in cursor.fetchall()}
     
     # Get daily usage
     cursor.execute("""
-        SELECT substr(m.timestamp, 1, 10) as day, COUNT(*) as count FROM messages m
+        SELECT date(m.timestamp_ms / 1000, 'unixepoch', 'localtime') as day, COUNT(*) as count FROM messages m
         JOIN chats c ON m.chat_id = c.id
-        WHERE c.user_id = ? AND m.timestamp >= ?
+        WHERE c.user_id = ? AND m.timestamp_ms >= ?
         GROUP BY day
         ORDER BY day ASC
-    """, (user_id, threshold_date))
+    """, (user_id, threshold_ms))
     daily_usage = {row[0]: row[1] for row in cursor.fetchall()}
     
-    conn.close()
     
     stats = {
         "user_messages": user_messages,
@@ -410,13 +564,12 @@ def register_user(username, email, phone, password):
     """
     Register a new user in the database.
     """
-    conn = sqlite3.connect(str(DB_PATH))
+    conn = get_connection(DB_PATH)
     cursor = conn.cursor()
 
     # Check if the user already exists
     cursor.execute("SELECT * FROM users WHERE email = ? OR phone = ?", (email, phone))
     if cursor.fetchone():
-        conn.close()
         raise ValueError("A user with this email or phone number already exists.")
 
     # Insert the new user
@@ -428,7 +581,6 @@ def register_user(username, email, phone, password):
     )
 
     conn.commit()
-    conn.close()
     return user_id
 
 
@@ -436,16 +588,15 @@ def get_user_by_identifier(identifier):
     """
     Retrieve a user by username or email.
     """
-    conn = sqlite3.connect(str(DB_PATH))
-    conn.row_factory = sqlite3.Row  # This ensures the result is a dictionary-like object
+    conn = get_connection(DB_PATH)
     cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row  # This ensures the result is a dictionary-like object
 
     cursor.execute(
         "SELECT * FROM users WHERE username = ? OR email = ?",
         (identifier, identifier)
     )
     user = cursor.fetchone()
-    conn.close()
 
     if user:
         return dict(user)  # Convert to a dictionary
@@ -456,7 +607,7 @@ def update_password(user_id, new_password):
     """
     Update the password for a specific user.
     """
-    conn = sqlite3.connect(str(DB_PATH))
+    conn = get_connection(DB_PATH)
     cursor = conn.cursor()
 
     cursor.execute(
@@ -465,19 +616,17 @@ def update_password(user_id, new_password):
     )
 
     conn.commit()
-    conn.close()
     return True
 
 def get_user_table_info():
     """
     Retrieve information about the 'users' table.
     """
-    conn = sqlite3.connect(str(DB_PATH))
+    conn = get_connection(DB_PATH)
     cursor = conn.cursor()
 
     cursor.execute("PRAGMA table_info(users)")
     table_info = cursor.fetchall()
-    conn.close()
 
     return table_info
 
@@ -485,55 +634,51 @@ def get_user_table_info():
 
 def upload_document(user_id, document_name, document_path):
     """Upload a document and save its metadata in the database."""
-    conn = sqlite3.connect(str(DB_PATH))
+    conn = get_connection(DB_PATH)
     cursor = conn.cursor()
     
     document_id = str(uuid.uuid4())
     timestamp = datetime.datetime.now().isoformat()
     
     cursor.execute(
-        "INSERT INTO documents (id, user_id, name, path, uploaded_at) VALUES (?, ?, ?, ?, ?)",
-        (document_id, user_id, document_name, document_path, timestamp)
+        "INSERT INTO documents (id, user_id, name, path, uploaded_at, uploaded_ms) VALUES (?, ?, ?, ?, ?, ?)",
+        (document_id, user_id, document_name, document_path, timestamp, epoch_ms())
     )
     
     conn.commit()
-    conn.close()
     
     log_user_action(user_id, "Uploaded document", f"Document: {document_name}")
     return document_id
 
 def list_documents(user_id):
     """List all documents uploaded by a specific user."""
-    conn = sqlite3.connect(str(DB_PATH))
-    conn.row_factory = sqlite3.Row
+    conn = get_connection(DB_PATH)
     cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
     
     cursor.execute(
-        "SELECT id, name, path, uploaded_at FROM documents WHERE user_id = ? ORDER BY uploaded_at DESC",
+        "SELECT id, name, path, uploaded_at FROM documents WHERE user_id = ? ORDER BY uploaded_ms DESC",
         (user_id,)
     )
     
     documents = [dict(row) for row in cursor.fetchall()]
-    conn.close()
     return documents
 
 def delete_document(document_id):
     """Delete a document from the database."""
-    conn = sqlite3.connect(str(DB_PATH))
+    conn = get_connection(DB_PATH)
     cursor = conn.cursor()
     
     cursor.execute("SELECT user_id, name FROM documents WHERE id = ?", (document_id,))
     result = cursor.fetchone()
     
     if not result:
-        conn.close()
         return False
     
     user_id, document_name = result
     
     cursor.execute("DELETE FROM documents WHERE id = ?", (document_id,))
     conn.commit()
-    conn.close()
     
     log_user_action(user_id, "Deleted document", f"Document: {document_name}")
     return True
\ No newline at end of file
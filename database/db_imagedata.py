@@ -1,17 +1,17 @@
-import sqlite3
 import datetime
 import uuid
 from pathlib import Path
 
+from .connection import get_connection
+from .migrations import add_column, epoch_ms, iso_to_epoch_ms, migrate
+
 # Ensure database directory exists
 DB_DIR = Path("database")
 DB_DIR.mkdir(exist_ok=True)
 DB_PATH = DB_DIR / "imagedata.db"
 
-def init_image_db():
-    """Initialize the database table for text-to-image history."""
-    conn = sqlite3.connect(str(DB_PATH))
-    cursor = conn.cursor()
+def _create_tables(cursor):
+    """Version 1: the table as it was before versioned migrations."""
     # Create the table if it doesn't exist
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS image_history (
@@ -22,13 +22,27 @@ def init_image_db():
             timestamp TEXT NOT NULL
         )
     ''')
-    # Check if the user_id column exists, and add it if it doesn't
-    cursor.execute("PRAGMA table_info(image_history)")
-    columns = [column[1] for column in cursor.fetchall()]
-    if "user_id" not in columns:
-        cursor.execute("ALTER TABLE image_history ADD COLUMN user_id TEXT NOT NULL DEFAULT ''")
-    conn.commit()
-    conn.close()
+    add_column(cursor, "image_history", "user_id", "TEXT NOT NULL DEFAULT ''")
+
+def _epoch_timestamps(cursor):
+    """Version 2: an integer epoch-millisecond timestamp to sort by, indexed per user."""
+    add_column(cursor, "image_history", "timestamp_ms", "INTEGER")
+    cursor.execute(
+        f"UPDATE image_history SET timestamp_ms = {iso_to_epoch_ms('timestamp')} WHERE timestamp_ms IS NULL"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_image_history_user_time ON image_history (user_id, timestamp_ms)"
+    )
+
+# Applied in order, each once per database; append new versions, never edit applied ones
+MIGRATIONS = [
+    (1, "Create tables", _create_tables),
+    (2, "Integer epoch timestamps", _epoch_timestamps),
+]
+
+def init_image_db():
+    """Initialize the database table for text-to-image history."""
+    migrate(get_connection(DB_PATH), MIGRATIONS)
 
 init_image_db()
 
@@ -36,38 +50,36 @@ def insert_image_history(user_id, prompt, image_path):
     """
     Insert a new image generation record into the database.
     """
-    conn = sqlite3.connect(str(DB_PATH))
+    conn = get_connection(DB_PATH)
     cursor = conn.cursor()
     cursor.execute(
-        "INSERT INTO image_history (id, user_id, prompt, image_path, timestamp) VALUES (?, ?, ?, ?, ?)",
-        (str(uuid.uuid4()), user_id, prompt, image_path, datetime.datetime.now().isoformat())
+        "INSERT INTO image_history (id, user_id, prompt, image_path, timestamp, timestamp_ms) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        (str(uuid.uuid4()), user_id, prompt, image_path, datetime.datetime.now().isoformat(), epoch_ms())
     )
     conn.commit()
-    conn.close()
 
 def get_image_history(user_id):
     """
     Retrieve image generation history for the specified user.
     """
-    conn = sqlite3.connect(str(DB_PATH))
+    conn = get_connection(DB_PATH)
     cursor = conn.cursor()
     cursor.execute(
-        "SELECT prompt, image_path FROM image_history WHERE user_id = ?",
+        "SELECT prompt, image_path FROM image_history WHERE user_id = ? ORDER BY timestamp_ms",
         (user_id,)
     )
     records = [{"prompt": row[0], "image_path": row[1]} for row in cursor.fetchall()]
-    conn.close()
     return records
 
 def delete_image_history(user_id, prompt):
     """
     Delete an image generation record from the database for the specified user and prompt.
     """
-    conn = sqlite3.connect(str(DB_PATH))
+    conn = get_connection(DB_PATH)
     cursor = conn.cursor()
     cursor.execute(
         "DELETE FROM image_history WHERE user_id = ? AND prompt = ?",
         (user_id, prompt)
     )
     conn.commit()
-    conn.close()
@@ -0,0 +1,67 @@
+import time
+
+
+def epoch_ms():
+    """Current time as integer milliseconds since the epoch, as stored in the *_ms columns."""
+    return int(time.time() * 1000)
+
+
+def iso_to_epoch_ms(column):
+    """
+    SQL expression converting a local-time ISO-8601 TEXT column (as written by
+    datetime.now().isoformat()) to epoch milliseconds, for backfilling.
+    """
+    return f"CAST(ROUND((julianday({column}, 'utc') - 2440587.5) * 86400000) AS INTEGER)"
+
+
+def add_column(cursor, table, column, declaration):
+    """Add a column unless the table already has it. Returns whether it was added."""
+    cursor.execute(f"PRAGMA table_info({table})")
+    if column in [row[1] for row in cursor.fetchall()]:
+        return False
+    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+    return True
+
+
+def migrate(conn, migrations):
+    """
+    Bring a database up to date. migrations is a list of (version, description,
+    apply) in ascending version order; apply(cursor) runs once per database, in its
+    own transaction together with recording the version in schema_version, so a
+    failed migration leaves the schema as it was and is retried at the next start.
+    Returns the database's schema version.
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        description TEXT NOT NULL,
+        applied_at INTEGER NOT NULL
+    )
+    ''')
+    conn.commit()
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    current = cursor.fetchone()[0]
+
+    for version, description, apply in migrations:
+        if version <= current:
+            continue
+        # The sqlite3 module doesn't open transactions for DDL, so start one explicitly
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have migrated since the version was read
+            cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+            if cursor.fetchone()[0] >= version:
+                conn.rollback()
+                continue
+            apply(cursor)
+            cursor.execute(
+                "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                (version, description, epoch_ms())
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        current = version
+    return current
@@ -1,6 +1,24 @@
-import requests
+import os
+import threading
 
-def query_model(model_key, conversation=None, images=None, pdf_path=None, question=None):
+from inference.context import count_tokens
+from inference.engine import get_engine, describe_error, InferenceError
+from inference.scheduler import PRIORITY_BATCH
+
+# Opt-in: a fixed sampling seed makes document answers reproducible, so a repeated
+# document/query pair is served from the response cache. Unset, sampling is left alone.
+DOCUMENT_QUERY_SEED = os.environ.get("NEUROGENIUS_DOCUMENT_SEED")
+DOCUMENT_QUERY_SEED = int(DOCUMENT_QUERY_SEED) if DOCUMENT_QUERY_SEED else None
+DEFAULT_DOCUMENT_QUERY_SEED = 42  # Used when the setting is switched on in the UI
+
+# Fixed text that opens every document prompt; changing it invalidates cached prefixes
+DOCUMENT_INSTRUCTIONS = (
+    "You are NeuroVision, an assistant that answers questions about the document below. "
+    "Answer from the document's content, and say so when the document does not contain the answer."
+)
+
+def query_model(model_key, conversation=None, images=None, pdf_path=None, question=None, options=None,
+                priority=PRIORITY_BATCH):
     """
     Query the selected model using the Ollama server.
     :param model_key: The key representing the model to use (e.g., "granite_3_2_vision", "llama_3_2_vision", "gemma_3_vision").
@@ -8,8 +26,12 @@ def query_model(model_key, conversation=None, images=None, pdf_path=None, questi
     :param images: List of image file paths (optional).
     :param pdf_path: Path to a PDF file (optional).
     :param question: Question or text input for the model.
+    :param options: Ollama sampling options (optional); a fixed seed or temperature 0 enables caching.
+    :param priority: Scheduler priority class (defaults to batch, below interactive chat).
     :return: The model's response as a string.
     """
+    engine = get_engine()
+    future = None
     try:
         # Prepare the prompt
         prompt = question or ""
@@ -17,23 +39,158 @@ def query_model(model_key, conversation=None, images=None, pdf_path=None, questi
             for message in conversation:
                 prompt += f"\n{message['role'].capitalize()}: {message['content']}"
 
-        # Prepare the request payload
-        payload = {
-            "model": model_key,
-            "prompt": prompt,
-            "stream": False
-        }
-
-        # Send the request to the Ollama server
-        response = requests.post(
-            "http://localhost:11434/api/generate",  # Ollama server endpoint
-            json=payload,
-            timeout=30
-        )
-
-        if response.status_code == 200:
-            return response.json().get("response", "No response from model")
-        else:
-            return f"Error: {response.status_code} - {response.text}"
+        # Run through the shared engine (scheduler admission, adaptive timeouts, response cache)
+        extra = {"options": options} if options else {}
+        future = engine.generate(model_key, prompt, priority=priority, **extra)
+        return future.result()["text"] or "No response from model"
+    except InferenceError as e:
+        return f"Error: {str(e)}"
     except Exception as e:
-        return f"Connection error: {str(e)}"
\ No newline at end of file
+        if future is not None:
+            engine.cancel(future)
+        return f"Connection error: {describe_error(e)}"
+
+
+# ------------------- Document Q&A sessions -------------------
+
+def document_prefix(document_content):
+    """The start of every prompt about a document: instructions and document text."""
+    return f"{DOCUMENT_INSTRUCTIONS}\n\nDocument Content:\n{document_content}\n\n"
+
+
+def build_document_prompt(document_content, history, question):
+    """
+    Prompt for a question about a document: instructions, document, earlier questions
+    and answers, then the new question. Everything up to the end of the document is
+    byte-identical across questions, and the history only grows at the end, so Ollama
+    can reuse the already-evaluated prefix instead of re-reading the document.
+    """
+    parts = [document_prefix(document_content)]
+    for entry in history:
+        parts.append(f"Question: {entry['query']}\nAnswer: {entry['response']}\n\n")
+    parts.append(f"Question: {question}\nAnswer:")
+    return "".join(parts)
+
+
+class DocumentSession:
+    """Model, keep_alive and prompt-evaluation measurements for one document."""
+    __slots__ = ("file_path", "model", "keep_alive", "prefix_chars", "prefix_tokens", "ms_per_token", "token_ratio",
+                 "queries", "saved_ms")
+
+    def __init__(self, file_path, model, keep_alive):
+        self.file_path = file_path
+        self.model = model
+        self.keep_alive = keep_alive
+        self.prefix_chars = 0  # Length and token count of the current document_prefix()
+        self.prefix_tokens = 0
+        self.ms_per_token = None  # Prompt evaluation cost measured on the first full evaluation
+        self.token_ratio = None  # Model tokens per tiktoken token, from the same measurement
+        self.queries = 0
+        self.saved_ms = 0.0
+
+
+class DocumentSessions:
+    """
+    Keeps consecutive questions about a document on the same model and keep_alive so
+    they share Ollama's evaluated prompt prefix, caches extracted document text, and
+    records how much prompt evaluation time the reuse saved.
+    """
+
+    def __init__(self, seed=DOCUMENT_QUERY_SEED):
+        self.seed = seed  # Sampling seed for document queries, None for unseeded sampling
+        self.sessions = {}  # file_path -> DocumentSession
+        self.contents = {}  # file_path -> (mtime, extracted text, prefix length, prefix tokens)
+        self._lock = threading.Lock()
+
+    def content(self, file_path, extract):
+        """
+        Extracted text of the document, re-extracted only when the file changes. The
+        prompt prefix is counted here too, once per version, so record() only has to
+        count the questions and answers after it.
+        """
+        mtime = os.path.getmtime(file_path)
+        with self._lock:
+            cached = self.contents.get(file_path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        text = extract(file_path)
+        prefix = document_prefix(text) if text else ""
+        with self._lock:
+            self.contents[file_path] = (mtime, text, len(prefix), count_tokens(prefix))
+        return text
+
+    def query_options(self):
+        """Sampling options for a document query: the seed when one is set, otherwise none."""
+        return {"seed": self.seed} if self.seed is not None else None
+
+    def session(self, file_path, model, keep_alive):
+        """
+        The document's session. A different model starts a new session, since the
+        evaluated prefix belongs to the previous model.
+        """
+        with self._lock:
+            session = self.sessions.get(file_path)
+            if session is None or session.model != model:
+                session = self.sessions[file_path] = DocumentSession(file_path, model, keep_alive)
+            cached = self.contents.get(file_path)
+            if cached:
+                session.prefix_chars, session.prefix_tokens = cached[2], cached[3]
+            return session
+
+    def model_for(self, file_path):
+        with self._lock:
+            session = self.sessions.get(file_path)
+            return session.model if session else None
+
+    def record(self, session, prompt, stats):
+        """
+        Record one finished query from Ollama's final-chunk stats. Ollama only counts the
+        tokens it had to evaluate, so the tokens it skipped are the reused prefix; their
+        cost is estimated from the session's first full evaluation. The document prefix
+        was counted when it was extracted, so only the rest of prompt is counted here.
+        Returns the estimated milliseconds saved, or None without usable stats (e.g. a
+        response cache hit).
+        """
+        count = stats.get("prompt_eval_count")
+        duration = stats.get("prompt_eval_duration")
+        if not count or not duration:
+            return None
+        if session.prefix_chars:
+            estimated = session.prefix_tokens + count_tokens(prompt[session.prefix_chars:])
+        else:
+            estimated = count_tokens(prompt)
+        with self._lock:
+            session.queries += 1
+            if session.ms_per_token is None:
+                session.ms_per_token = duration / 1e6 / count
+                session.token_ratio = count / max(1, estimated)
+                return 0.0
+            reused = max(0.0, estimated * session.token_ratio - count)
+            saved = reused * session.ms_per_token
+            session.saved_ms += saved
+            return saved
+
+    def stats(self):
+        with self._lock:
+            return [
+                {
+                    "file_path": session.file_path,
+                    "model": session.model,
+                    "queries": session.queries,
+                    "saved_ms": session.saved_ms
+                }
+                for session in self.sessions.values()
+            ]
+
+
+_sessions = None
+_sessions_lock = threading.Lock()
+
+
+def get_document_sessions():
+    """Return the process-wide document session registry."""
+    global _sessions
+    with _sessions_lock:
+        if _sessions is None:
+            _sessions = DocumentSessions()
+        return _sessions
@@ -0,0 +1,65 @@
+from .client import (
+    OllamaClient,
+    get_client,
+    close_clients,
+    decode_chunk
+)
+from .engine import (
+    InferenceEngine,
+    InferenceError,
+    InferenceTimeout,
+    get_engine,
+    shutdown_engine
+)
+from .cache import (
+    ResponseCache,
+    get_response_cache,
+    is_deterministic,
+    make_key
+)
+from .scheduler import (
+    InferenceScheduler,
+    QueueFullError,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_BACKGROUND,
+    PRIORITY_BATCH
+)
+from .endpoints import (
+    Endpoint,
+    EndpointPool,
+    EndpointUnavailable,
+    ENDPOINTS
+)
+from .latency import LatencyTracker
+from .router import (
+    ModelRouter,
+    RouteDecision,
+    AUTO_MODEL,
+    get_router
+)
+from .provisioning import (
+    ModelProvisioner,
+    PullProgress,
+    REQUIRED_MODELS
+)
+from .tuning import (
+    TunedOptions,
+    get_tuned_options,
+    host_profile
+)
+from .context import (
+    build_context,
+    count_tokens,
+    context_budget,
+    context_window
+)
+from .messages import (
+    Message,
+    MessageStore,
+    MessageNode,
+    MessageTree
+)
+from .reasoning import (
+    ReasoningParser,
+    split_reasoning
+)
@@ -0,0 +1,169 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import orjson
+
+from database.connection import get_connection
+
+# Ensure database directory exists
+DB_DIR = Path("database")
+DB_DIR.mkdir(exist_ok=True)
+DB_PATH = DB_DIR / "responsecache.db"
+
+MEMORY_ENTRIES = 256  # In-memory LRU tier
+MAX_ENTRIES = 5000  # SQLite tier, oldest-used entries are evicted beyond this
+MAX_AGE_SECONDS = 7 * 24 * 3600
+
+
+def is_deterministic(options):
+    """
+    A request is reproducible (and therefore cacheable) when it pins the seed or
+    samples greedily.
+    """
+    if not options:
+        return False
+    return options.get("seed") is not None or options.get("temperature") == 0
+
+
+def make_key(model, prompt, options):
+    """
+    Hash (model, full prompt or message list, sampling options) into a cache key.
+    """
+    material = orjson.dumps(
+        {"model": model, "prompt": prompt, "options": options or {}},
+        option=orjson.OPT_SORT_KEYS
+    )
+    return hashlib.sha256(material).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier cache for deterministic inference responses: an in-memory LRU in
+    front of a SQLite table with size- and age-based eviction. Every hit is
+    counted together with the generation time it saved.
+    """
+
+    def __init__(self, db_path=DB_PATH, memory_entries=MEMORY_ENTRIES, max_entries=MAX_ENTRIES,
+                 max_age_seconds=MAX_AGE_SECONDS):
+        self.db_path = str(db_path)
+        self.memory_entries = memory_entries
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.memory = OrderedDict()  # key -> (response, generation_ms)
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.saved_ms = 0
+        self._lock = threading.Lock()
+        self.init_db()
+
+    def init_db(self):
+        conn = get_connection(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS response_cache (
+            key TEXT PRIMARY KEY,
+            model TEXT NOT NULL,
+            response TEXT NOT NULL,
+            generation_ms INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_used REAL NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0
+        )
+        ''')
+        conn.commit()
+
+    def _remember(self, key, response, generation_ms):
+        with self._lock:
+            self.memory[key] = (response, generation_ms)
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.memory_entries:
+                self.memory.popitem(last=False)
+
+    def get(self, key):
+        """Return the cached response text, or None on a miss."""
+        with self._lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                self.memory.move_to_end(key)
+                self.memory_hits += 1
+                self.saved_ms += entry[1]
+        now = time.time()
+        conn = get_connection(self.db_path)
+        cursor = conn.cursor()
+        if entry is None:
+            cursor.execute(
+                "SELECT response, generation_ms, created_at FROM response_cache WHERE key = ?",
+                (key,)
+            )
+            row = cursor.fetchone()
+            if row is None or now - row[2] > self.max_age_seconds:
+                with self._lock:
+                    self.misses += 1
+                return None
+            entry = (row[0], row[1])
+            with self._lock:
+                self.disk_hits += 1
+                self.saved_ms += entry[1]
+            self._remember(key, *entry)
+        cursor.execute(
+            "UPDATE response_cache SET hits = hits + 1, last_used = ? WHERE key = ?",
+            (now, key)
+        )
+        conn.commit()
+        return entry[0]
+
+    def put(self, key, model, response, generation_ms):
+        """Store a response and evict expired or excess entries."""
+        self._remember(key, response, generation_ms)
+        now = time.time()
+        conn = get_connection(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT OR REPLACE INTO response_cache (key, model, response, generation_ms, created_at, last_used, hits) "
+            "VALUES (?, ?, ?, ?, ?, ?, 0)",
+            (key, model, response, int(generation_ms), now, now)
+        )
+        cursor.execute("DELETE FROM response_cache WHERE created_at < ?", (now - self.max_age_seconds,))
+        cursor.execute(
+            "DELETE FROM response_cache WHERE key IN ("
+            "SELECT key FROM response_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+        conn.commit()
+
+    def stats(self):
+        """
+        Hit/miss counters for this session plus lifetime totals from SQLite,
+        including the generation time saved by hits.
+        """
+        conn = get_connection(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*), COALESCE(SUM(hits), 0), COALESCE(SUM(hits * generation_ms), 0) FROM response_cache")
+        entries, lifetime_hits, lifetime_saved_ms = cursor.fetchone()
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "saved_ms": self.saved_ms,
+                "entries": entries,
+                "lifetime_hits": lifetime_hits,
+                "lifetime_saved_ms": lifetime_saved_ms
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Return the process-wide response cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
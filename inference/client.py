@@ -0,0 +1,110 @@
+import threading
+from contextlib import contextmanager
+
+import httpx
+import orjson
+
+DEFAULT_BASE_URL = "http://127.0.0.1:11434"
+
+# Connection pool tuning for the shared clients
+POOL_CONNECTIONS = 4  # Idle keep-alive connections kept per endpoint
+POOL_MAXSIZE = 16
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def decode_chunk(line):
+    """
+    Decode one line of an Ollama stream into a dict.
+    Returns None for blank or malformed lines.
+    """
+    if not line:
+        return None
+    try:
+        return orjson.loads(line)
+    except orjson.JSONDecodeError:
+        return None
+
+
+def make_timeout(timeout):
+    """Seconds, or a (connect, read) pair, as an httpx timeout."""
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return httpx.Timeout(read, connect=connect)
+    return httpx.Timeout(timeout)
+
+
+class OllamaClient:
+    """
+    Blocking client around a pooled, keep-alive httpx.Client for one Ollama endpoint,
+    for the control-plane calls (model listing and details, /api/ps, pulls, unloads and
+    the tuner's measurements). Inference goes through the asyncio engine instead.
+
+    These calls stay synchronous on purpose: they run on their own worker threads and
+    wait for the answer, the command-line tools use them without starting the engine,
+    and hours-long pulls should not share the loop that serves interactive streams.
+    Use get_client() instead of constructing this directly so every caller shares the pool.
+    """
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE):
+        self.base_url = base_url.rstrip("/")
+        self.session = httpx.Client(
+            base_url=self.base_url,
+            limits=httpx.Limits(max_connections=pool_maxsize, max_keepalive_connections=pool_connections),
+            headers={"Content-Type": "application/json"}
+        )
+
+    def url(self, path):
+        return f"{self.base_url}{path}"
+
+    def post(self, path, payload, timeout=120):
+        """Send a JSON payload (serialized with orjson) to the endpoint."""
+        return self.session.post(path, content=orjson.dumps(payload), timeout=make_timeout(timeout))
+
+    def get(self, path, timeout=10):
+        return self.session.get(path, timeout=make_timeout(timeout))
+
+    @contextmanager
+    def stream(self, path, payload, timeout=120):
+        """POST a JSON payload and yield the response without reading its body."""
+        body = orjson.dumps(payload)
+        with self.session.stream("POST", path, content=body, timeout=make_timeout(timeout)) as response:
+            yield response
+
+    def iter_stream(self, response):
+        """Yield decoded JSON objects from a streaming response."""
+        for line in response.iter_lines():
+            data = decode_chunk(line)
+            if data is not None:
+                yield data
+
+    def generate(self, model, prompt, timeout=120, **extra):
+        """Run a non-streaming /api/generate request and return the decoded body."""
+        payload = {"model": model, "prompt": prompt, "stream": False}
+        payload.update(extra)
+        response = self.post("/api/generate", payload, timeout=timeout)
+        response.raise_for_status()
+        return orjson.loads(response.content)
+
+    def close(self):
+        self.session.close()
+
+
+def get_client(base_url=DEFAULT_BASE_URL):
+    """Return the shared client for an endpoint, creating it on first use."""
+    base_url = base_url.rstrip("/")
+    with _clients_lock:
+        client = _clients.get(base_url)
+        if client is None:
+            client = OllamaClient(base_url)
+            _clients[base_url] = client
+        return client
+
+
+def close_clients():
+    """Close every pooled client (called on application shutdown)."""
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
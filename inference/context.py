@@ -0,0 +1,95 @@
+import threading
+from bisect import bisect_left
+
+from .models import CONTEXT_WINDOWS, DEFAULT_CONTEXT_WINDOW, RESPONSE_RESERVE_TOKENS
+
+TOKENIZER = "cl100k_base"
+MESSAGE_OVERHEAD_TOKENS = 4  # Role markers and separators the chat template adds per message
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    """Load the tiktoken encoding once; returns None if it is unavailable."""
+    global _encoding
+    with _encoding_lock:
+        if _encoding is None:
+            try:
+                import tiktoken
+                _encoding = tiktoken.get_encoding(TOKENIZER)
+            except Exception as e:
+                print(f"Token counting falls back to an estimate: {str(e)}")
+                _encoding = False
+        return _encoding or None
+
+
+def count_tokens(text):
+    """
+    Count tokens with tiktoken. The local models use their own tokenizers, so this is
+    an estimate, but a consistent one for budgeting.
+    """
+    encoding = _get_encoding()
+    if encoding is None:
+        return max(1, len(text) // 4) if text else 0
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def context_window(model):
+    """Context window (num_ctx) the model is run with; prompts are budgeted against it."""
+    return CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+
+
+def context_budget(model):
+    """Prompt tokens available for a model after reserving room for the reply."""
+    return context_window(model) - RESPONSE_RESERVE_TOKENS
+
+
+class ContextReport:
+    """What build_context kept and dropped."""
+    __slots__ = ("budget", "used_tokens", "dropped_tokens", "dropped_messages")
+
+    def __init__(self, budget, used_tokens, dropped_tokens, dropped_messages):
+        self.budget = budget
+        self.used_tokens = used_tokens
+        self.dropped_tokens = dropped_tokens
+        self.dropped_messages = dropped_messages
+
+
+def build_context(store, model, system_prompt=None, budget=None, start=0):
+    """
+    Assemble the message list for /api/chat within the model's token budget.
+
+    store is a MessageStore; messages before start are skipped (already summarized).
+    Pinned items (the system prompt, the first user message and the newest message)
+    are always kept. The rest are kept newest to oldest until the budget is spent, found
+    with a bisect over the store's running token totals, and the result is returned in
+    chronological order with a ContextReport.
+    """
+    if budget is None:
+        budget = context_budget(model)
+
+    system = [{"role": "system", "content": system_prompt}] if system_prompt else []
+    used = count_tokens(system_prompt) + MESSAGE_OVERHEAD_TOKENS if system_prompt else 0
+    last = len(store) - 1
+    if last < start:
+        return system, ContextReport(budget, used, 0, 0)
+
+    used += store.tokens_between(last, last + 1)
+    first_user = store.first_user_index(start)
+    if first_user is not None and first_user < last:
+        used += store.tokens_between(first_user, first_user + 1)
+        lowest = first_user + 1
+    else:
+        first_user = None
+        lowest = start
+
+    # Oldest message that still fits when everything after it up to the newest is kept
+    cumulative = store.cumulative
+    floor = cumulative[last] - max(0, budget - used)
+    cut = bisect_left(cumulative, floor, lowest, last + 1)
+    used += store.tokens_between(cut, last)
+
+    selected = system + ([store.dicts[first_user]] if first_user is not None else []) + store.as_dicts(cut)
+    report = ContextReport(budget, used, store.tokens_between(lowest, cut), cut - lowest)
+    return selected, report
@@ -0,0 +1,127 @@
+import asyncio
+import os
+import time
+
+import httpx
+import orjson
+
+from .client import DEFAULT_BASE_URL
+
+# Comma-separated list of Ollama base URLs, e.g. "http://10.0.0.5:11434,http://10.0.0.6:11434"
+ENDPOINTS = [url.strip().rstrip("/") for url in os.environ.get("OLLAMA_ENDPOINTS", DEFAULT_BASE_URL).split(",") if url.strip()]
+
+PROBE_INTERVAL_SECONDS = 15
+PROBE_TIMEOUT = httpx.Timeout(5, connect=2)
+# After a failure an endpoint is skipped until the next successful probe, or this long at most
+FAILURE_BACKOFF_SECONDS = 30
+
+
+class EndpointUnavailable(Exception):
+    """Raised when an endpoint refuses a request before producing any output."""
+
+
+class Endpoint:
+    """Routing state for one Ollama server."""
+    __slots__ = ("url", "healthy", "outstanding", "models", "loaded", "failed_at", "last_probe", "probe_ms")
+
+    def __init__(self, url):
+        self.url = url
+        self.healthy = True  # Optimistic until the first probe says otherwise
+        self.outstanding = 0
+        self.models = set()  # Installed tags, from /api/tags
+        self.loaded = set()  # Tags currently in memory, from /api/ps
+        self.failed_at = None
+        self.last_probe = None
+        self.probe_ms = None
+
+    def available(self, now):
+        if self.failed_at is not None and now - self.failed_at < FAILURE_BACKOFF_SECONDS:
+            return False
+        return self.healthy
+
+
+class EndpointPool:
+    """
+    A set of Ollama endpoints with health probing and least-outstanding routing.
+
+    Endpoints are probed in the background (/api/tags for installed models, /api/ps for
+    loaded ones). pick() prefers healthy endpoints that already have the model loaded,
+    then ones that have it installed, and breaks ties by the number of requests in flight.
+    """
+
+    def __init__(self, urls=None, probe_interval=PROBE_INTERVAL_SECONDS):
+        self.endpoints = [Endpoint(url) for url in (urls or ENDPOINTS)]
+        self.probe_interval = probe_interval
+
+    def __len__(self):
+        return len(self.endpoints)
+
+    # ------------------- Routing -------------------
+
+    def pick(self, model, exclude=()):
+        """Return the best endpoint for the model, or None when every endpoint is excluded."""
+        now = time.monotonic()
+        candidates = [endpoint for endpoint in self.endpoints if endpoint not in exclude]
+        if not candidates:
+            return None
+        available = [endpoint for endpoint in candidates if endpoint.available(now)]
+        # If nothing looks healthy, try anyway rather than failing without a request
+        pool = available or candidates
+        return min(
+            pool,
+            key=lambda endpoint: (
+                model not in endpoint.loaded,
+                bool(endpoint.models) and model not in endpoint.models,
+                endpoint.outstanding
+            )
+        )
+
+    def mark_failed(self, endpoint):
+        endpoint.failed_at = time.monotonic()
+        endpoint.healthy = False
+
+    def mark_ok(self, endpoint, model=None):
+        endpoint.failed_at = None
+        endpoint.healthy = True
+        if model:
+            endpoint.loaded.add(model)
+
+    # ------------------- Health probing -------------------
+
+    async def probe(self, client, endpoint):
+        started = time.perf_counter()
+        try:
+            tags = await client.get(f"{endpoint.url}/api/tags", timeout=PROBE_TIMEOUT)
+            tags.raise_for_status()
+            endpoint.models = {entry["name"] for entry in orjson.loads(tags.content).get("models", [])}
+            ps = await client.get(f"{endpoint.url}/api/ps", timeout=PROBE_TIMEOUT)
+            if ps.status_code == 200:
+                endpoint.loaded = {entry["name"] for entry in orjson.loads(ps.content).get("models", [])}
+        except (httpx.HTTPError, orjson.JSONDecodeError, KeyError):
+            self.mark_failed(endpoint)
+        else:
+            endpoint.healthy = True
+            endpoint.failed_at = None
+            endpoint.probe_ms = (time.perf_counter() - started) * 1000
+        endpoint.last_probe = time.time()
+
+    async def probe_all(self, client):
+        await asyncio.gather(*(self.probe(client, endpoint) for endpoint in self.endpoints))
+
+    async def run_probes(self, client):
+        while True:
+            await self.probe_all(client)
+            await asyncio.sleep(self.probe_interval)
+
+    def status(self):
+        return [
+            {
+                "url": endpoint.url,
+                "healthy": endpoint.healthy,
+                "outstanding": endpoint.outstanding,
+                "models": sorted(endpoint.models),
+                "loaded": sorted(endpoint.loaded),
+                "probe_ms": endpoint.probe_ms
+            }
+            for endpoint in self.endpoints
+        ]
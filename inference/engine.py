@@ -0,0 +1,434 @@
+import asyncio
+import threading
+import time
+
+import httpx
+import orjson
+
+from .cache import get_response_cache, is_deterministic, make_key
+from .client import decode_chunk
+from .context import context_window
+from .endpoints import EndpointPool, EndpointUnavailable
+from .latency import LatencyTracker, MAX_FIRST_TOKEN_TIMEOUT
+from .scheduler import InferenceScheduler, MAX_IN_FLIGHT_PER_MODEL, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+from .tuning import get_tuned_options
+
+# Connection limits for the shared async client, per endpoint
+MAX_CONNECTIONS = 32
+MAX_KEEPALIVE_CONNECTIONS = 16
+KEEPALIVE_EXPIRY = 60
+# Streamed reads are bounded by the adaptive timeouts in LatencyTracker instead
+REQUEST_TIMEOUT = httpx.Timeout(MAX_FIRST_TOKEN_TIMEOUT, connect=5)
+
+
+class InferenceError(Exception):
+    """Raised when Ollama answers with an error status or an error chunk."""
+
+
+class InferenceTimeout(InferenceError):
+    """Raised when a stream produces no token within its adaptive timeout."""
+
+    def __init__(self, model, phase, timeout):
+        super().__init__(f"{model} produced no {phase} within {timeout:.0f}s")
+        self.model = model
+        self.phase = phase
+        self.timeout = timeout
+
+
+def describe_error(exc):
+    """Turn an engine exception into the kind of message the UI already shows."""
+    if isinstance(exc, InferenceTimeout):
+        return f"The request timed out ({exc}). Please try again later."
+    if isinstance(exc, (httpx.TimeoutException, TimeoutError)):
+        return "The request timed out. Please try again later."
+    if isinstance(exc, (httpx.ConnectError, EndpointUnavailable)):
+        return "Unable to connect to the server. Please ensure the server is running."
+    return str(exc)
+
+
+def with_context_window(payload):
+    """
+    Set num_ctx to the window prompts are budgeted against, unless the request (or its
+    tuned options) already sets one. Without it Ollama runs the model with its smaller
+    default window and silently truncates prompts the budget accepted.
+    """
+    options = payload.get("options") or {}
+    if "num_ctx" in options:
+        return payload
+    return {**payload, "options": {**options, "num_ctx": context_window(payload["model"])}}
+
+
+def extract_token(kind, data):
+    """Return the text carried by one stream chunk of a generate or chat request."""
+    if kind == "chat":
+        return data.get("message", {}).get("content", "")
+    return data.get("response", "")
+
+
+class StreamState:
+    """Bookkeeping shared between a streaming coroutine and the caller's future."""
+    __slots__ = ("task", "stop_requested")
+
+    def __init__(self):
+        self.task = None
+        self.stop_requested = False
+
+
+class InferenceEngine:
+    """
+    Runs every Ollama request as a coroutine on one background asyncio loop.
+
+    Callers on any thread submit generate/chat/embed requests and get back a
+    concurrent.futures.Future. Streamed tokens are delivered through an optional
+    on_token callback, which is invoked on the engine thread (Qt signals emitted
+    from it are queued onto the GUI thread automatically).
+
+    Requests are spread over the configured endpoints (OLLAMA_ENDPOINTS) and fail
+    over to another endpoint when one refuses a request before streaming anything.
+    Each request gets the runtime options tuned for its model on the endpoint's host,
+    and generate/chat requests run with the model's budgeted context window.
+    """
+
+    def __init__(self, urls=None):
+        self.endpoints = EndpointPool(urls)
+        self.loop = None
+        self.client = None
+        self.thread = None
+        # Each endpoint can serve the per-model limit on its own
+        self.scheduler = InferenceScheduler(max_in_flight=MAX_IN_FLIGHT_PER_MODEL * len(self.endpoints))
+        self.latency = LatencyTracker()
+        self.tuning = get_tuned_options()
+        self._started = threading.Event()
+        self._lock = threading.Lock()
+
+    # ------------------- Lifecycle -------------------
+
+    def start(self):
+        with self._lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self._run_loop, name="InferenceEngine", daemon=True)
+            self.thread.start()
+        self._started.wait()
+
+    def _run_loop(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.client = httpx.AsyncClient(
+            timeout=REQUEST_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS * len(self.endpoints),
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS * len(self.endpoints),
+                keepalive_expiry=KEEPALIVE_EXPIRY
+            ),
+            headers={"Content-Type": "application/json"}
+        )
+        self.loop.create_task(self.endpoints.run_probes(self.client))
+        self._started.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.run_until_complete(self.client.aclose())
+            self.loop.close()
+
+    def shutdown(self):
+        """Cancel outstanding requests and stop the loop."""
+        with self._lock:
+            if self.thread is None:
+                return
+            thread = self.thread
+            self.thread = None
+        asyncio.run_coroutine_threadsafe(self._cancel_all(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        thread.join()
+        self._started.clear()
+
+    async def _cancel_all(self):
+        tasks = [task for task in asyncio.all_tasks(self.loop) if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    # ------------------- Public API -------------------
+
+    def submit(self, coro):
+        """Schedule a coroutine on the engine loop and return a concurrent Future."""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def generate(self, model, prompt, on_token=None, priority=PRIORITY_INTERACTIVE, **extra):
+        payload = {"model": model, "prompt": prompt, "stream": True}
+        payload.update(extra)
+        return self.submit_stream("generate", "/api/generate", payload, on_token, priority)
+
+    def chat(self, model, messages, on_token=None, priority=PRIORITY_INTERACTIVE, **extra):
+        payload = {"model": model, "messages": messages, "stream": True}
+        payload.update(extra)
+        return self.submit_stream("chat", "/api/chat", payload, on_token, priority)
+
+    def submit_stream(self, kind, path, payload, on_token=None, priority=PRIORITY_INTERACTIVE):
+        state = StreamState()
+        if is_deterministic(payload.get("options")):
+            coro = self._cached_stream(kind, path, payload, on_token, state, priority)
+        else:
+            coro = self._stream(kind, path, payload, on_token, state, priority)
+        future = self.submit(coro)
+        future.stream_state = state
+        return future
+
+    def cancel(self, future):
+        """
+        Stop a streaming request started by generate() or chat().
+        The HTTP response is closed, which makes Ollama abort the generation and free
+        the model slot. The future still resolves, with the text received so far and
+        "cancelled": True.
+        """
+        state = getattr(future, "stream_state", None)
+        if state is None or future.done() or self.loop is None:
+            return False
+        self.loop.call_soon_threadsafe(self._stop_stream, state)
+        return True
+
+    def _stop_stream(self, state):
+        state.stop_requested = True
+        if state.task is not None:
+            state.task.cancel()
+
+    def embed(self, model, prompt, priority=PRIORITY_BACKGROUND, **extra):
+        payload = {"model": model, "prompt": prompt}
+        payload.update(extra)
+        return self.submit(self._post("/api/embeddings", payload, priority))
+
+    # ------------------- Coroutines -------------------
+
+    async def _route(self, model, attempt, exclude=()):
+        """
+        Run attempt(endpoint) on the best endpoint for the model, failing over to the
+        next one when it is unreachable. attempt must raise EndpointUnavailable (or a
+        connection error) only if it has not yet delivered output.
+        """
+        tried = list(exclude)
+        while True:
+            endpoint = self.endpoints.pick(model, exclude=tried)
+            if endpoint is None:
+                raise EndpointUnavailable(f"No inference endpoint could serve {model}")
+            tried.append(endpoint)
+            endpoint.outstanding += 1
+            try:
+                result = await attempt(endpoint)
+            except (EndpointUnavailable, httpx.ConnectError, httpx.ConnectTimeout) as e:
+                self.endpoints.mark_failed(endpoint)
+                if len(tried) >= len(self.endpoints):
+                    raise
+                print(f"Inference endpoint {endpoint.url} failed ({describe_error(e)}), failing over")
+                continue
+            finally:
+                endpoint.outstanding -= 1
+            self.endpoints.mark_ok(endpoint, model)
+            return result
+
+    async def _post(self, path, payload, priority):
+        async def attempt(endpoint):
+            body = orjson.dumps(self.tuning.apply(payload, endpoint.url))
+            response = await self.client.post(f"{endpoint.url}{path}", content=body)
+            if response.status_code >= 500:
+                raise EndpointUnavailable(f"{response.status_code} - {response.text}")
+            return response
+
+        async with self.scheduler.slot(payload["model"], priority):
+            response = await self._route(payload["model"], attempt)
+        if response.status_code != 200:
+            raise InferenceError(f"{response.status_code} - {response.text}")
+        return orjson.loads(response.content)
+
+    async def _cached_stream(self, kind, path, payload, on_token, state, priority):
+        """
+        Serve a reproducible request from the response cache, or stream it and store the result.
+        """
+        cache = get_response_cache()
+        key = make_key(payload["model"], payload.get("prompt", payload.get("messages")), payload.get("options"))
+        text = await asyncio.to_thread(cache.get, key)
+        if text is not None:
+            if on_token is not None:
+                on_token(text)
+            return {"text": text, "stats": {}, "cancelled": False, "cached": True}
+        started = time.perf_counter()
+        result = await self._stream(kind, path, payload, on_token, state, priority)
+        if not result["cancelled"]:
+            generation_ms = (time.perf_counter() - started) * 1000
+            await asyncio.to_thread(cache.put, key, payload["model"], result["text"], generation_ms)
+        return result
+
+    async def _stream(self, kind, path, payload, on_token, state, priority):
+        """
+        Stream one request and return {"text": full text, "stats": final chunk, "cancelled": bool}.
+        """
+        parts = []
+        stats = {}
+        state.task = asyncio.current_task()
+        if state.stop_requested:
+            return {"text": "", "stats": stats, "cancelled": True}
+        try:
+            # Wait for a slot on the model before opening the connection
+            async with self.scheduler.slot(payload["model"], priority):
+                stats = await self._hedged(kind, path, payload, on_token, parts)
+        except asyncio.CancelledError:
+            # Leaving the stream context closes the connection, which stops the generation
+            if not state.stop_requested:
+                raise
+            return {"text": "".join(parts), "stats": stats, "cancelled": True}
+        return {"text": "".join(parts), "stats": stats, "cancelled": False}
+
+    async def _hedged(self, kind, path, payload, on_token, parts):
+        """
+        Stream from the best endpoint. If it has produced no token after the model's
+        p95 TTFT and another endpoint exists, send a duplicate there; the first request
+        to produce a token wins and the other is cancelled (which closes its connection).
+        The duplicate needs a free scheduler slot of its own and is skipped without one.
+        """
+        def emit(token):
+            parts.append(token)
+            if on_token is not None:
+                on_token(token)
+
+        model = payload["model"]
+        delay = self.latency.hedge_delay(model)
+        # Prompt-only requests (prefill, num_predict 0) never produce a token to race on
+        if payload.get("options", {}).get("num_predict") == 0:
+            delay = None
+        if delay is None or len(self.endpoints) < 2:
+            return await self._route(model, lambda endpoint: self._stream_from(endpoint, kind, path, payload, emit))
+
+        race = {"winner": None, "endpoints": {}}
+        tasks = {}
+        first_token = asyncio.Event()
+
+        def sink(name):
+            def emit_token(token):
+                if race["winner"] is None:
+                    race["winner"] = name
+                    first_token.set()
+                    for other, task in tasks.items():
+                        if other != name:
+                            task.cancel()
+                if race["winner"] == name:
+                    emit(token)
+            return emit_token
+
+        def attempt(name):
+            async def run(endpoint):
+                race["endpoints"][name] = endpoint
+                return await self._stream_from(endpoint, kind, path, payload, sink(name))
+            return run
+
+        tasks["primary"] = asyncio.create_task(self._route(model, attempt("primary")))
+        waiter = asyncio.create_task(first_token.wait())
+        try:
+            await asyncio.wait({tasks["primary"], waiter}, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+            if not first_token.is_set() and not tasks["primary"].done():
+                exclude = [race["endpoints"]["primary"]] if "primary" in race["endpoints"] else []
+                if len(exclude) < len(self.endpoints) and self.scheduler.try_acquire(model):
+                    print(f"Hedging {model} request after {delay:.1f}s without a token")
+                    tasks["hedge"] = asyncio.create_task(self._route(model, attempt("hedge"), exclude=exclude))
+                    # Released however the task ends, even if it is cancelled before it starts
+                    tasks["hedge"].add_done_callback(lambda _: self.scheduler.release(model))
+            error = None
+            pending = set(tasks.values())
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = next(key for key, value in tasks.items() if value is task)
+                    if task.cancelled():
+                        continue
+                    if task.exception() is not None:
+                        if race["winner"] == name:
+                            raise task.exception()
+                        error = task.exception()
+                        continue
+                    if race["winner"] in (None, name):
+                        return task.result()
+            raise error or InferenceError(f"{model} request was abandoned")
+        finally:
+            waiter.cancel()
+            for task in tasks.values():
+                task.cancel()
+
+    async def _stream_from(self, endpoint, kind, path, payload, emit):
+        """
+        Stream one request from one endpoint, passing each token to emit.
+        Waits are bounded by the model's adaptive first-token and token-gap timeouts.
+        Returns the final chunk (timings and counters).
+        """
+        model = payload["model"]
+        payload = with_context_window(self.tuning.apply(payload, endpoint.url))
+        prompt = payload.get("prompt")
+        if prompt is None:
+            prompt_chars = sum(len(message.get("content", "")) for message in payload.get("messages", []))
+        else:
+            prompt_chars = len(prompt)
+        timeout = self.latency.first_token_timeout(model, prompt_chars)
+        phase = "first token"
+        started = time.perf_counter()
+        deadline = started + timeout
+        ttft_ms = None
+        request = self.client.build_request("POST", f"{endpoint.url}{path}", content=orjson.dumps(payload))
+        # Ollama sends the response headers with the first chunk, so the first-token
+        # timeout has to cover waiting for them as well
+        try:
+            response = await asyncio.wait_for(self.client.send(request, stream=True), timeout)
+        except asyncio.TimeoutError:
+            raise InferenceTimeout(model, phase, timeout) from None
+        try:
+            if response.status_code != 200:
+                body = (await response.aread()).decode(errors="replace")
+                if response.status_code >= 500:
+                    raise EndpointUnavailable(f"{response.status_code} - {body}")
+                raise InferenceError(f"{response.status_code} - {body}")
+            lines = response.aiter_lines().__aiter__()
+            while True:
+                wait = timeout if ttft_ms is not None else max(0.0, deadline - time.perf_counter())
+                try:
+                    line = await asyncio.wait_for(lines.__anext__(), wait)
+                except StopAsyncIteration:
+                    return {}
+                except asyncio.TimeoutError:
+                    raise InferenceTimeout(model, phase, timeout) from None
+                data = decode_chunk(line)
+                if data is None:
+                    continue
+                if "error" in data:
+                    raise InferenceError(data["error"])
+                token = extract_token(kind, data)
+                if token:
+                    if ttft_ms is None:
+                        ttft_ms = (time.perf_counter() - started) * 1000
+                        timeout = self.latency.token_gap_timeout(model)
+                        phase = "token"
+                    emit(token)
+                if data.get("done"):
+                    self.latency.record(model, ttft_ms, data)
+                    return data
+        finally:
+            await response.aclose()
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """Return the process-wide inference engine, starting it on first use."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = InferenceEngine()
+        engine = _engine
+    engine.start()
+    return engine
+
+
+def shutdown_engine():
+    global _engine
+    with _engine_lock:
+        engine, _engine = _engine, None
+    if engine is not None:
+        engine.shutdown()
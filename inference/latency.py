@@ -0,0 +1,113 @@
+import os
+import threading
+from collections import deque
+
+SAMPLES_PER_MODEL = 200
+MIN_SAMPLES = 5  # Below this, fall back to the fixed defaults
+
+DEFAULT_FIRST_TOKEN_TIMEOUT = 120.0  # Seconds, used until a model has enough samples
+MIN_FIRST_TOKEN_TIMEOUT = 10.0
+MAX_FIRST_TOKEN_TIMEOUT = 300.0
+DEFAULT_TOKEN_GAP_TIMEOUT = 60.0  # Longest silence allowed between streamed tokens
+MIN_TOKEN_GAP_TIMEOUT = 10.0
+
+CHARS_PER_TOKEN = 4  # Rough estimate used to size prompt evaluation time
+
+# Fire a duplicate request on another endpoint when the first has been silent past p95 TTFT
+HEDGING_ENABLED = os.environ.get("NEUROGENIUS_HEDGING", "1") != "0"
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+class ModelLatency:
+    __slots__ = ("ttft_ms", "tokens_per_s", "prompt_tokens_per_s")
+
+    def __init__(self):
+        self.ttft_ms = deque(maxlen=SAMPLES_PER_MODEL)
+        self.tokens_per_s = deque(maxlen=SAMPLES_PER_MODEL)
+        self.prompt_tokens_per_s = deque(maxlen=SAMPLES_PER_MODEL)
+
+
+class LatencyTracker:
+    """
+    Rolling per-model latency samples (time to first token, generation and prompt
+    evaluation throughput) and the timeouts and hedge delays derived from them.
+    """
+
+    def __init__(self):
+        self.models = {}
+        self._lock = threading.Lock()
+
+    def record(self, model, ttft_ms, stats):
+        """
+        Record one finished request. stats is Ollama's final chunk, whose *_duration
+        fields are in nanoseconds.
+        """
+        with self._lock:
+            entry = self.models.setdefault(model, ModelLatency())
+            if ttft_ms is not None:
+                entry.ttft_ms.append(ttft_ms)
+            if stats.get("eval_count") and stats.get("eval_duration"):
+                entry.tokens_per_s.append(stats["eval_count"] / (stats["eval_duration"] / 1e9))
+            if stats.get("prompt_eval_count") and stats.get("prompt_eval_duration"):
+                entry.prompt_tokens_per_s.append(stats["prompt_eval_count"] / (stats["prompt_eval_duration"] / 1e9))
+
+    def _samples(self, model):
+        with self._lock:
+            entry = self.models.get(model)
+            if entry is None:
+                return [], [], []
+            return list(entry.ttft_ms), list(entry.tokens_per_s), list(entry.prompt_tokens_per_s)
+
+    def first_token_timeout(self, model, prompt_chars=0):
+        """
+        Seconds to wait for the first token: twice the p99 TTFT plus a margin for
+        evaluating this prompt at the slow end of the observed prompt throughput.
+        """
+        ttft, _, prompt_rates = self._samples(model)
+        if len(ttft) < MIN_SAMPLES:
+            return DEFAULT_FIRST_TOKEN_TIMEOUT
+        timeout = 2 * percentile(ttft, 99) / 1000
+        slow_rate = percentile(prompt_rates, 5)
+        if slow_rate:
+            timeout += 1.5 * (prompt_chars / CHARS_PER_TOKEN) / slow_rate
+        return max(MIN_FIRST_TOKEN_TIMEOUT, min(MAX_FIRST_TOKEN_TIMEOUT, timeout))
+
+    def token_gap_timeout(self, model):
+        """Seconds allowed between two streamed tokens: ten tokens at the p5 generation rate."""
+        _, rates, _ = self._samples(model)
+        if len(rates) < MIN_SAMPLES:
+            return DEFAULT_TOKEN_GAP_TIMEOUT
+        slow_rate = percentile(rates, 5)
+        return max(MIN_TOKEN_GAP_TIMEOUT, min(DEFAULT_TOKEN_GAP_TIMEOUT, 10 / slow_rate))
+
+    def hedge_delay(self, model):
+        """Seconds after which a still-silent request is hedged, or None when not enough data."""
+        if not HEDGING_ENABLED:
+            return None
+        ttft, _, _ = self._samples(model)
+        if len(ttft) < MIN_SAMPLES:
+            return None
+        return percentile(ttft, 95) / 1000
+
+    def stats(self):
+        """Per-model p50/p95/p99 TTFT (ms) and median tokens/s."""
+        with self._lock:
+            models = list(self.models)
+        report = {}
+        for model in models:
+            ttft, rates, prompt_rates = self._samples(model)
+            report[model] = {
+                "samples": len(ttft),
+                "ttft_p50_ms": percentile(ttft, 50),
+                "ttft_p95_ms": percentile(ttft, 95),
+                "ttft_p99_ms": percentile(ttft, 99),
+                "tokens_per_s_p50": percentile(rates, 50),
+                "prompt_tokens_per_s_p50": percentile(prompt_rates, 50)
+            }
+        return report
@@ -0,0 +1,156 @@
+from array import array
+
+from .context import MESSAGE_OVERHEAD_TOKENS, count_tokens
+
+ROLE_LABELS = {"user": "User", "assistant": "Assistant", "system": "System"}
+
+
+def format_turn(role, content):
+    """One turn of the plain-text transcript used for /api/generate prompts."""
+    return f"{ROLE_LABELS.get(role, role.title())}: {content}\n"
+
+
+class Message:
+    __slots__ = ("role", "content", "tokens", "id")
+
+    def __init__(self, role, content, tokens, id=None):
+        self.role = role
+        self.content = content
+        self.tokens = tokens
+        self.id = id  # Database id, None until persisted
+
+    def as_dict(self):
+        return {"role": self.role, "content": self.content}
+
+
+class MessageStore:
+    """
+    Compact, append-mostly store for one chat's messages.
+
+    Alongside the records it keeps running token totals (cumulative[i] is the cost of
+    messages[:i], per-message overhead included) and each message's /api/chat dict, built
+    once when the message is appended. Appending a turn costs O(len(turn)); budget lookups
+    are a bisect over the running totals, and the prompt for a send is a slice of the
+    prepared dicts instead of a rebuild of the whole history.
+    """
+
+    def __init__(self):
+        self.messages = []
+        self.cumulative = array("Q", [0])
+        self.dicts = []  # dicts[i] is message i as sent to /api/chat
+        self._first_user = None
+
+    def __len__(self):
+        return len(self.messages)
+
+    def __iter__(self):
+        return iter(self.messages)
+
+    def __getitem__(self, index):
+        return self.messages[index]
+
+    # ------------------- Updates -------------------
+
+    def append(self, role, content, tokens=None, id=None):
+        """Add a turn; tokens is the stored count when known, otherwise it is counted here."""
+        if tokens is None:
+            tokens = count_tokens(content)
+        message = Message(role, content, tokens, id)
+        if role == "user" and self._first_user is None:
+            self._first_user = len(self.messages)
+        self.messages.append(message)
+        self.cumulative.append(self.cumulative[-1] + tokens + MESSAGE_OVERHEAD_TOKENS)
+        self.dicts.append(message.as_dict())
+        return message
+
+    def truncate(self, index):
+        """
+        Drop messages from index on (to switch branches). Everything before index,
+        including its totals and prepared dicts, is kept as is.
+        """
+        del self.messages[index:]
+        del self.cumulative[index + 1:]
+        del self.dicts[index:]
+        if self._first_user is not None and self._first_user >= index:
+            self._first_user = None
+
+    # ------------------- Reads -------------------
+
+    def first_user_index(self, start=0):
+        """Index of the first user message at or after start, or None."""
+        if self._first_user is not None and self._first_user >= start:
+            return self._first_user
+        for index in range(start, len(self.messages)):
+            if self.messages[index].role == "user":
+                return index
+        return None
+
+    def tokens_between(self, start, stop):
+        return self.cumulative[stop] - self.cumulative[start]
+
+    def as_dicts(self, start=0):
+        """The prepared /api/chat dicts from message start onwards (shared; do not modify)."""
+        return self.dicts[start:]
+
+
+class MessageNode:
+    """One stored message of a chat's message tree."""
+    __slots__ = ("id", "parent_id", "role", "content", "reasoning", "tokens", "model")
+
+    def __init__(self, id, parent_id, role, content, reasoning=None, tokens=None, model=None):
+        self.id = id
+        self.parent_id = parent_id
+        self.role = role
+        self.content = content
+        self.reasoning = reasoning
+        self.tokens = tokens
+        self.model = model  # Model that wrote a reply, when recorded
+
+
+class MessageTree:
+    """
+    All messages of a chat, including branches created by edits and regenerations.
+    Each fork remembers which child is on the active branch, so switching branches
+    only walks the tree in memory.
+    """
+
+    def __init__(self):
+        self.nodes = {}  # id -> MessageNode
+        self.children = {}  # parent id (None for roots) -> child ids in creation order
+        self.selected = {}  # parent id -> child id on the active branch
+
+    def add(self, node):
+        """Add a message and put it on the active branch."""
+        self.nodes[node.id] = node
+        self.children.setdefault(node.parent_id, []).append(node.id)
+        self.selected[node.parent_id] = node.id
+        return node
+
+    def siblings(self, node_id):
+        """Ids of the message and its alternatives, in creation order."""
+        return self.children.get(self.nodes[node_id].parent_id, [])
+
+    def select(self, node_id):
+        """Put node_id on the active branch; returns the leaf that branch now ends at."""
+        node = self.nodes[node_id]
+        while node is not None:
+            self.selected[node.parent_id] = node.id
+            node = self.nodes.get(node.parent_id)
+        leaf = node_id
+        while leaf in self.selected:
+            leaf = self.selected[leaf]
+        return leaf
+
+    def path(self, leaf_id=None):
+        """Messages from the root to leaf_id (default: the active leaf), oldest first."""
+        if leaf_id is None:
+            if None not in self.selected:
+                return []
+            leaf_id = self.select(self.selected[None])
+        path = []
+        node = self.nodes.get(leaf_id)
+        while node is not None:
+            path.append(node)
+            node = self.nodes.get(node.parent_id)
+        path.reverse()
+        return path
@@ -0,0 +1,28 @@
+# Display name -> Ollama tag for the models offered in the UI
+
+CHAT_MODELS = {
+    "NeuroGenius": "llama2:7b",
+    "NeuroGenius1": "mistral:7b",
+    "NeuroGenius2": "deepseek-r1:7b"
+}
+
+VISION_MODELS = {
+    "NeuroVision": "granite3.2-vision:latest",
+    "NeuroVision1.0": "llama3.2-vision:11b",
+    "NeuroVision2.0": "gemma3:4b"
+}
+
+DEFAULT_CHAT_MODEL = "mistral:7b"
+
+# Context window (tokens) per tag, and how much of it is kept free for the reply
+CONTEXT_WINDOWS = {
+    "llama2:7b": 4096,
+    "mistral:7b": 8192,
+    "deepseek-r1:7b": 8192,
+    "granite3.2-vision:latest": 8192,
+    "llama3.2-vision:11b": 8192,
+    "gemma3:4b": 8192
+}
+
+DEFAULT_CONTEXT_WINDOW = 4096
+RESPONSE_RESERVE_TOKENS = 1024
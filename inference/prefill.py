@@ -0,0 +1,129 @@
+import os
+import threading
+
+from .engine import get_engine
+from .scheduler import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
+
+# Opt-in: evaluate the conversation prefix while the user is still typing
+PREFILL_ENABLED = os.environ.get("NEUROGENIUS_PREFILL", "0") == "1"
+# Milliseconds of typing inactivity before a prefill is sent
+PREFILL_DEBOUNCE_MS = 600
+# Generate nothing; Ollama only evaluates the prompt into its KV cache
+PREFILL_OPTIONS = {"num_predict": 0}
+
+
+class PrefillRecord:
+    __slots__ = ("model", "key", "future", "prompt_eval_count", "prompt_eval_ms")
+
+    def __init__(self, model, key, future):
+        self.model = model
+        self.key = key
+        self.future = future
+        self.prompt_eval_count = None
+        self.prompt_eval_ms = None
+
+
+class Prefiller:
+    """
+    Sends a chat's known message prefix to Ollama with num_predict 0 while the user
+    types, so the prefix is already evaluated when Send is pressed.
+
+    Prefills run at background priority and are skipped while interactive requests
+    wait for the model; a running prefill for another chat is cancelled when an
+    interactive request starts on the same model. The time saved is measured by
+    comparing the reply's prompt evaluation with the prefill's.
+    """
+
+    def __init__(self, enabled=PREFILL_ENABLED):
+        self.enabled = enabled
+        self.records = {}  # chat_id -> PrefillRecord for the chat's latest prefill
+        self.counters = {"sent": 0, "skipped": 0, "cancelled": 0, "reused": 0, "missed": 0}
+        self.saved_ms = 0.0
+        self._lock = threading.Lock()
+
+    def prefill(self, chat_id, model, messages, keep_alive):
+        """
+        Prefill messages (the /api/chat list the next send will start with) for the chat.
+        Returns the engine future, or None when skipped.
+        """
+        if not self.enabled or not messages:
+            return None
+        engine = get_engine()
+        key = (model, len(messages), hash(messages[-1]["content"]))
+        with self._lock:
+            current = self.records.get(chat_id)
+            if current is not None and current.key == key:
+                return None  # This prefix is already evaluated or on its way
+        if engine.scheduler.waiting(model, PRIORITY_INTERACTIVE):
+            with self._lock:
+                self.counters["skipped"] += 1
+            return None
+        if current is not None:
+            self._cancel(current)
+        future = engine.chat(model, messages, priority=PRIORITY_BACKGROUND, keep_alive=keep_alive,
+                             options=PREFILL_OPTIONS)
+        record = PrefillRecord(model, key, future)
+        future.add_done_callback(lambda done: self._finished(record, done))
+        with self._lock:
+            self.records[chat_id] = record
+            self.counters["sent"] += 1
+        return future
+
+    def _finished(self, record, future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        stats = future.result()["stats"]
+        if stats.get("prompt_eval_duration"):
+            record.prompt_eval_count = stats.get("prompt_eval_count")
+            record.prompt_eval_ms = stats["prompt_eval_duration"] / 1e6
+
+    def _cancel(self, record):
+        if not record.future.done():
+            get_engine().cancel(record.future)
+            with self._lock:
+                self.counters["cancelled"] += 1
+
+    def yield_to_interactive(self, model, chat_id=None):
+        """Cancel running prefills on the model, except the one for chat_id (its send reuses it)."""
+        with self._lock:
+            records = [record for owner, record in self.records.items()
+                       if owner != chat_id and record.model == model and not record.future.done()]
+        for record in records:
+            self._cancel(record)
+
+    def record_reply(self, chat_id, stats):
+        """
+        Account for a reply sent after a prefill. When Ollama evaluated fewer prompt
+        tokens than the prefill did, the prefix was reused and the prefill's evaluation
+        time was taken off the critical path. Returns the milliseconds saved, or None.
+        """
+        with self._lock:
+            record = self.records.pop(chat_id, None)
+        if record is None or record.prompt_eval_ms is None or not stats:
+            return None
+        reused = (stats.get("prompt_eval_count") or 0) < (record.prompt_eval_count or 0)
+        with self._lock:
+            self.counters["reused" if reused else "missed"] += 1
+            if reused:
+                self.saved_ms += record.prompt_eval_ms
+        return record.prompt_eval_ms if reused else 0.0
+
+    def stats(self):
+        with self._lock:
+            report = dict(self.counters)
+            report["saved_ms"] = self.saved_ms
+            report["enabled"] = self.enabled
+            return report
+
+
+_prefiller = None
+_prefiller_lock = threading.Lock()
+
+
+def get_prefiller():
+    """Return the process-wide prefiller."""
+    global _prefiller
+    with _prefiller_lock:
+        if _prefiller is None:
+            _prefiller = Prefiller()
+        return _prefiller
@@ -0,0 +1,175 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from .client import get_client
+from .endpoints import ENDPOINTS
+from .models import CHAT_MODELS, VISION_MODELS
+
+# Every tag the chat and document screens can select
+REQUIRED_MODELS = sorted(set(CHAT_MODELS.values()) | set(VISION_MODELS.values()))
+
+MAX_PARALLEL_PULLS = int(os.environ.get("NEUROGENIUS_MAX_PARALLEL_PULLS", "3"))
+PULL_RETRIES = 5  # Further attempts after an interrupted pull; Ollama resumes partial blobs
+RETRY_BACKOFF_SECONDS = 2  # Doubled after each failed attempt
+MAX_RETRY_BACKOFF_SECONDS = 60
+PULL_TIMEOUT = (10, 300)  # Connect, and longest silence between progress lines
+
+
+def normalize_tag(model):
+    """Ollama lists untagged models as name:latest."""
+    return model if ":" in model else f"{model}:latest"
+
+
+class PullProgress:
+    """Progress of one model pull on one endpoint, summed over the model's layers."""
+    __slots__ = ("model", "url", "status", "completed", "total", "attempt", "done", "error", "layers")
+
+    def __init__(self, model, url):
+        self.model = model
+        self.url = url
+        self.status = "queued"
+        self.completed = 0
+        self.total = 0
+        self.attempt = 0
+        self.done = False
+        self.error = None
+        self.layers = {}  # digest -> (completed, total)
+
+    @property
+    def fraction(self):
+        if self.done and self.error is None:
+            return 1.0
+        return self.completed / self.total if self.total else 0.0
+
+    def update(self, chunk):
+        self.status = chunk.get("status", self.status)
+        if chunk.get("digest") and chunk.get("total"):
+            self.layers[chunk["digest"]] = (chunk.get("completed", 0), chunk["total"])
+            self.completed = sum(completed for completed, _ in self.layers.values())
+            self.total = sum(total for _, total in self.layers.values())
+
+
+class ModelProvisioner:
+    """
+    Makes sure every required model is installed on every endpoint.
+
+    missing() compares the required tags with /api/tags; provision() pulls what is
+    missing through /api/pull, several pulls at a time, reporting progress through a
+    callback (invoked on the worker threads). An interrupted pull (connection error,
+    timeout or a stream that ends early) is retried with backoff; Ollama keeps the
+    partially downloaded blobs, so the retry resumes instead of starting over. Errors
+    Ollama reports itself, such as an unknown model, fail the pull right away.
+    """
+
+    def __init__(self, models=REQUIRED_MODELS, urls=None, max_parallel=MAX_PARALLEL_PULLS, retries=PULL_RETRIES,
+                 backoff=RETRY_BACKOFF_SECONDS):
+        self.models = [normalize_tag(model) for model in models]
+        self.urls = list(urls or ENDPOINTS)
+        self.max_parallel = max_parallel
+        self.retries = retries
+        self.backoff = backoff
+        self._cancel = threading.Event()
+        self._thread = None
+
+    def missing(self):
+        """Required models not installed, as {url: [tags]}. Unreachable endpoints are skipped."""
+        missing = {}
+        for url in self.urls:
+            try:
+                response = get_client(url).get("/api/tags", timeout=5)
+                response.raise_for_status()
+                installed = {normalize_tag(entry["name"]) for entry in response.json().get("models", [])}
+            except Exception as e:
+                print(f"Error listing models on {url}: {str(e)}")
+                continue
+            absent = [model for model in self.models if model not in installed]
+            if absent:
+                missing[url] = absent
+        return missing
+
+    def pull(self, url, model, on_progress=None, progress=None):
+        """Pull one model, retrying interrupted downloads. Returns its PullProgress."""
+        progress = progress or PullProgress(model, url)
+        client = get_client(url)
+        delay = self.backoff
+        while not self._cancel.is_set():
+            progress.attempt += 1
+            try:
+                with client.stream("/api/pull", {"model": model, "stream": True}, timeout=PULL_TIMEOUT) as response:
+                    response.raise_for_status()
+                    for chunk in client.iter_stream(response):
+                        if "error" in chunk:
+                            raise RuntimeError(chunk["error"])
+                        progress.update(chunk)
+                        if on_progress is not None:
+                            on_progress(progress)
+                        if self._cancel.is_set():
+                            break
+                if progress.status == "success":
+                    progress.done = True
+                    break
+                if self._cancel.is_set():
+                    progress.error = "cancelled"
+                    progress.done = True
+                    break
+                raise ConnectionError("download interrupted")
+            except (httpx.TransportError, ConnectionError) as e:
+                if progress.attempt > self.retries:
+                    progress.error = str(e)
+                    progress.done = True
+                    break
+                progress.status = f"retrying in {delay:.0f}s ({str(e)})"
+                if on_progress is not None:
+                    on_progress(progress)
+                if self._cancel.wait(delay):
+                    break
+                delay = min(MAX_RETRY_BACKOFF_SECONDS, delay * 2)
+            except Exception as e:
+                # An error chunk or status from Ollama; retrying gives the same answer
+                progress.error = str(e)
+                progress.done = True
+                break
+        if not progress.done:
+            progress.error = "cancelled"
+            progress.done = True
+        if on_progress is not None:
+            on_progress(progress)
+        return progress
+
+    def provision(self, on_progress=None, missing=None):
+        """
+        Pull every missing model (max_parallel at a time). Returns the PullProgress of
+        each pull; a model that failed has error set.
+        """
+        missing = self.missing() if missing is None else missing
+        pulls = [PullProgress(model, url) for url, models in missing.items() for model in models]
+        if not pulls:
+            return []
+        if on_progress is not None:
+            for progress in pulls:
+                on_progress(progress)
+        with ThreadPoolExecutor(max_workers=self.max_parallel, thread_name_prefix="ModelPull") as pool:
+            futures = [pool.submit(self.pull, progress.url, progress.model, on_progress, progress) for progress in pulls]
+            return [future.result() for future in futures]
+
+    def start(self, on_progress=None, on_finished=None):
+        """Run provision() on a background thread; on_finished receives the results."""
+        if self._thread is not None and self._thread.is_alive():
+            return False
+        self._cancel.clear()
+
+        def run():
+            results = self.provision(on_progress)
+            if on_finished is not None:
+                on_finished(results)
+
+        self._thread = threading.Thread(target=run, name="ModelProvisioner", daemon=True)
+        self._thread.start()
+        return True
+
+    def cancel(self):
+        """Stop pulling; Ollama keeps what was downloaded, so a later run resumes."""
+        self._cancel.set()
@@ -0,0 +1,77 @@
+import os
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+
+# Reasoning traces are stored and shown, but left out of later prompts unless opted in
+INCLUDE_REASONING = os.environ.get("NEUROGENIUS_INCLUDE_REASONING", "0") == "1"
+
+
+def _partial_tag(text, tag):
+    """Length of the longest suffix of text that could be the start of tag."""
+    for length in range(min(len(tag) - 1, len(text)), 0, -1):
+        if text.endswith(tag[:length]):
+            return length
+    return 0
+
+
+class ReasoningParser:
+    """
+    Splits a streamed reply into answer text and reasoning (<think>...</think>, as
+    emitted by deepseek-r1) while it streams. Tags split across chunks are held back
+    until they can be recognized, so no markup leaks into either stream.
+    """
+    __slots__ = ("in_reasoning", "pending", "answer_started")
+
+    def __init__(self):
+        self.in_reasoning = False
+        self.pending = ""
+        self.answer_started = False
+
+    def feed(self, text):
+        """Consume a chunk; returns the (answer, reasoning) text it completes."""
+        self.pending += text
+        answer = []
+        reasoning = []
+        while self.pending:
+            tag = THINK_CLOSE if self.in_reasoning else THINK_OPEN
+            index = self.pending.find(tag)
+            if index < 0:
+                keep = _partial_tag(self.pending, tag)
+                cut = len(self.pending) - keep
+                (reasoning if self.in_reasoning else answer).append(self.pending[:cut])
+                self.pending = self.pending[cut:]
+                break
+            (reasoning if self.in_reasoning else answer).append(self.pending[:index])
+            self.pending = self.pending[index + len(tag):]
+            self.in_reasoning = not self.in_reasoning
+        return self._answer("".join(answer)), "".join(reasoning)
+
+    def finish(self):
+        """Flush whatever is held back at the end of the stream."""
+        text, self.pending = self.pending, ""
+        if self.in_reasoning:
+            return "", text
+        return self._answer(text), ""
+
+    def _answer(self, text):
+        # The answer usually follows the reasoning block after blank lines
+        if not self.answer_started:
+            text = text.lstrip()
+            self.answer_started = bool(text)
+        return text
+
+
+def split_reasoning(text):
+    """Split a complete reply into (answer, reasoning); reasoning is "" when there is none."""
+    parser = ReasoningParser()
+    answer, reasoning = parser.feed(text)
+    tail_answer, tail_reasoning = parser.finish()
+    return (answer + tail_answer).strip(), (reasoning + tail_reasoning).strip()
+
+
+def prompt_content(answer, reasoning):
+    """Text a reply contributes to later prompts: the answer only, unless reasoning is opted in."""
+    if INCLUDE_REASONING and reasoning:
+        return f"{THINK_OPEN}{reasoning}{THINK_CLOSE}\n\n{answer}"
+    return answer
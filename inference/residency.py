@@ -0,0 +1,231 @@
+import os
+import threading
+import time
+
+from .client import get_client
+from .endpoints import ENDPOINTS
+from .engine import get_engine
+from .scheduler import PRIORITY_BACKGROUND
+
+# Total model memory (bytes, as reported by /api/ps) we allow to stay resident
+MEMORY_BUDGET = int(float(os.environ.get("NEUROGENIUS_MODEL_MEMORY_GB", "16")) * 1024 ** 3)
+# A model used this many times in the session is pinned (kept loaded longer)
+PIN_AFTER_USES = 3
+# Unpinned models idle this long are candidates for unloading
+IDLE_UNLOAD_SECONDS = 600
+# How often the background sweep checks the budget
+SWEEP_INTERVAL_SECONDS = 60
+
+DEFAULT_KEEP_ALIVE = "10m"
+# Finite, so a pinned model still leaves the shared server if the app exits without unpinning
+PINNED_KEEP_ALIVE = "60m"
+# Warm-ups only load the model: nothing is generated (which also keeps them out of hedging)
+WARM_OPTIONS = {"num_predict": 0}
+# Longest the shutdown release may hold up closing the window
+RELEASE_TIMEOUT_SECONDS = 2
+
+
+class ModelResidencyManager:
+    """
+    Tracks which Ollama models are loaded ("hot") and decides how long they stay.
+
+    - warm(): load a model in the background so the first real request skips the load
+    - keep_alive_for(): keep_alive value to send with a request; frequently used models are pinned
+    - sweep(): unload least recently used models while the loaded set exceeds the memory budget
+    - release(): on shutdown, hand pinned models back to the default keep_alive
+    """
+
+    def __init__(self, memory_budget=MEMORY_BUDGET, pin_after_uses=PIN_AFTER_USES,
+                 idle_unload_seconds=IDLE_UNLOAD_SECONDS):
+        self.memory_budget = memory_budget
+        self.pin_after_uses = pin_after_uses
+        self.idle_unload_seconds = idle_unload_seconds
+        self.uses = {}  # model -> request count this session
+        self.last_used = {}  # model -> time.monotonic() of last request
+        self.pinned = set()
+        self.hot = {}  # model -> /api/ps entry, refreshed by refresh()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ------------------- Usage tracking -------------------
+
+    def record_use(self, model):
+        with self._lock:
+            self.uses[model] = self.uses.get(model, 0) + 1
+            self.last_used[model] = time.monotonic()
+            if self.uses[model] >= self.pin_after_uses:
+                self.pinned.add(model)
+
+    def pin(self, model):
+        with self._lock:
+            self.pinned.add(model)
+
+    def unpin(self, model):
+        with self._lock:
+            self.pinned.discard(model)
+
+    def keep_alive_for(self, model):
+        """Record a use of the model and return the keep_alive to send with the request."""
+        self.record_use(model)
+        with self._lock:
+            return PINNED_KEEP_ALIVE if model in self.pinned else DEFAULT_KEEP_ALIVE
+
+    def current_keep_alive(self, model):
+        """The keep_alive the model currently gets, without counting a use (for prefill and warm-up)."""
+        with self._lock:
+            return PINNED_KEEP_ALIVE if model in self.pinned else DEFAULT_KEEP_ALIVE
+
+    # ------------------- Loading and unloading -------------------
+
+    def warm(self, model):
+        """
+        Load the model in the background. An empty prompt with num_predict 0 makes
+        Ollama load the weights without generating anything. Returns the engine future.
+        """
+        if model in self.hot:
+            return None
+        with self._lock:
+            keep_alive = PINNED_KEEP_ALIVE if model in self.pinned else DEFAULT_KEEP_ALIVE
+            self.last_used.setdefault(model, time.monotonic())
+        return get_engine().generate(model, "", priority=PRIORITY_BACKGROUND, keep_alive=keep_alive,
+                                     options=WARM_OPTIONS)
+
+    def set_keep_alive(self, model, keep_alive, timeout=30):
+        """Send keep_alive for the model to every endpoint that has it loaded (0 unloads it)."""
+        urls = self.hot.get(model, {}).get("endpoints", ENDPOINTS)
+        applied = False
+        for url in urls:
+            try:
+                get_client(url).generate(model, "", timeout=timeout, keep_alive=keep_alive)
+                applied = True
+            except Exception as e:
+                print(f"Error setting keep_alive of model {model} on {url}: {str(e)}")
+        return applied
+
+    def unload(self, model):
+        """Unload the model from every endpoint that has it loaded."""
+        unloaded = self.set_keep_alive(model, 0)
+        if unloaded:
+            with self._lock:
+                self.hot.pop(model, None)
+                self.pinned.discard(model)
+        return unloaded
+
+    def refresh(self):
+        """
+        Refresh the hot set from /api/ps on every endpoint. Sizes are summed when a
+        model is loaded on several endpoints. Returns the loaded model names.
+        """
+        hot = {}
+        for url in ENDPOINTS:
+            try:
+                response = get_client(url).get("/api/ps", timeout=5)
+                response.raise_for_status()
+                models = response.json().get("models", [])
+            except Exception as e:
+                print(f"Error reading loaded models from {url}: {str(e)}")
+                continue
+            for entry in models:
+                merged = hot.setdefault(entry["name"], {"name": entry["name"], "size": 0, "endpoints": []})
+                merged["size"] += entry.get("size", 0)
+                merged["endpoints"].append(url)
+        with self._lock:
+            self.hot = hot
+            return list(self.hot)
+
+    def sweep(self):
+        """
+        Unload models until the loaded set (pinned models included) fits the memory
+        budget: idle unpinned models first, then pinned ones, least recently used first
+        within each group. Models with requests in flight are left alone. Returns the
+        unloaded model names.
+        """
+        self.refresh()
+        now = time.monotonic()
+        busy = {model for model, queue in get_engine().scheduler.stats().items() if queue["in_flight"]}
+        with self._lock:
+            resident = sum(entry.get("size", 0) for entry in self.hot.values())
+            candidates = sorted(
+                (model for model in self.hot
+                 if model not in busy
+                 and (model in self.pinned or now - self.last_used.get(model, 0) >= self.idle_unload_seconds)),
+                key=lambda model: (model in self.pinned, self.last_used.get(model, 0))
+            )
+        unloaded = []
+        for model in candidates:
+            if resident <= self.memory_budget:
+                break
+            size = self.hot.get(model, {}).get("size", 0)
+            if self.unload(model):
+                resident -= size
+                unloaded.append(model)
+        return unloaded
+
+    def status(self):
+        """Report per-model residency: loaded, pinned, size, uses and idle time."""
+        now = time.monotonic()
+        with self._lock:
+            models = set(self.hot) | set(self.uses) | self.pinned
+            return [
+                {
+                    "model": model,
+                    "hot": model in self.hot,
+                    "pinned": model in self.pinned,
+                    "size": self.hot.get(model, {}).get("size", 0),
+                    "uses": self.uses.get(model, 0),
+                    "idle_seconds": int(now - self.last_used[model]) if model in self.last_used else None
+                }
+                for model in sorted(models)
+            ]
+
+    # ------------------- Background sweep -------------------
+
+    def start(self, interval=SWEEP_INTERVAL_SECONDS):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), name="ModelResidency", daemon=True)
+        self._thread.start()
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            self.sweep()
+
+    def stop(self):
+        self._stop.set()
+        self._thread = None
+
+    def release(self, timeout=RELEASE_TIMEOUT_SECONDS):
+        """
+        Give pinned models back the default keep_alive (on application shutdown), so
+        Ollama unloads them once they go idle instead of holding them for this session.
+        The requests go out in parallel and the call returns after timeout seconds at
+        most; unreachable servers drop the pin when PINNED_KEEP_ALIVE runs out.
+        """
+        with self._lock:
+            pinned = [model for model in self.pinned if model in self.hot]
+            self.pinned.clear()
+        threads = [
+            threading.Thread(target=self.set_keep_alive, args=(model, DEFAULT_KEEP_ALIVE, timeout),
+                             name=f"Release {model}", daemon=True)
+            for model in pinned
+        ]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + timeout
+        for thread in threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_residency_manager():
+    """Return the process-wide residency manager."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = ModelResidencyManager()
+        return _manager
@@ -0,0 +1,278 @@
+import os
+import re
+import threading
+import time
+
+from .client import get_client
+from .endpoints import ENDPOINTS
+from .engine import get_engine
+from .models import DEFAULT_CHAT_MODEL, RESPONSE_RESERVE_TOKENS
+
+# Chat model setting that lets the router choose for every message
+AUTO_MODEL = "auto"
+
+# Time to first token the router aims for when it has a choice
+LATENCY_BUDGET_MS = float(os.environ.get("NEUROGENIUS_LATENCY_BUDGET_MS", "4000"))
+# How long discovered model metadata is trusted before it is fetched again
+CATALOG_TTL_SECONDS = 300
+# Rough cold-load speed (model bytes read into memory per second)
+LOAD_BYTES_PER_S = float(os.environ.get("NEUROGENIUS_LOAD_GBPS", "1.5")) * 1024 ** 3
+# Throughput assumed for a 7B model until the latency tracker has samples; other
+# sizes are scaled by parameter count
+DEFAULT_PROMPT_TOKENS_PER_S_7B = 150.0
+DEFAULT_TOKENS_PER_S_7B = 15.0
+TYPICAL_REPLY_TOKENS = 256  # Used to estimate how long a queued request occupies a slot
+
+
+def parse_parameter_size(value):
+    """Billions of parameters from Ollama's parameter_size ("7.2B", "566M"), or None."""
+    match = re.match(r"([\d.]+)\s*([BM])", str(value or "").upper())
+    if not match:
+        return None
+    number = float(match.group(1))
+    return number if match.group(2) == "B" else number / 1000
+
+
+class ModelInfo:
+    """What the router knows about one installed model, from /api/tags and /api/show."""
+    __slots__ = ("name", "size", "parameters", "quantization", "family", "context_length", "vision", "chat")
+
+    def __init__(self, name, size, parameters, quantization, family, context_length, vision, chat):
+        self.name = name
+        self.size = size  # Bytes on disk, roughly the memory needed to load it
+        self.parameters = parameters  # Billions, None if unknown
+        self.quantization = quantization
+        self.family = family
+        self.context_length = context_length  # None if /api/show did not say
+        self.vision = vision
+        self.chat = chat  # False for embedding-only models
+
+    @classmethod
+    def from_metadata(cls, tag, show):
+        details = show.get("details") or tag.get("details") or {}
+        capabilities = show.get("capabilities") or []
+        families = details.get("families") or []
+        context_length = next(
+            (value for key, value in (show.get("model_info") or {}).items() if key.endswith(".context_length")),
+            None
+        )
+        vision = "vision" in capabilities or "projector_info" in show or bool({"clip", "mllama"} & set(families))
+        if capabilities:
+            chat = "completion" in capabilities
+        else:
+            chat = "embed" not in tag["name"] and "bert" not in (details.get("family") or "")
+        return cls(
+            tag["name"], tag.get("size", 0), parse_parameter_size(details.get("parameter_size")),
+            details.get("quantization_level"), details.get("family"), context_length, vision, chat
+        )
+
+
+class RouteDecision:
+    __slots__ = ("model", "preferred", "estimate_ms", "reason")
+
+    def __init__(self, model, preferred, estimate_ms, reason):
+        self.model = model
+        self.preferred = preferred
+        self.estimate_ms = estimate_ms  # Estimated time to first token, None if unknown
+        self.reason = reason
+
+    @property
+    def rerouted(self):
+        return self.model != self.preferred
+
+
+class ModelRouter:
+    """
+    Picks the model that answers a chat message.
+
+    Installed models and their size, quantization, context length and capabilities
+    are discovered from /api/tags and /api/show on every endpoint and cached for
+    CATALOG_TTL_SECONDS; refreshes run on a background thread so routing never waits
+    on the network. Each candidate's time to first token is estimated from whether it
+    is loaded (cold-load time from its size), its queue on the scheduler and its
+    prompt throughput (measured by the latency tracker, or scaled from its parameter
+    count).
+
+    With AUTO_MODEL the smallest capable model that fits the latency budget answers.
+    A model the user chose answers whenever it is loaded with a free slot, however long
+    the prompt; only while it is cold or its slots are taken, and it would miss the
+    budget, does a faster text-chat model stand in. Prompt tokens a loaded model already
+    holds in its KV cache (the chat's earlier turns) are not charged, so staying on the
+    model that answered last is credited with the prefix reuse.
+    """
+
+    def __init__(self, latency_budget_ms=LATENCY_BUDGET_MS, ttl=CATALOG_TTL_SECONDS):
+        self.latency_budget_ms = latency_budget_ms
+        self.ttl = ttl
+        self.catalog = {}  # tag -> ModelInfo
+        self.refreshed_at = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    # ------------------- Discovery -------------------
+
+    def refresh(self):
+        """Fetch model metadata from every endpoint. Returns the number of models found."""
+        catalog = {}
+        try:
+            for url in ENDPOINTS:
+                client = get_client(url)
+                try:
+                    response = client.get("/api/tags", timeout=5)
+                    response.raise_for_status()
+                    tags = response.json().get("models", [])
+                except Exception as e:
+                    print(f"Error listing models on {url}: {str(e)}")
+                    continue
+                for tag in tags:
+                    if tag["name"] in catalog:
+                        continue
+                    try:
+                        show = client.post("/api/show", {"model": tag["name"]}, timeout=10)
+                        show.raise_for_status()
+                        show = show.json()
+                    except Exception as e:
+                        print(f"Error reading details of {tag['name']} on {url}: {str(e)}")
+                        show = {}
+                    catalog[tag["name"]] = ModelInfo.from_metadata(tag, show)
+            with self._lock:
+                if catalog:
+                    self.catalog = catalog
+                    self.refreshed_at = time.monotonic()
+        finally:
+            # Reset however the refresh ends, or refresh_async() would never run again
+            with self._lock:
+                self._refreshing = False
+        return len(catalog)
+
+    def refresh_async(self, force=False):
+        """Refresh the catalog on a background thread when it is stale (or force)."""
+        with self._lock:
+            fresh = self.refreshed_at is not None and time.monotonic() - self.refreshed_at < self.ttl
+            if self._refreshing or (fresh and not force):
+                return False
+            self._refreshing = True
+        threading.Thread(target=self.refresh, name="ModelRouterRefresh", daemon=True).start()
+        return True
+
+    def models(self):
+        with self._lock:
+            return dict(self.catalog)
+
+    # ------------------- Estimates -------------------
+
+    def availability(self, model):
+        """(loaded, queued): whether the model is loaded anywhere, and whether a request would wait for a slot."""
+        engine = get_engine()
+        loaded = any(model in endpoint.loaded for endpoint in engine.endpoints.endpoints)
+        queue = engine.scheduler.stats().get(model)
+        return loaded, bool(queue and queue["in_flight"] >= queue["max_in_flight"])
+
+    def estimate_ms(self, info, prompt_tokens, cached_tokens=0):
+        """
+        Estimated milliseconds until the model's first token for a prompt of this size,
+        of which cached_tokens are already in the model's KV cache (if it is loaded).
+        """
+        engine = get_engine()
+        scale = 7.0 / info.parameters if info.parameters else 1.0
+        latency = engine.latency.stats().get(info.name, {})
+        prompt_rate = latency.get("prompt_tokens_per_s_p50") or DEFAULT_PROMPT_TOKENS_PER_S_7B * scale
+        token_rate = latency.get("tokens_per_s_p50") or DEFAULT_TOKENS_PER_S_7B * scale
+        loaded, queued = self.availability(info.name)
+        if loaded:
+            estimate = max(0, prompt_tokens - cached_tokens) / prompt_rate * 1000
+        else:
+            # A freshly loaded model evaluates the whole prompt
+            estimate = (prompt_tokens / prompt_rate + info.size / LOAD_BYTES_PER_S) * 1000
+        if queued:
+            # Wait for the requests ahead to finish, at a typical reply length each
+            queue = engine.scheduler.stats()[info.name]
+            estimate += (queue["queued"] + 1) * TYPICAL_REPLY_TOKENS / token_rate * 1000
+        return estimate
+
+    # ------------------- Routing -------------------
+
+    def capable(self, info, prompt_tokens, needs_vision=False):
+        """Whether the model can stand in: a text (or vision) chat model with room for the prompt."""
+        if not info.chat or info.vision != needs_vision:
+            return False
+        return info.context_length is None or info.context_length >= prompt_tokens + RESPONSE_RESERVE_TOKENS
+
+    def route(self, preferred, prompt_tokens, needs_vision=False, cached=None, latency_budget_ms=None):
+        """
+        Choose the model for a request of prompt_tokens tokens. preferred is the chat's
+        model setting (a tag or AUTO_MODEL); cached maps a model to the number of this
+        prompt's leading tokens it already holds in its KV cache. Returns a RouteDecision.
+        """
+        budget = self.latency_budget_ms if latency_budget_ms is None else latency_budget_ms
+        cached = cached or {}
+        self.refresh_async()
+        catalog = self.models()
+        auto = preferred == AUTO_MODEL
+        fallback = DEFAULT_CHAT_MODEL if auto else preferred
+        if not catalog:
+            return RouteDecision(fallback, preferred, None, "model list not loaded yet")
+
+        def estimate(info):
+            return self.estimate_ms(info, prompt_tokens, cached.get(info.name, 0))
+
+        chosen = None if auto else catalog.get(preferred)
+        if chosen is not None:
+            # The user's choice stands unless it is cold or busy and would miss the budget
+            loaded, queued = self.availability(preferred)
+            chosen_ms = estimate(chosen)
+            if (loaded and not queued) or chosen_ms <= budget:
+                return RouteDecision(preferred, preferred, chosen_ms, "selected model")
+
+        candidates = [info for info in catalog.values() if self.capable(info, prompt_tokens, needs_vision)]
+        if not candidates:
+            return RouteDecision(fallback, preferred, None, "no installed model fits the request")
+        estimates = {info.name: estimate(info) for info in candidates}
+
+        if auto:
+            within = [info for info in candidates if estimates[info.name] <= budget]
+            if within:
+                choice = min(within, key=lambda info: (info.size, estimates[info.name]))
+                return RouteDecision(choice.name, preferred, estimates[choice.name],
+                                     "smallest model within the latency budget")
+            choice = min(candidates, key=lambda info: estimates[info.name])
+            return RouteDecision(choice.name, preferred, estimates[choice.name],
+                                 "fastest model (none fits the latency budget)")
+
+        choice = min(candidates, key=lambda info: estimates[info.name])
+        if chosen is None:
+            return RouteDecision(choice.name, preferred, estimates[choice.name], f"{preferred} is not installed")
+        if estimates[choice.name] >= chosen_ms:
+            return RouteDecision(preferred, preferred, chosen_ms, "selected model (nothing faster is available)")
+        state = "busy" if loaded else "loading"
+        return RouteDecision(choice.name, preferred, estimates[choice.name],
+                             f"{preferred} is {state} and would miss the latency budget")
+
+    def status(self):
+        """Discovered models with their metadata and current first-token estimate."""
+        return [
+            {
+                "model": info.name,
+                "size": info.size,
+                "parameters": info.parameters,
+                "quantization": info.quantization,
+                "context_length": info.context_length,
+                "vision": info.vision,
+                "chat": info.chat,
+                "estimate_ms": self.estimate_ms(info, 0)
+            }
+            for info in sorted(self.models().values(), key=lambda info: info.size)
+        ]
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    """Return the process-wide model router."""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter()
+        return _router
@@ -0,0 +1,155 @@
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+# Priority classes: lower values are served first
+PRIORITY_INTERACTIVE = 0  # Chat turns the user is waiting on
+PRIORITY_BACKGROUND = 1  # Warm-ups, summarization
+PRIORITY_BATCH = 2  # Scripted / bulk document jobs
+
+MAX_IN_FLIGHT_PER_MODEL = int(os.environ.get("NEUROGENIUS_MAX_IN_FLIGHT", "2"))
+MAX_QUEUE_PER_MODEL = int(os.environ.get("NEUROGENIUS_MAX_QUEUE", "32"))
+# Chat replies generating at once across all chats; further sends wait their turn
+MAX_CHAT_GENERATIONS = int(os.environ.get("NEUROGENIUS_MAX_CHAT_GENERATIONS", "4"))
+WAIT_SAMPLES = 200  # Wait times kept per model for the percentile report
+
+
+class QueueFullError(Exception):
+    """Raised when a model's queue is at capacity."""
+
+
+class ModelQueue:
+    """Admission state for one model."""
+
+    def __init__(self, max_in_flight, max_queue):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.heap = []  # (priority, seq, future)
+        self.waits_ms = deque(maxlen=WAIT_SAMPLES)
+        self.served = 0
+        self.rejected = 0
+
+
+class InferenceScheduler:
+    """
+    Admits inference requests per model on the engine's event loop.
+
+    Each model has a bounded priority queue and a cap on concurrent requests, so
+    interactive chat is never stuck behind background or batch work and a burst of
+    requests cannot oversubscribe one model. A hedged duplicate takes a slot of its
+    own through try_acquire(), so hedging never exceeds the cap either. Queue depth and
+    wait times are exposed through stats().
+    """
+
+    def __init__(self, max_in_flight=MAX_IN_FLIGHT_PER_MODEL, max_queue=MAX_QUEUE_PER_MODEL):
+        self.default_max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.limits = {}  # model -> max in-flight override
+        self.queues = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()  # Guards snapshots taken from other threads
+
+    def set_limit(self, model, max_in_flight):
+        with self._lock:
+            self.limits[model] = max_in_flight
+            if model in self.queues:
+                self.queues[model].max_in_flight = max_in_flight
+
+    def _queue(self, model):
+        queue = self.queues.get(model)
+        if queue is None:
+            queue = ModelQueue(self.limits.get(model, self.default_max_in_flight), self.max_queue)
+            self.queues[model] = queue
+        return queue
+
+    async def acquire(self, model, priority=PRIORITY_INTERACTIVE):
+        """Wait for a slot on the model. Raises QueueFullError when the queue is full."""
+        started = time.perf_counter()
+        with self._lock:
+            queue = self._queue(model)
+            if queue.in_flight < queue.max_in_flight and not queue.heap:
+                queue.in_flight += 1
+                queue.waits_ms.append(0.0)
+                queue.served += 1
+                return
+            if len(queue.heap) >= queue.max_queue:
+                queue.rejected += 1
+                raise QueueFullError(f"Too many requests queued for {model}")
+            waiter = asyncio.get_running_loop().create_future()
+            heapq.heappush(queue.heap, (priority, next(self._seq), waiter))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.done() and not waiter.cancelled():
+                    # The slot was handed over just as we were cancelled; pass it on
+                    self._release_locked(model)
+                else:
+                    queue.heap = [entry for entry in queue.heap if entry[2] is not waiter]
+                    heapq.heapify(queue.heap)
+            raise
+        with self._lock:
+            queue.waits_ms.append((time.perf_counter() - started) * 1000)
+            queue.served += 1
+
+    def try_acquire(self, model):
+        """Take a slot on the model only if one is free and nobody is queued; returns whether it did."""
+        with self._lock:
+            queue = self._queue(model)
+            if queue.in_flight < queue.max_in_flight and not queue.heap:
+                queue.in_flight += 1
+                return True
+            return False
+
+    def release(self, model):
+        with self._lock:
+            self._release_locked(model)
+
+    def _release_locked(self, model):
+        queue = self.queues[model]
+        queue.in_flight -= 1
+        while queue.heap and queue.in_flight < queue.max_in_flight:
+            _, _, waiter = heapq.heappop(queue.heap)
+            if waiter.done():
+                continue
+            queue.in_flight += 1
+            waiter.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, model, priority=PRIORITY_INTERACTIVE):
+        await self.acquire(model, priority)
+        try:
+            yield
+        finally:
+            self.release(model)
+
+    def waiting(self, model, max_priority=PRIORITY_INTERACTIVE):
+        """Number of queued requests for the model at or above the given priority class."""
+        with self._lock:
+            queue = self.queues.get(model)
+            if queue is None:
+                return 0
+            return sum(1 for priority, _, waiter in queue.heap if priority <= max_priority and not waiter.done())
+
+    def stats(self):
+        """Per-model queue depth, in-flight count and wait-time figures."""
+        with self._lock:
+            report = {}
+            for model, queue in self.queues.items():
+                waits = sorted(queue.waits_ms)
+                report[model] = {
+                    "queued": len(queue.heap),
+                    "in_flight": queue.in_flight,
+                    "max_in_flight": queue.max_in_flight,
+                    "served": queue.served,
+                    "rejected": queue.rejected,
+                    "wait_ms_avg": sum(waits) / len(waits) if waits else 0.0,
+                    "wait_ms_p95": waits[int(0.95 * (len(waits) - 1))] if waits else 0.0
+                }
+            return report
@@ -0,0 +1,160 @@
+import os
+import queue
+import threading
+
+from database.database_chat import get_chat_summary, save_chat_summary
+
+from .context import count_tokens
+from .engine import get_engine
+from .messages import format_turn
+from .scheduler import PRIORITY_BATCH
+
+# Small model used for summaries, so they never compete with chat models for memory
+SUMMARY_MODEL = os.environ.get("NEUROGENIUS_SUMMARY_MODEL", "gemma3:4b")
+# The newest messages are always sent verbatim and never folded into the summary
+RECENT_MESSAGES = 8
+# Fold older messages once at least this many have accumulated past the recent window
+SUMMARY_BATCH = 6
+SUMMARY_OPTIONS = {"temperature": 0, "num_predict": 512}
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a user and an AI assistant.\n"
+    "Update the summary with the new turns below. Keep facts, names, decisions, open questions "
+    "and the user's preferences; drop small talk. Answer with the updated summary only, "
+    "in at most 250 words.\n\n"
+    "Current summary:\n{summary}\n\n"
+    "New turns:\n{turns}\n\n"
+    "Updated summary:"
+)
+
+
+def summary_system_prompt(summary):
+    """System message that stands in for the summarized turns."""
+    return f"Summary of the earlier conversation:\n{summary}"
+
+
+class ChatSummarizer:
+    """
+    Folds a chat's older turns into a rolling summary stored in chatdata.db.
+
+    Summaries are incremental: each update sends the previous summary plus the turns
+    added since, never the whole history. Work runs on one background thread at batch
+    priority, so it only uses inference slots interactive requests leave free.
+    """
+
+    def __init__(self, model=SUMMARY_MODEL, recent_messages=RECENT_MESSAGES, batch=SUMMARY_BATCH):
+        self.model = model
+        self.recent_messages = recent_messages
+        self.batch = batch
+        self.summaries = {}  # chat_id -> {"summary", "covered_messages", ...}
+        self.pending = set()  # chat_ids queued or being summarized
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def get(self, chat_id):
+        """Return the chat's summary record (loaded from the database once), or None."""
+        with self._lock:
+            if chat_id in self.summaries:
+                return self.summaries[chat_id]
+        summary = get_chat_summary(chat_id)
+        with self._lock:
+            return self.summaries.setdefault(chat_id, summary)
+
+    def current(self, chat_id, messages):
+        """
+        The chat's summary if it applies to the branch in messages (a MessageStore):
+        the messages it covers must still be the first ones on that branch.
+        """
+        summary = self.get(chat_id)
+        if summary is None:
+            return None
+        covered = summary["covered_messages"]
+        if covered > len(messages):
+            return None
+        last_covered_id = summary.get("last_covered_id")
+        if last_covered_id is not None and messages[covered - 1].id != last_covered_id:
+            return None
+        return summary
+
+    def maybe_update(self, chat_id, messages):
+        """
+        Queue an update when enough turns have piled up outside the recent window.
+        messages is the chat's MessageStore; a snapshot of the turns to fold is taken.
+        A summary of another branch is replaced by one of this branch.
+        """
+        current = self.current(chat_id, messages)
+        covered = current["covered_messages"] if current else 0
+        target = len(messages) - self.recent_messages
+        if target - covered < self.batch:
+            return False
+        with self._lock:
+            if chat_id in self.pending:
+                return False
+            self.pending.add(chat_id)
+        snapshot = [(message.role, message.content) for message in messages[covered:target]]
+        self._queue.put((chat_id, current, snapshot, target, messages[target - 1].id))
+        self.start()
+        return True
+
+    # ------------------- Background worker -------------------
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="ChatSummarizer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            chat_id = item[0]
+            try:
+                self._summarize(*item)
+            except Exception as e:
+                print(f"Error summarizing chat {chat_id}: {str(e)}")
+            finally:
+                with self._lock:
+                    self.pending.discard(chat_id)
+
+    def _summarize(self, chat_id, current, turns, covered_messages, last_covered_id):
+        transcript = "".join(format_turn(role, content) for role, content in turns)
+        prompt = SUMMARY_PROMPT.format(summary=current["summary"] if current else "(none yet)", turns=transcript)
+        result = get_engine().generate(
+            self.model, prompt, priority=PRIORITY_BATCH, options=SUMMARY_OPTIONS
+        ).result()
+        summary = result["text"].strip()
+        if result.get("cancelled") or not summary:
+            return
+        record = {
+            "summary": summary,
+            "covered_messages": covered_messages,
+            "last_covered_id": last_covered_id,
+            "token_count": count_tokens(summary),
+            "model": self.model
+        }
+        save_chat_summary(chat_id, **record)
+        with self._lock:
+            self.summaries[chat_id] = record
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+
+
+_summarizer = None
+_summarizer_lock = threading.Lock()
+
+
+def get_summarizer():
+    """Return the process-wide chat summarizer."""
+    global _summarizer
+    with _summarizer_lock:
+        if _summarizer is None:
+            _summarizer = ChatSummarizer()
+        return _summarizer
@@ -0,0 +1,132 @@
+import os
+import platform
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from urllib.parse import urlparse
+
+import orjson
+
+from database.connection import get_connection
+
+# Ensure database directory exists
+DB_DIR = Path("database")
+DB_DIR.mkdir(exist_ok=True)
+DB_PATH = DB_DIR / "tuning.db"
+
+# Ollama runtime options the tuner searches and the engine applies
+TUNED_OPTIONS = ("num_ctx", "num_thread", "num_batch")
+LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1", "0.0.0.0"}
+
+
+@lru_cache(maxsize=None)
+def host_profile(url):
+    """
+    Identify the machine behind an Ollama endpoint. A local server is this machine
+    (hostname, architecture and CPU count, so changed hardware gets tuned again);
+    a remote one is identified by host and port.
+    """
+    parsed = urlparse(url)
+    if parsed.hostname in LOCAL_HOSTS:
+        return f"{platform.node()}/{platform.machine()}/{os.cpu_count()}cpu"
+    return parsed.netloc
+
+
+class TunedOptions:
+    """
+    Best runtime options per (model, host profile), as found by tools.tune_ollama.
+
+    Settings live in SQLite and are cached in memory (misses included), so applying
+    them to a request is a dictionary lookup. Options a request sets explicitly win.
+    """
+
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = str(db_path)
+        self.cache = {}  # (model, host) -> options dict, {} when untuned
+        self._lock = threading.Lock()
+        self.init_db()
+
+    def init_db(self):
+        conn = get_connection(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS tuned_options (
+            model TEXT NOT NULL,
+            host TEXT NOT NULL,
+            options TEXT NOT NULL,
+            reference_seconds REAL NOT NULL,
+            tokens_per_s REAL,
+            prompt_tokens_per_s REAL,
+            tuned_at REAL NOT NULL,
+            PRIMARY KEY (model, host)
+        )
+        ''')
+        conn.commit()
+
+    def get(self, model, host):
+        """Return the tuned options for the model on the host, or {}."""
+        key = (model, host)
+        with self._lock:
+            if key in self.cache:
+                return self.cache[key]
+        conn = get_connection(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("SELECT options FROM tuned_options WHERE model = ? AND host = ?", key)
+        row = cursor.fetchone()
+        options = orjson.loads(row[0]) if row else {}
+        with self._lock:
+            return self.cache.setdefault(key, options)
+
+    def save(self, model, host, options, reference_seconds, tokens_per_s=None, prompt_tokens_per_s=None):
+        options = {name: options[name] for name in TUNED_OPTIONS if name in options}
+        conn = get_connection(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT OR REPLACE INTO tuned_options "
+            "(model, host, options, reference_seconds, tokens_per_s, prompt_tokens_per_s, tuned_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (model, host, orjson.dumps(options).decode(), reference_seconds, tokens_per_s,
+             prompt_tokens_per_s, time.time())
+        )
+        conn.commit()
+        with self._lock:
+            self.cache[(model, host)] = options
+
+    def all(self):
+        """Every stored setting, for reports."""
+        conn = get_connection(self.db_path)
+        cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row
+        cursor.execute("SELECT * FROM tuned_options ORDER BY host, model")
+        rows = [dict(row) for row in cursor.fetchall()]
+        for row in rows:
+            row["options"] = orjson.loads(row["options"])
+        return rows
+
+    def apply(self, payload, url):
+        """
+        Return payload with the model's tuned options for the endpoint at url filled in
+        under its own options. Every request to a model gets the same values, so Ollama
+        never reloads the model because num_ctx or num_batch changed between requests.
+        """
+        tuned = self.get(payload["model"], host_profile(url))
+        if not tuned:
+            return payload
+        options = dict(tuned)
+        options.update(payload.get("options") or {})
+        return {**payload, "options": options}
+
+
+_tuned = None
+_tuned_lock = threading.Lock()
+
+
+def get_tuned_options():
+    """Return the process-wide tuned option store."""
+    global _tuned
+    with _tuned_lock:
+        if _tuned is None:
+            _tuned = TunedOptions()
+        return _tuned
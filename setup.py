@@ -11,7 +11,10 @@ setup(
         "llama-index",
         "speechrecognition",
         "pyttsx3",
-        "requests",
+        "httpx",
+        "orjson",
+        # Token counting for the context budget; without it counts fall back to an estimate
+        "tiktoken",
         "numpy",
         "pillow",
     ],
@@ -0,0 +1,50 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# The data modules open their SQLite files under ./database when they are imported, so
+# the suite runs from a scratch directory instead of touching the checked-in databases
+os.chdir(tempfile.mkdtemp(prefix="neurogenius-tests-"))
+
+from inference.engine import InferenceEngine  # noqa: E402
+from tools.mock_ollama import MockConfig, MockOllamaServer  # noqa: E402
+
+
+@pytest.fixture
+def mock_server():
+    """Start a fast mock Ollama server; call it with MockConfig options for more than one."""
+    servers = []
+
+    def start(**options):
+        options.setdefault("ttft", 0.02)
+        options.setdefault("token_rate", 500.0)
+        options.setdefault("response_tokens", 8)
+        server = MockOllamaServer(config=MockConfig(seed=0, **options)).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def engine_for():
+    """Start an inference engine on the given endpoint URLs; shut down after the test."""
+    engines = []
+
+    def start(*urls):
+        engine = InferenceEngine(list(urls))
+        engine.start()
+        engines.append(engine)
+        return engine
+
+    yield start
+    for engine in engines:
+        engine.shutdown()
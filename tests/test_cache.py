@@ -0,0 +1,92 @@
+import time
+
+import pytest
+
+from document_processing.integration import DocumentSessions
+from inference.cache import ResponseCache, is_deterministic, make_key
+
+MODEL = "mistral:7b"
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(db_path=tmp_path / "responsecache.db", memory_entries=2)
+
+
+def test_only_reproducible_requests_are_cacheable():
+    assert not is_deterministic(None)
+    assert not is_deterministic({"temperature": 0.7})
+    assert is_deterministic({"seed": 7})
+    assert is_deterministic({"temperature": 0})
+
+
+def test_key_covers_model_prompt_and_options():
+    key = make_key(MODEL, "Hi", {"seed": 1, "temperature": 0})
+    assert key == make_key(MODEL, "Hi", {"temperature": 0, "seed": 1})
+    assert key != make_key("llama2:7b", "Hi", {"seed": 1, "temperature": 0})
+    assert key != make_key(MODEL, "Hello", {"seed": 1, "temperature": 0})
+    assert key != make_key(MODEL, "Hi", {"seed": 2, "temperature": 0})
+    messages = [{"role": "user", "content": "Hi"}]
+    assert make_key(MODEL, messages, None) == make_key(MODEL, list(messages), {})
+
+
+def test_hits_come_from_memory_then_disk(tmp_path, cache):
+    key = make_key(MODEL, "Hi", {"seed": 1})
+    assert cache.get(key) is None
+    cache.put(key, MODEL, "Hello", 120)
+    assert cache.get(key) == "Hello"
+    # A new cache on the same file only has the SQLite tier
+    reopened = ResponseCache(db_path=tmp_path / "responsecache.db")
+    assert reopened.get(key) == "Hello"
+    assert reopened.get(key) == "Hello"
+    stats = reopened.stats()
+    assert (stats["disk_hits"], stats["memory_hits"], stats["misses"]) == (1, 1, 0)
+    assert stats["saved_ms"] == 240
+    assert stats["lifetime_hits"] == 3
+    assert cache.stats()["misses"] == 1
+
+
+def test_memory_tier_is_bounded(cache):
+    for index in range(3):
+        cache.put(f"key {index}", MODEL, f"reply {index}", 10)
+    assert list(cache.memory) == ["key 1", "key 2"]
+    assert cache.get("key 0") == "reply 0"
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_disk_tier_evicts_least_recently_used(tmp_path):
+    cache = ResponseCache(db_path=tmp_path / "responsecache.db", memory_entries=0, max_entries=2)
+    cache.put("old", MODEL, "old reply", 10)
+    time.sleep(0.01)
+    cache.put("used", MODEL, "used reply", 10)
+    time.sleep(0.01)
+    assert cache.get("old") == "old reply"
+    time.sleep(0.01)
+    cache.put("new", MODEL, "new reply", 10)
+    assert cache.get("used") is None
+    assert cache.get("old") == "old reply"
+    assert cache.stats()["entries"] == 2
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = ResponseCache(db_path=tmp_path / "responsecache.db", memory_entries=0, max_age_seconds=0)
+    cache.put("key", MODEL, "reply", 10)
+    time.sleep(0.01)
+    assert cache.get("key") is None
+
+
+def test_document_queries_are_unseeded_unless_enabled():
+    assert DocumentSessions(seed=None).query_options() is None
+    assert DocumentSessions(seed=42).query_options() == {"seed": 42}
+    assert not is_deterministic(DocumentSessions(seed=None).query_options())
+
+
+def test_engine_serves_a_seeded_request_from_the_cache(mock_server, engine_for):
+    server = mock_server()
+    engine = engine_for(server.url)
+    prompt = f"cached question {time.time()}"
+    first = engine.generate(MODEL, prompt, options={"seed": 3}).result(10)
+    second = engine.generate(MODEL, prompt, options={"seed": 3}).result(10)
+    assert second["text"] == first["text"]
+    assert second.get("cached")
+    assert server.state.requests == 1
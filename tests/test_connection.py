@@ -0,0 +1,51 @@
+import sqlite3
+import threading
+
+import pytest
+
+from database.connection import close_connections, get_connection
+
+
+def in_thread(function):
+    """Run function on a new thread and return its result."""
+    result = []
+    thread = threading.Thread(target=lambda: result.append(function()))
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+def test_one_connection_per_thread_and_path(tmp_path):
+    first = get_connection(tmp_path / "one.db")
+    assert get_connection(str(tmp_path / "one.db")) is first
+    assert get_connection(tmp_path / "two.db") is not first
+    assert in_thread(lambda: get_connection(tmp_path / "one.db")) is not first
+
+
+def test_connections_use_wal(tmp_path):
+    conn = get_connection(tmp_path / "wal.db")
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_uncommitted_work_is_rolled_back(tmp_path):
+    conn = get_connection(tmp_path / "rollback.db")
+    conn.execute("CREATE TABLE IF NOT EXISTS items (name TEXT)")
+    conn.commit()
+    conn.execute("INSERT INTO items VALUES ('lost')")
+    assert conn.in_transaction
+    conn = get_connection(tmp_path / "rollback.db")
+    assert not conn.in_transaction
+    assert conn.execute("SELECT COUNT(*) FROM items").fetchone()[0] == 0
+
+
+def test_closed_connections_reopen_lazily(tmp_path):
+    path = tmp_path / "reopen.db"
+    first = get_connection(path)
+    other = in_thread(lambda: get_connection(path))
+    close_connections()
+    for conn in (first, other):
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+    second = get_connection(path)
+    assert second is not first
+    assert second.execute("SELECT 1").fetchone()[0] == 1
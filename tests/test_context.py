@@ -0,0 +1,79 @@
+from inference.context import MESSAGE_OVERHEAD_TOKENS, build_context, context_budget, context_window
+from inference.engine import with_context_window
+from inference.messages import MessageStore
+from inference.models import DEFAULT_CONTEXT_WINDOW, RESPONSE_RESERVE_TOKENS
+
+MODEL = "mistral:7b"
+TOKENS = 10
+COST = TOKENS + MESSAGE_OVERHEAD_TOKENS  # What one message counts against the budget
+
+
+def make_store(count):
+    """A chat of count alternating user/assistant turns, TOKENS tokens each."""
+    store = MessageStore()
+    for index in range(count):
+        store.append("user" if index % 2 == 0 else "assistant", f"message {index}", tokens=TOKENS)
+    return store
+
+
+def contents(messages):
+    return [message["content"] for message in messages]
+
+
+def test_everything_fits():
+    store = make_store(4)
+    messages, report = build_context(store, MODEL, budget=1000)
+    assert contents(messages) == [f"message {index}" for index in range(4)]
+    assert report.used_tokens == 4 * COST
+    assert (report.dropped_messages, report.dropped_tokens) == (0, 0)
+
+
+def test_oldest_turns_are_dropped_and_the_first_user_message_is_pinned():
+    store = make_store(6)
+    messages, report = build_context(store, MODEL, budget=3 * COST)
+    assert contents(messages) == ["message 0", "message 4", "message 5"]
+    assert report.used_tokens == 3 * COST
+    assert report.dropped_messages == 3
+    assert report.dropped_tokens == 3 * COST
+
+
+def test_pinned_messages_are_kept_over_budget():
+    store = make_store(6)
+    messages, report = build_context(store, MODEL, budget=1)
+    assert contents(messages) == ["message 0", "message 5"]
+    assert report.used_tokens == 2 * COST
+    assert report.dropped_messages == 4
+
+
+def test_system_prompt_comes_first():
+    store = make_store(2)
+    messages, report = build_context(store, MODEL, system_prompt="Be brief.", budget=1000)
+    assert messages[0] == {"role": "system", "content": "Be brief."}
+    assert contents(messages[1:]) == ["message 0", "message 1"]
+    assert report.used_tokens > 2 * COST
+
+
+def test_summarized_messages_are_skipped():
+    store = make_store(6)
+    messages, report = build_context(store, MODEL, budget=1000, start=2)
+    assert contents(messages) == ["message 2", "message 3", "message 4", "message 5"]
+    assert report.dropped_messages == 0
+
+
+def test_empty_chat():
+    messages, report = build_context(MessageStore(), MODEL, budget=1000)
+    assert messages == []
+    assert report.used_tokens == 0
+
+
+def test_budget_follows_the_context_window():
+    assert context_window("unknown-model") == DEFAULT_CONTEXT_WINDOW
+    assert context_budget(MODEL) == context_window(MODEL) - RESPONSE_RESERVE_TOKENS
+
+
+def test_requests_carry_the_budgeted_context_window():
+    payload = with_context_window({"model": MODEL, "options": {"temperature": 0.2}})
+    assert payload["options"] == {"temperature": 0.2, "num_ctx": context_window(MODEL)}
+    # A window the request already sets is left alone
+    payload = {"model": MODEL, "options": {"num_ctx": 2048}}
+    assert with_context_window(payload) is payload
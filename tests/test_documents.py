@@ -0,0 +1,54 @@
+from document_processing import integration
+from document_processing.integration import DocumentSessions, build_document_prompt, document_prefix
+
+MODEL = "granite3.2-vision"
+DOCUMENT = "Quarterly revenue grew by twelve percent. " * 200
+
+
+def test_prompt_starts_with_the_document_prefix():
+    history = [{"query": "Revenue?", "response": "Up 12%."}]
+    prompt = build_document_prompt(DOCUMENT, history, "Costs?")
+    assert prompt.startswith(document_prefix(DOCUMENT))
+    assert prompt.endswith("Question: Revenue?\nAnswer: Up 12%.\n\nQuestion: Costs?\nAnswer:")
+
+
+def test_document_is_counted_once_per_version(tmp_path, monkeypatch):
+    counted = []
+
+    def count_tokens(text):
+        counted.append(len(text))
+        return max(1, len(text) // 4)
+
+    monkeypatch.setattr(integration, "count_tokens", count_tokens)
+    path = tmp_path / "report.txt"
+    path.write_text(DOCUMENT)
+    sessions = DocumentSessions()
+    history = []
+    for question in ("Revenue?", "Costs?", "Outlook?"):
+        content = sessions.content(str(path), lambda file_path: path.read_text())
+        session = sessions.session(str(path), MODEL, "10m")
+        prompt = build_document_prompt(content, history, question)
+        sessions.record(session, prompt, {"prompt_eval_count": 500, "prompt_eval_duration": 50_000_000})
+        history.append({"query": question, "response": "Fine."})
+    # The prefix once, then only the short tails of each prompt
+    assert counted[0] == len(document_prefix(DOCUMENT))
+    assert all(length < 200 for length in counted[1:])
+    assert len(counted) == 4
+
+
+def test_saved_time_is_estimated_from_skipped_tokens(tmp_path):
+    path = tmp_path / "report.txt"
+    path.write_text(DOCUMENT)
+    sessions = DocumentSessions()
+    content = sessions.content(str(path), lambda file_path: path.read_text())
+    session = sessions.session(str(path), MODEL, "10m")
+    prompt = build_document_prompt(content, [], "Revenue?")
+    full = session.prefix_tokens + integration.count_tokens(prompt[session.prefix_chars:])
+    # The first query evaluates everything at 0.1 ms per token
+    assert sessions.record(session, prompt, {"prompt_eval_count": full, "prompt_eval_duration": full * 100_000}) == 0.0
+    # The next one only evaluates its last 20 tokens
+    prompt = build_document_prompt(content, [{"query": "Revenue?", "response": "Up."}], "Costs?")
+    estimated = session.prefix_tokens + integration.count_tokens(prompt[session.prefix_chars:])
+    saved = sessions.record(session, prompt, {"prompt_eval_count": 20, "prompt_eval_duration": 2_000_000})
+    assert abs(saved - (estimated - 20) * 0.1) < 1e-6
+    assert sessions.stats()[0]["queries"] == 2
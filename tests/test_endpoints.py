@@ -0,0 +1,77 @@
+import asyncio
+
+import httpx
+import pytest
+
+from inference.endpoints import EndpointPool, EndpointUnavailable
+
+MODEL = "mistral:7b"
+DEAD_URL = "http://127.0.0.1:9"  # Nothing listens on the discard port
+
+
+def test_pick_prefers_loaded_then_installed_then_least_busy():
+    pool = EndpointPool(["http://a", "http://b", "http://c"])
+    a, b, c = pool.endpoints
+    for endpoint in pool.endpoints:
+        endpoint.models = {MODEL}
+    a.outstanding = 1
+    assert pool.pick(MODEL) is b
+    c.loaded = {MODEL}
+    c.outstanding = 5
+    assert pool.pick(MODEL) is c
+    c.loaded = set()
+    b.models = {"llama2:7b"}
+    b.outstanding = 0
+    assert pool.pick(MODEL) is a
+
+
+def test_pick_skips_failed_and_excluded_endpoints():
+    pool = EndpointPool(["http://a", "http://b"])
+    a, b = pool.endpoints
+    pool.mark_failed(a)
+    assert pool.pick(MODEL) is b
+    # With every endpoint down a request is still tried rather than refused outright
+    pool.mark_failed(b)
+    assert pool.pick(MODEL) in (a, b)
+    assert pool.pick(MODEL, exclude=[a, b]) is None
+    pool.mark_ok(a, MODEL)
+    assert pool.pick(MODEL) is a
+    assert MODEL in a.loaded
+
+
+def test_probe_reads_models_and_health(mock_server):
+    server = mock_server()
+    pool = EndpointPool([server.url, DEAD_URL])
+
+    async def probe():
+        async with httpx.AsyncClient() as client:
+            await pool.probe_all(client)
+
+    asyncio.run(probe())
+    live, dead = pool.endpoints
+    assert live.healthy and MODEL in live.models and live.probe_ms is not None
+    assert not dead.healthy
+
+
+def test_unreachable_endpoint_fails_over(mock_server, engine_for):
+    server = mock_server()
+    engine = engine_for(DEAD_URL, server.url)
+    engine.endpoints.endpoints[0].healthy = True  # Before the first probe says otherwise
+    result = engine.generate(MODEL, "hello").result(10)
+    assert result["text"]
+    assert server.state.requests == 1
+
+
+def test_server_error_fails_over(mock_server, engine_for):
+    failing = mock_server(failure_rate=1.0)
+    healthy = mock_server()
+    engine = engine_for(failing.url, healthy.url)
+    for _ in range(3):
+        assert engine.generate(MODEL, "hello").result(10)["text"]
+    assert healthy.state.requests == 3
+
+
+def test_no_endpoint_left(mock_server, engine_for):
+    engine = engine_for(DEAD_URL)
+    with pytest.raises((EndpointUnavailable, httpx.ConnectError)):
+        engine.generate(MODEL, "hello").result(10)
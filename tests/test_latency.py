@@ -0,0 +1,77 @@
+import pytest
+
+from inference import latency
+from inference.engine import InferenceTimeout
+from inference.latency import (
+    DEFAULT_FIRST_TOKEN_TIMEOUT, DEFAULT_TOKEN_GAP_TIMEOUT, MAX_FIRST_TOKEN_TIMEOUT, MIN_SAMPLES, LatencyTracker
+)
+
+MODEL = "mistral:7b"
+
+
+def record(tracker, ttft_ms, tokens_per_s=20.0, prompt_tokens_per_s=100.0, samples=MIN_SAMPLES):
+    stats = {
+        "eval_count": int(tokens_per_s * 10), "eval_duration": 10 * 10 ** 9,
+        "prompt_eval_count": int(prompt_tokens_per_s), "prompt_eval_duration": 10 ** 9
+    }
+    for _ in range(samples):
+        tracker.record(MODEL, ttft_ms, stats)
+
+
+def test_fixed_defaults_until_enough_samples():
+    tracker = LatencyTracker()
+    record(tracker, 500, samples=MIN_SAMPLES - 1)
+    assert tracker.first_token_timeout(MODEL) == DEFAULT_FIRST_TOKEN_TIMEOUT
+    assert tracker.token_gap_timeout(MODEL) == DEFAULT_TOKEN_GAP_TIMEOUT
+    assert tracker.hedge_delay(MODEL) is None
+
+
+def test_first_token_timeout_follows_ttft_and_prompt_size():
+    tracker = LatencyTracker()
+    record(tracker, 10_000, prompt_tokens_per_s=100)
+    # Twice the p99 TTFT, plus 1.5x the time to evaluate a 1000-token prompt
+    assert tracker.first_token_timeout(MODEL, prompt_chars=4000) == pytest.approx(20 + 15)
+    assert tracker.first_token_timeout(MODEL, prompt_chars=10 ** 7) == MAX_FIRST_TOKEN_TIMEOUT
+
+
+def test_timeouts_have_floors():
+    tracker = LatencyTracker()
+    record(tracker, 100, tokens_per_s=50)
+    assert tracker.first_token_timeout(MODEL) == latency.MIN_FIRST_TOKEN_TIMEOUT
+    assert tracker.token_gap_timeout(MODEL) == latency.MIN_TOKEN_GAP_TIMEOUT
+
+
+def test_token_gap_allows_ten_slow_tokens():
+    tracker = LatencyTracker()
+    record(tracker, 100, tokens_per_s=0.5)
+    assert tracker.token_gap_timeout(MODEL) == pytest.approx(20)
+
+
+def test_hedge_delay_is_p95_ttft(monkeypatch):
+    tracker = LatencyTracker()
+    for ttft_ms in range(100, 2100, 100):
+        tracker.record(MODEL, ttft_ms, {})
+    assert tracker.hedge_delay(MODEL) == pytest.approx(2.0)
+    monkeypatch.setattr(latency, "HEDGING_ENABLED", False)
+    assert tracker.hedge_delay(MODEL) is None
+
+
+def test_engine_learns_latency_from_requests(mock_server, engine_for):
+    server = mock_server(ttft=0.05)
+    engine = engine_for(server.url)
+    for _ in range(MIN_SAMPLES):
+        engine.generate(MODEL, "hello").result(10)
+    stats = engine.latency.stats()[MODEL]
+    assert stats["samples"] == MIN_SAMPLES
+    assert 40 <= stats["ttft_p50_ms"] < 1000
+    assert engine.latency.hedge_delay(MODEL) is not None
+
+
+def test_silent_model_times_out(mock_server, engine_for, monkeypatch):
+    monkeypatch.setattr(latency, "MIN_FIRST_TOKEN_TIMEOUT", 0.3)
+    server = mock_server(stall_rate=1.0)
+    engine = engine_for(server.url)
+    record(engine.latency, 50)
+    with pytest.raises(InferenceTimeout):
+        engine.generate(MODEL, "hello").result(10)
+    assert engine.scheduler.stats()[MODEL]["in_flight"] == 0
@@ -0,0 +1,81 @@
+from inference.context import MESSAGE_OVERHEAD_TOKENS
+from inference.messages import MessageNode, MessageStore, MessageTree
+
+
+def make_tree():
+    """
+    1 (user) -> 2 (assistant) -> 3 (user) -> 4 (assistant)
+                              \\-> 5 (user, an edit of 3) -> 6 (assistant)
+    """
+    tree = MessageTree()
+    tree.add(MessageNode(1, None, "user", "Hi"))
+    tree.add(MessageNode(2, 1, "assistant", "Hello"))
+    tree.add(MessageNode(3, 2, "user", "Tell me a joke"))
+    tree.add(MessageNode(4, 3, "assistant", "Knock knock"))
+    tree.add(MessageNode(5, 2, "user", "Tell me a fact"))
+    tree.add(MessageNode(6, 5, "assistant", "Honey never spoils"))
+    return tree
+
+
+def ids(nodes):
+    return [node.id for node in nodes]
+
+
+# ------------------- MessageTree -------------------
+
+def test_newest_branch_is_active():
+    tree = make_tree()
+    assert ids(tree.path()) == [1, 2, 5, 6]
+
+
+def test_siblings_in_creation_order():
+    tree = make_tree()
+    assert tree.siblings(3) == [3, 5]
+    assert tree.siblings(5) == [3, 5]
+    assert tree.siblings(1) == [1]
+
+
+def test_select_switches_branch_and_returns_its_leaf():
+    tree = make_tree()
+    assert tree.select(3) == 4
+    assert ids(tree.path()) == [1, 2, 3, 4]
+    # Selecting the other branch again remembers where it ended
+    assert tree.select(5) == 6
+    assert ids(tree.path()) == [1, 2, 5, 6]
+
+
+def test_path_to_a_given_leaf():
+    tree = make_tree()
+    assert ids(tree.path(4)) == [1, 2, 3, 4]
+    assert ids(tree.path(2)) == [1, 2]
+
+
+def test_empty_tree():
+    assert MessageTree().path() == []
+
+
+# ------------------- MessageStore -------------------
+
+def test_store_keeps_running_totals_and_prepared_dicts():
+    store = MessageStore()
+    store.append("user", "Hi", tokens=3)
+    store.append("assistant", "Hello", tokens=5)
+    assert list(store.cumulative) == [0, 3 + MESSAGE_OVERHEAD_TOKENS, 8 + 2 * MESSAGE_OVERHEAD_TOKENS]
+    assert store.tokens_between(1, 2) == 5 + MESSAGE_OVERHEAD_TOKENS
+    assert store.as_dicts() == [{"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Hello"}]
+    assert store.as_dicts(1) == [{"role": "assistant", "content": "Hello"}]
+
+
+def test_truncate_drops_the_tail():
+    store = MessageStore()
+    store.append("assistant", "Welcome", tokens=2)
+    store.append("user", "Hi", tokens=3)
+    store.append("assistant", "Hello", tokens=5)
+    assert store.first_user_index() == 1
+    store.truncate(1)
+    assert len(store) == 1
+    assert len(store.cumulative) == 2
+    assert store.as_dicts() == [{"role": "assistant", "content": "Welcome"}]
+    assert store.first_user_index() is None
+    store.append("user", "Hey", tokens=1)
+    assert store.first_user_index() == 1
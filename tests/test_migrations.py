@@ -0,0 +1,159 @@
+import datetime
+
+import pytest
+
+from database import database_chat, db_imagedata
+from database.connection import get_connection
+from database.migrations import migrate
+
+CREATED = "2024-03-01T12:34:56.789000"
+UPDATED = "2024-03-02T08:00:00"
+SENT = ["2024-03-01T12:35:00.250000", "2024-03-01T12:36:10"]
+
+# The chat database's schema before versioned migrations
+BASELINE_CHAT_SCHEMA = '''
+CREATE TABLE chats (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    model TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    FOREIGN KEY (chat_id) REFERENCES chats (id) ON DELETE CASCADE
+);
+CREATE TABLE usage_logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    action TEXT NOT NULL,
+    details TEXT,
+    timestamp TEXT NOT NULL
+);
+CREATE TABLE users (
+    id TEXT PRIMARY KEY,
+    username TEXT NOT NULL,
+    email TEXT NOT NULL,
+    phone TEXT NOT NULL,
+    password TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE documents (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    uploaded_at TEXT NOT NULL,
+    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+);
+'''
+
+BASELINE_IMAGE_SCHEMA = '''
+CREATE TABLE image_history (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    image_path TEXT NOT NULL,
+    timestamp TEXT NOT NULL
+);
+'''
+
+
+def epoch_ms(iso):
+    """What the backfill should store for a local-time ISO timestamp."""
+    return round(datetime.datetime.fromisoformat(iso).timestamp() * 1000)
+
+
+@pytest.fixture
+def chat_db(tmp_path):
+    conn = get_connection(tmp_path / "chatdata.db")
+    conn.executescript(BASELINE_CHAT_SCHEMA)
+    conn.execute("INSERT INTO chats VALUES ('c1', 'u1', 'Chat', 'mistral:7b', ?, ?)", (CREATED, UPDATED))
+    conn.executemany(
+        "INSERT INTO messages (chat_id, role, content, timestamp) VALUES ('c1', ?, ?, ?)",
+        [("user", "Hi", SENT[0]), ("assistant", "Hello", SENT[1])]
+    )
+    conn.execute("INSERT INTO usage_logs (user_id, action, timestamp) VALUES ('u1', 'Sent message', ?)", (SENT[0],))
+    conn.execute("INSERT INTO documents VALUES ('d1', 'u1', 'notes.pdf', '/tmp/notes.pdf', ?)", (CREATED,))
+    conn.commit()
+    return conn
+
+
+def columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def indexes(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+
+def test_baseline_chat_database_is_migrated(chat_db):
+    assert migrate(chat_db, database_chat.MIGRATIONS) == 3
+    versions = [row[0] for row in chat_db.execute("SELECT version FROM schema_version ORDER BY version")]
+    assert versions == [1, 2, 3]
+
+    # Version 1 patches the old tables up in place
+    assert {"token_count", "reasoning", "parent_id", "model"} <= columns(chat_db, "messages")
+    assert "active_message_id" in columns(chat_db, "chats")
+    parents = chat_db.execute("SELECT id, parent_id FROM messages ORDER BY id").fetchall()
+    assert parents == [(1, None), (2, 1)]
+
+    # Version 2 backfills the epoch-millisecond columns from the ISO ones
+    assert chat_db.execute("SELECT created_ms, updated_ms FROM chats").fetchone() == (
+        epoch_ms(CREATED), epoch_ms(UPDATED)
+    )
+    sent = [row[0] for row in chat_db.execute("SELECT timestamp_ms FROM messages ORDER BY id")]
+    assert sent == [epoch_ms(timestamp) for timestamp in SENT]
+    assert chat_db.execute("SELECT timestamp_ms FROM usage_logs").fetchone()[0] == epoch_ms(SENT[0])
+    assert chat_db.execute("SELECT uploaded_ms FROM documents").fetchone()[0] == epoch_ms(CREATED)
+
+    # Version 3 adds the lookup indexes
+    assert {
+        "idx_messages_chat", "idx_messages_chat_time", "idx_chats_user_updated", "idx_usage_logs_user_time",
+        "idx_documents_user_uploaded", "idx_users_username", "idx_users_email", "idx_users_phone"
+    } <= indexes(chat_db)
+    plan = " ".join(row[3] for row in chat_db.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM messages WHERE chat_id = 'c1' ORDER BY id"
+    ))
+    assert "idx_messages_chat" in plan
+
+
+def test_migrations_run_once(chat_db):
+    migrate(chat_db, database_chat.MIGRATIONS)
+    applied = chat_db.execute("SELECT version, applied_at FROM schema_version").fetchall()
+    assert migrate(chat_db, database_chat.MIGRATIONS) == 3
+    assert chat_db.execute("SELECT version, applied_at FROM schema_version").fetchall() == applied
+
+
+def test_failed_migration_leaves_the_version_unchanged(chat_db):
+    def broken(cursor):
+        cursor.execute("CREATE INDEX idx_broken ON messages (chat_id)")
+        raise RuntimeError("boom")
+
+    migrate(chat_db, database_chat.MIGRATIONS)
+    with pytest.raises(RuntimeError):
+        migrate(chat_db, database_chat.MIGRATIONS + [(4, "Broken", broken)])
+    assert chat_db.execute("SELECT MAX(version) FROM schema_version").fetchone()[0] == 3
+    assert "idx_broken" not in indexes(chat_db)
+
+
+def test_new_chat_database_is_created(tmp_path):
+    conn = get_connection(tmp_path / "new.db")
+    assert migrate(conn, database_chat.MIGRATIONS) == 3
+    assert "timestamp_ms" in columns(conn, "messages")
+    assert "chat_summaries" in {row[0] for row in conn.execute("SELECT name FROM sqlite_master")}
+
+
+def test_baseline_image_database_is_migrated(tmp_path):
+    conn = get_connection(tmp_path / "imagedata.db")
+    conn.executescript(BASELINE_IMAGE_SCHEMA)
+    conn.execute("INSERT INTO image_history VALUES ('i1', 'u1', 'a cat', '/tmp/cat.png', ?)", (CREATED,))
+    conn.commit()
+    assert migrate(conn, db_imagedata.MIGRATIONS) == 2
+    assert conn.execute("SELECT timestamp_ms FROM image_history").fetchone()[0] == epoch_ms(CREATED)
+    assert "idx_image_history_user_time" in indexes(conn)
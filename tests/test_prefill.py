@@ -0,0 +1,69 @@
+import time
+
+import pytest
+
+from inference import prefill as prefill_module
+from inference.prefill import Prefiller
+
+MODEL = "mistral:7b"
+MESSAGES = [{"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Hello! How can I help?"}]
+
+
+@pytest.fixture
+def engine(mock_server, engine_for, monkeypatch):
+    """An engine on a mock server whose prompt evaluation takes server_ttft seconds."""
+    def start(server_ttft=0.02):
+        engine = engine_for(mock_server(ttft=server_ttft).url)
+        monkeypatch.setattr(prefill_module, "get_engine", lambda: engine)
+        return engine
+    return start
+
+
+def test_disabled_prefiller_sends_nothing(engine):
+    engine()
+    assert Prefiller(enabled=False).prefill("chat", MODEL, MESSAGES, "10m") is None
+
+
+def test_prefix_is_evaluated_once(engine):
+    engine()
+    prefiller = Prefiller(enabled=True)
+    result = prefiller.prefill("chat", MODEL, MESSAGES, "10m").result(10)
+    assert result["text"] == ""
+    assert result["stats"]["prompt_eval_count"]
+    # Typing on without changing the prefix doesn't send it again
+    assert prefiller.prefill("chat", MODEL, MESSAGES, "10m") is None
+    assert prefiller.stats()["sent"] == 1
+
+
+def test_skipped_while_interactive_requests_wait(engine, monkeypatch):
+    running = engine()
+    monkeypatch.setattr(running.scheduler, "waiting", lambda model, max_priority: 1)
+    prefiller = Prefiller(enabled=True)
+    assert prefiller.prefill("chat", MODEL, MESSAGES, "10m") is None
+    assert prefiller.stats()["skipped"] == 1
+
+
+def test_other_chats_prefill_yields_to_a_send(engine):
+    engine(server_ttft=5)
+    prefiller = Prefiller(enabled=True)
+    future = prefiller.prefill("other chat", MODEL, MESSAGES, "10m")
+    prefiller.yield_to_interactive(MODEL, chat_id="chat")
+    assert future.result(5)["cancelled"]
+    assert prefiller.stats()["cancelled"] == 1
+
+
+def test_reused_prefix_counts_as_saved_time(engine):
+    engine()
+    prefiller = Prefiller(enabled=True)
+    stats = prefiller.prefill("chat", MODEL, MESSAGES, "10m").result(10)["stats"]
+    evaluated = stats["prompt_eval_count"]
+    # The measurements are taken by a done callback that may still be running
+    deadline = time.monotonic() + 5
+    while prefiller.records["chat"].prompt_eval_ms is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # The reply only evaluated the new message, so the prefix came from the KV cache
+    saved = prefiller.record_reply("chat", {"prompt_eval_count": 3})
+    assert saved == pytest.approx(stats["prompt_eval_duration"] / 1e6)
+    # Without a prefill on record there is nothing to account for
+    assert prefiller.record_reply("chat", {"prompt_eval_count": evaluated}) is None
+    assert prefiller.stats()["reused"] == 1
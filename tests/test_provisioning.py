@@ -0,0 +1,46 @@
+import time
+
+from inference.provisioning import ModelProvisioner
+
+MODEL = "phi3:mini"
+
+
+def test_missing_models_are_pulled(mock_server):
+    server = mock_server(models=["mistral:7b"])
+    provisioner = ModelProvisioner(models=["mistral:7b", MODEL], urls=[server.url])
+    assert provisioner.missing() == {server.url: [MODEL]}
+    seen = []
+    results = provisioner.provision(on_progress=lambda progress: seen.append(progress.status))
+    assert [(progress.model, progress.error, progress.fraction) for progress in results] == [(MODEL, None, 1.0)]
+    assert "success" in seen
+    assert provisioner.missing() == {}
+
+
+def test_interrupted_pull_resumes(mock_server):
+    server = mock_server(models=[], pull_interrupt_rate=1.0, pull_size=8 * 1024 ** 2)
+    provisioner = ModelProvisioner(models=[MODEL], urls=[server.url], retries=20, backoff=0.01)
+    progress = provisioner.pull(server.url, MODEL)
+    # Every attempt is cut off, but each one starts where the previous stopped
+    assert progress.error is None
+    assert progress.attempt > 1
+    assert progress.fraction == 1.0
+
+
+def test_error_from_ollama_is_not_retried(mock_server):
+    server = mock_server(models=[], pullable=["mistral:7b"])
+    provisioner = ModelProvisioner(models=[MODEL], urls=[server.url], retries=5, backoff=10)
+    started = time.monotonic()
+    progress = provisioner.pull(server.url, MODEL)
+    assert progress.error == "pull model manifest: file does not exist"
+    assert progress.attempt == 1
+    assert time.monotonic() - started < 5
+
+
+def test_unreachable_endpoint_is_retried_then_fails():
+    provisioner = ModelProvisioner(models=[MODEL], urls=["http://127.0.0.1:9"], retries=2, backoff=0.01)
+    statuses = []
+    progress = provisioner.pull("http://127.0.0.1:9", MODEL, on_progress=lambda p: statuses.append(p.status))
+    assert progress.attempt == 3
+    assert progress.error
+    # Two retries announced, then the final report
+    assert sum(status.startswith("retrying") for status in statuses[:-1]) == 2
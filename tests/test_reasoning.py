@@ -0,0 +1,59 @@
+import pytest
+
+from inference import reasoning
+from inference.reasoning import ReasoningParser, prompt_content, split_reasoning
+
+REPLY = "<think>The user greets me.\nGreet back.</think>\n\nHello there!"
+
+
+def stream(chunks):
+    """Feed chunks through a parser; returns the joined (answer, reasoning)."""
+    parser = ReasoningParser()
+    answer = []
+    thought = []
+    for chunk in chunks:
+        text, reasoning_text = parser.feed(chunk)
+        answer.append(text)
+        thought.append(reasoning_text)
+    text, reasoning_text = parser.finish()
+    return "".join(answer) + text, "".join(thought) + reasoning_text
+
+
+def test_split_complete_reply():
+    assert split_reasoning(REPLY) == ("Hello there!", "The user greets me.\nGreet back.")
+
+
+def test_reply_without_reasoning():
+    assert split_reasoning("Just an answer.") == ("Just an answer.", "")
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 8])
+def test_tags_split_across_chunks(size):
+    chunks = [REPLY[index:index + size] for index in range(0, len(REPLY), size)]
+    assert stream(chunks) == ("Hello there!", "The user greets me.\nGreet back.")
+
+
+def test_partial_tag_is_held_back_until_resolved():
+    parser = ReasoningParser()
+    assert parser.feed("<thi") == ("", "")
+    assert parser.feed("nk>plan") == ("", "plan")
+    assert parser.feed("</th") == ("", "")
+    assert parser.feed("ink>Answer") == ("Answer", "")
+
+
+def test_text_that_only_looks_like_a_tag_is_kept():
+    assert stream(["a <b> c <th", "ing"]) == ("a <b> c <thing", "")
+
+
+def test_unterminated_reasoning_is_flushed_as_reasoning():
+    parser = ReasoningParser()
+    assert parser.feed("<think>still thinking</thi") == ("", "still thinking")
+    assert parser.finish() == ("", "</thi")
+
+
+def test_reasoning_is_left_out_of_prompts_by_default(monkeypatch):
+    monkeypatch.setattr(reasoning, "INCLUDE_REASONING", False)
+    assert prompt_content("Hello there!", "Greet back.") == "Hello there!"
+    monkeypatch.setattr(reasoning, "INCLUDE_REASONING", True)
+    assert prompt_content("Hello there!", "Greet back.") == "<think>Greet back.</think>\n\nHello there!"
+    assert prompt_content("Hello there!", "") == "Hello there!"
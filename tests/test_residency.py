@@ -0,0 +1,28 @@
+import time
+
+from inference.residency import ModelResidencyManager
+
+MODEL = "mistral:7b"
+
+
+def test_release_hands_pinned_models_back(mock_server):
+    server = mock_server()
+    residency = ModelResidencyManager()
+    residency.hot = {MODEL: {"name": MODEL, "size": 0, "endpoints": [server.url]}}
+    residency.pin(MODEL)
+    residency.release(timeout=5)
+    assert not residency.pinned
+    assert server.state.requests == 1
+    # A finite keep_alive leaves the model loaded until it goes idle
+    assert server.state.loaded_models() == [MODEL]
+
+
+def test_release_does_not_hold_up_shutdown(mock_server):
+    # The model is cold, so the keep_alive request waits out a long load
+    server = mock_server(load_delay=30)
+    residency = ModelResidencyManager()
+    residency.hot = {MODEL: {"name": MODEL, "size": 0, "endpoints": [server.url]}}
+    residency.pin(MODEL)
+    started = time.monotonic()
+    residency.release(timeout=0.5)
+    assert time.monotonic() - started < 2
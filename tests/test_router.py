@@ -0,0 +1,81 @@
+import pytest
+
+from inference import router as router_module
+from inference.engine import InferenceEngine
+from inference.router import AUTO_MODEL, ModelInfo, ModelRouter
+
+MODELS = ["mistral:7b", "llama3.2:1b", "llama3.2-vision:11b", "nomic-embed-text:latest"]
+
+
+@pytest.fixture
+def router(mock_server, monkeypatch):
+    """A router over one mock endpoint; the engine isn't started, so tests set what is loaded."""
+    server = mock_server(models=MODELS, model_size=8 * 1024 ** 3)
+    engine = InferenceEngine([server.url])
+    monkeypatch.setattr(router_module, "ENDPOINTS", [server.url])
+    monkeypatch.setattr(router_module, "get_engine", lambda: engine)
+    router = ModelRouter(latency_budget_ms=4000)
+    assert router.refresh() == len(MODELS)
+    router.engine = engine
+    return router
+
+
+def load(router, *models):
+    router.engine.endpoints.endpoints[0].loaded = set(models)
+
+
+def test_catalog_is_discovered(router):
+    catalog = router.models()
+    assert catalog["mistral:7b"].parameters == 7.0
+    assert catalog["llama3.2:1b"].context_length == 4096
+    assert catalog["llama3.2-vision:11b"].vision
+    assert not catalog["nomic-embed-text:latest"].chat
+
+
+def test_loaded_selected_model_is_kept_for_long_prompts(router):
+    load(router, "mistral:7b", "llama3.2:1b")
+    decision = router.route("mistral:7b", 2000)
+    assert decision.model == "mistral:7b"
+    assert not decision.rerouted
+
+
+def test_cold_selected_model_gives_way_to_a_loaded_one(router):
+    load(router, "llama3.2:1b")
+    decision = router.route("mistral:7b", 500)
+    assert decision.model == "llama3.2:1b"
+    assert decision.reason == "mistral:7b is loading and would miss the latency budget"
+
+
+def test_vision_and_embedding_models_do_not_stand_in(router):
+    load(router, "llama3.2-vision:11b", "nomic-embed-text:latest")
+    decision = router.route("mistral:7b", 500)
+    assert decision.model == "llama3.2:1b"
+
+
+def test_auto_picks_the_smallest_model_within_budget(router):
+    load(router, "mistral:7b", "llama3.2:1b")
+    decision = router.route(AUTO_MODEL, 1000)
+    assert decision.model == "llama3.2:1b"
+    assert decision.reason == "smallest model within the latency budget"
+
+
+def test_cached_prefix_is_not_charged(router):
+    load(router, "mistral:7b")
+    info = router.models()["mistral:7b"]
+    assert router.estimate_ms(info, 1000, cached_tokens=900) == pytest.approx(router.estimate_ms(info, 100))
+    # A cold model evaluates the whole prompt whatever it held before
+    load(router)
+    assert router.estimate_ms(info, 1000, cached_tokens=900) == router.estimate_ms(info, 1000)
+
+
+def test_failed_refresh_does_not_block_later_refreshes(router, monkeypatch):
+    def broken(tag, show):
+        raise ValueError("unexpected metadata")
+
+    monkeypatch.setattr(ModelInfo, "from_metadata", broken)
+    router._refreshing = True  # As refresh_async() sets it
+    with pytest.raises(ValueError):
+        router.refresh()
+    assert not router._refreshing
+    # The previous catalog is kept
+    assert len(router.models()) == len(MODELS)
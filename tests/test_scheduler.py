@@ -0,0 +1,159 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from inference.scheduler import (
+    InferenceScheduler, QueueFullError, PRIORITY_BATCH, PRIORITY_INTERACTIVE
+)
+
+MODEL = "mistral:7b"
+
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 5))
+
+
+# ------------------- Scheduler -------------------
+
+def test_slots_are_per_model():
+    async def scenario():
+        scheduler = InferenceScheduler(max_in_flight=1)
+        await scheduler.acquire(MODEL)
+        waiter = asyncio.create_task(scheduler.acquire(MODEL))
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        # Another model is not held up by the full one
+        await scheduler.acquire("llama2:7b")
+        scheduler.release(MODEL)
+        await waiter
+        stats = scheduler.stats()
+        assert stats[MODEL]["in_flight"] == 1
+        assert stats[MODEL]["served"] == 2
+        assert stats["llama2:7b"]["in_flight"] == 1
+
+    run(scenario())
+
+
+def test_interactive_requests_are_served_before_batch():
+    async def scenario():
+        scheduler = InferenceScheduler(max_in_flight=1)
+        await scheduler.acquire(MODEL)
+        batch = asyncio.create_task(scheduler.acquire(MODEL, PRIORITY_BATCH))
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(scheduler.acquire(MODEL, PRIORITY_INTERACTIVE))
+        await asyncio.sleep(0)
+        assert scheduler.waiting(MODEL, PRIORITY_INTERACTIVE) == 1
+        scheduler.release(MODEL)
+        await interactive
+        assert not batch.done()
+        scheduler.release(MODEL)
+        await batch
+
+    run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        scheduler = InferenceScheduler(max_in_flight=1)
+        await scheduler.acquire(MODEL)
+        waiter = asyncio.create_task(scheduler.acquire(MODEL))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert scheduler.stats()[MODEL]["queued"] == 0
+        scheduler.release(MODEL)
+        assert scheduler.stats()[MODEL]["in_flight"] == 0
+
+    run(scenario())
+
+
+def test_full_queue_rejects():
+    async def scenario():
+        scheduler = InferenceScheduler(max_in_flight=1, max_queue=1)
+        await scheduler.acquire(MODEL)
+        waiter = asyncio.create_task(scheduler.acquire(MODEL))
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFullError):
+            await scheduler.acquire(MODEL)
+        assert scheduler.stats()[MODEL]["rejected"] == 1
+        waiter.cancel()
+
+    run(scenario())
+
+
+def test_try_acquire_only_takes_a_free_slot():
+    async def scenario():
+        scheduler = InferenceScheduler(max_in_flight=2)
+        await scheduler.acquire(MODEL)
+        assert scheduler.try_acquire(MODEL)
+        assert not scheduler.try_acquire(MODEL)
+        scheduler.release(MODEL)
+        assert scheduler.stats()[MODEL]["in_flight"] == 1
+
+    run(scenario())
+
+
+# ------------------- Engine against the mock server -------------------
+
+def test_engine_caps_concurrent_requests_per_model(mock_server, engine_for):
+    server = mock_server(ttft=0.1)
+    engine = engine_for(server.url)
+    engine.scheduler.set_limit(MODEL, 1)
+    futures = [engine.generate(MODEL, f"question {index}") for index in range(4)]
+    results = [future.result(10) for future in futures]
+    assert all(result["text"] and not result["cancelled"] for result in results)
+    assert server.state.peak_active[MODEL] == 1
+    stats = engine.scheduler.stats()[MODEL]
+    assert stats["served"] == 4
+    assert stats["in_flight"] == 0
+
+
+def test_cancel_stops_the_stream_and_frees_the_slot(mock_server, engine_for):
+    server = mock_server(token_rate=20.0, response_tokens=1000)
+    engine = engine_for(server.url)
+    first_token = threading.Event()
+    future = engine.generate(MODEL, "tell me a long story", on_token=lambda token: first_token.set())
+    assert first_token.wait(5)
+    assert engine.cancel(future)
+    result = future.result(5)
+    assert result["cancelled"]
+    assert 0 < len(result["text"].split()) < 1000
+    assert engine.scheduler.stats()[MODEL]["in_flight"] == 0
+
+
+def seed_latency(engine, samples=5):
+    """Enough fast first-token samples that a silent request is hedged after 50 ms."""
+    for _ in range(samples):
+        engine.latency.record(MODEL, 50.0, {})
+
+
+def test_silent_request_is_hedged_on_another_endpoint(mock_server, engine_for):
+    stalled = mock_server(stall_rate=1.0)
+    healthy = mock_server()
+    engine = engine_for(stalled.url, healthy.url)
+    seed_latency(engine)
+    result = engine.generate(MODEL, "hello").result(10)
+    assert result["text"] and not result["cancelled"]
+    assert stalled.state.requests == 1
+    assert healthy.state.requests == 1
+    # Both the request and its duplicate gave their slots back
+    deadline = time.monotonic() + 2
+    while engine.scheduler.stats()[MODEL]["in_flight"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert engine.scheduler.stats()[MODEL]["in_flight"] == 0
+
+
+def test_hedge_is_skipped_without_a_free_slot(mock_server, engine_for):
+    stalled = mock_server(stall_rate=1.0)
+    healthy = mock_server()
+    engine = engine_for(stalled.url, healthy.url)
+    engine.scheduler.set_limit(MODEL, 1)
+    seed_latency(engine)
+    future = engine.generate(MODEL, "hello")
+    time.sleep(0.5)
+    assert healthy.state.requests == 0
+    engine.cancel(future)
+    assert future.result(5)["cancelled"]
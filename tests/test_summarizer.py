@@ -0,0 +1,92 @@
+import time
+import uuid
+
+import pytest
+
+from database.database_chat import create_chat, get_chat_summary, insert_message
+from inference import summarizer as summarizer_module
+from inference.messages import MessageStore
+from inference.summarizer import ChatSummarizer
+
+RECENT = 4
+BATCH = 3
+
+
+@pytest.fixture
+def chat_id():
+    chat_id = str(uuid.uuid4())
+    create_chat("user", chat_id, "Summarized chat")
+    return chat_id
+
+
+@pytest.fixture
+def summarizer(mock_server, engine_for, monkeypatch):
+    engine = engine_for(mock_server().url)
+    monkeypatch.setattr(summarizer_module, "get_engine", lambda: engine)
+    summarizer = ChatSummarizer(recent_messages=RECENT, batch=BATCH)
+    yield summarizer
+    summarizer.stop()
+
+
+def add_turns(store, chat_id, count):
+    """Append and persist count alternating turns, each a child of the previous one."""
+    for _ in range(count):
+        role = "user" if len(store) % 2 == 0 else "assistant"
+        parent_id = store[-1].id if len(store) else None
+        content = f"{role} turn {len(store)}"
+        message = store.append(role, content)
+        message.id = insert_message(chat_id, role, content, parent_id=parent_id)
+
+
+def wait_for_summary(summarizer, chat_id, covered):
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        summary = summarizer.get(chat_id)
+        if summary and summary["covered_messages"] == covered and chat_id not in summarizer.pending:
+            return summary
+        time.sleep(0.02)
+    raise AssertionError(f"no summary covering {covered} messages")
+
+
+def test_nothing_to_fold_until_a_batch_builds_up(summarizer, chat_id):
+    store = MessageStore()
+    add_turns(store, chat_id, RECENT + BATCH - 1)
+    assert not summarizer.maybe_update(chat_id, store)
+
+
+def test_old_turns_are_folded_into_a_stored_summary(summarizer, chat_id):
+    store = MessageStore()
+    add_turns(store, chat_id, 10)
+    assert summarizer.maybe_update(chat_id, store)
+    summary = wait_for_summary(summarizer, chat_id, 10 - RECENT)
+    assert summary["summary"]
+    assert summary["last_covered_id"] == store[10 - RECENT - 1].id
+    assert get_chat_summary(chat_id)["covered_messages"] == 10 - RECENT
+    assert summarizer.current(chat_id, store) is summary
+
+
+def test_summary_of_another_branch_is_not_used(summarizer, chat_id):
+    store = MessageStore()
+    add_turns(store, chat_id, 10)
+    summarizer.maybe_update(chat_id, store)
+    wait_for_summary(summarizer, chat_id, 10 - RECENT)
+
+    # Edit message 3: a new branch whose messages from there on have other ids
+    store.truncate(3)
+    add_turns(store, chat_id, 7)
+    assert len(store) == 10
+    assert summarizer.current(chat_id, store) is None
+    # The branch gets a summary of its own, built from its first message
+    assert summarizer.maybe_update(chat_id, store)
+    summary = wait_for_summary(summarizer, chat_id, 10 - RECENT)
+    assert summary["last_covered_id"] == store[10 - RECENT - 1].id
+    assert summarizer.current(chat_id, store) is summary
+
+
+def test_shorter_branch_drops_the_summary(summarizer, chat_id):
+    store = MessageStore()
+    add_turns(store, chat_id, 10)
+    summarizer.maybe_update(chat_id, store)
+    wait_for_summary(summarizer, chat_id, 10 - RECENT)
+    store.truncate(2)
+    assert summarizer.current(chat_id, store) is None
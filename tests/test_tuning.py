@@ -0,0 +1,84 @@
+import argparse
+
+import pytest
+
+from inference.client import get_client
+from inference.models import CONTEXT_WINDOWS
+from inference.tuning import TunedOptions, host_profile
+from tools.tune_ollama import grid, tune_model
+
+MODEL = "mistral:7b"
+HOST = "gpu-box:11434"
+URL = f"http://{HOST}"
+
+
+@pytest.fixture
+def store(tmp_path):
+    return TunedOptions(db_path=tmp_path / "tuning.db")
+
+
+def test_saved_options_are_filtered_and_reloaded(tmp_path, store):
+    store.save(MODEL, HOST, {"num_ctx": 8192, "num_thread": 8, "num_predict": 128}, 1.5)
+    assert store.get(MODEL, HOST) == {"num_ctx": 8192, "num_thread": 8}
+    reopened = TunedOptions(db_path=tmp_path / "tuning.db")
+    assert reopened.get(MODEL, HOST) == {"num_ctx": 8192, "num_thread": 8}
+    assert reopened.get(MODEL, "other:11434") == {}
+
+
+def test_request_options_win_over_tuned_ones(store):
+    store.save(MODEL, HOST, {"num_ctx": 8192, "num_batch": 512}, 1.5)
+    payload = {"model": MODEL, "prompt": "Hi", "options": {"num_ctx": 2048}}
+    assert store.apply(payload, URL)["options"] == {"num_ctx": 2048, "num_batch": 512}
+    # The caller's payload is not modified
+    assert payload["options"] == {"num_ctx": 2048}
+
+
+def test_untuned_models_are_left_alone(store):
+    payload = {"model": MODEL, "prompt": "Hi"}
+    assert store.apply(payload, URL) is payload
+
+
+def test_host_profiles():
+    assert host_profile(URL) == HOST
+    assert host_profile("http://localhost:11434") == host_profile("http://127.0.0.1:11434")
+    assert host_profile("http://localhost:11434") != HOST
+
+
+def test_grid_starts_each_context_with_ollamas_defaults():
+    assert grid([4096], [4], [256, 512]) == [
+        {"num_ctx": 4096},
+        {"num_ctx": 4096, "num_thread": 4, "num_batch": 256},
+        {"num_ctx": 4096, "num_thread": 4, "num_batch": 512}
+    ]
+
+
+class RecordingClient:
+    """Forwards to a real client and records the options of every generate call."""
+
+    def __init__(self, client):
+        self.client = client
+        self.options = []
+
+    def generate(self, model, prompt, timeout=120, **extra):
+        if "options" in extra:
+            self.options.append(extra["options"])
+        return self.client.generate(model, prompt, timeout=timeout, **extra)
+
+
+def tune(server, num_ctx):
+    client = RecordingClient(get_client(server.url))
+    args = argparse.Namespace(num_ctx=num_ctx, num_thread=[2], num_batch=[256], num_predict=4, repeats=1)
+    return client, tune_model(client, MODEL, args)
+
+
+@pytest.mark.parametrize("num_ctx, expected", [
+    (None, [CONTEXT_WINDOWS[MODEL]]),
+    ([2048, 8192, 16384], [8192, 16384]),
+    ([2048], [CONTEXT_WINDOWS[MODEL]])
+])
+def test_context_is_never_tuned_below_the_window(mock_server, num_ctx, expected):
+    server = mock_server()
+    client, results = tune(server, num_ctx)
+    assert sorted({options["num_ctx"] for options in client.options}) == expected
+    assert sorted({result[3]["num_ctx"] for result in results}) == expected
+    assert all(seconds > 0 for seconds, *_ in results)
@@ -0,0 +1,187 @@
+"""
+Measure throughput, time to first token and client-side overhead of the inference
+path against the local mock Ollama server (no GPU or real model needed).
+
+    python -m tools.benchmark_inference --concurrency 1 4 16 --requests 64
+
+Targets:
+    engine                    InferenceEngine.generate with token streaming
+    query_model               document_processing.integration.query_model
+    generate_ollama_response  ui_main.generate_ollama_response (imports the UI module)
+    task                      ui_main.InferenceTask, the Qt handle ChatScreen uses
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tools.mock_ollama import MockConfig, MockOllamaServer
+
+MODEL = "mistral:7b"
+ALL_TARGETS = ["engine", "query_model", "generate_ollama_response", "task"]
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+def make_prompt(index):
+    # Unique prompts, so the response cache never short-circuits a request
+    return f"Benchmark request {index}: summarise the quarterly report in three sentences."
+
+
+# ------------------- Targets -------------------
+
+def run_engine(count, concurrency):
+    from inference.engine import get_engine
+    engine = get_engine()
+
+    def one(index):
+        started = time.perf_counter()
+        first = []
+        engine.generate(MODEL, make_prompt(index),
+                        on_token=lambda token: first or first.append(time.perf_counter())).result()
+        return time.perf_counter() - started, first[0] - started if first else None
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        return list(pool.map(one, range(count)))
+
+
+def run_query_model(count, concurrency):
+    from document_processing.integration import query_model
+
+    def one(index):
+        started = time.perf_counter()
+        query_model(MODEL, question=make_prompt(index))
+        return time.perf_counter() - started, None
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        return list(pool.map(one, range(count)))
+
+
+def run_generate_ollama_response(count, concurrency):
+    from ui_main import generate_ollama_response
+
+    def one(index):
+        started = time.perf_counter()
+        generate_ollama_response(MODEL, make_prompt(index))
+        return time.perf_counter() - started, None
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        return list(pool.map(one, range(count)))
+
+
+_app = None  # QCoreApplication created by run_task
+
+
+def run_task(count, concurrency):
+    from PySide6.QtCore import QCoreApplication, QEventLoop
+    from ui_main import InferenceTask
+
+    # Queued signal delivery needs an application; kept for the rest of the process
+    global _app
+    _app = QCoreApplication.instance() or QCoreApplication(sys.argv)
+    results = []
+    for wave_start in range(0, count, concurrency):
+        wave = range(wave_start, min(count, wave_start + concurrency))
+        loop = QEventLoop()
+        remaining = [len(wave)]
+        tasks = []
+
+        def finished(started, first, *_):
+            results.append((time.perf_counter() - started, first[0] - started if first else None))
+            remaining[0] -= 1
+            if remaining[0] == 0:
+                loop.quit()
+
+        for index in wave:
+            started = time.perf_counter()
+            first = []
+            task = InferenceTask("generate", MODEL, make_prompt(index))
+            task.token_received.connect(lambda token, first=first: first or first.append(time.perf_counter()))
+            task.response_ready.connect(lambda text, started=started, first=first: finished(started, first))
+            task.error_occurred.connect(lambda error, started=started, first=first: finished(started, first))
+            task.start()
+            tasks.append(task)
+        loop.exec()
+    return results
+
+
+RUNNERS = {
+    "engine": run_engine,
+    "query_model": run_query_model,
+    "generate_ollama_response": run_generate_ollama_response,
+    "task": run_task
+}
+
+
+# ------------------- Reporting -------------------
+
+def report(target, concurrency, results, elapsed, ideal, tokens):
+    latencies = [latency for latency, _ in results]
+    ttfts = [ttft for _, ttft in results if ttft is not None]
+    overheads = [(latency - ideal) * 1000 for latency in latencies]
+    line = (
+        f"{target:<26}{concurrency:>5}{len(results) / elapsed:>10.1f}{len(results) * tokens / elapsed:>10.0f}"
+        f"{percentile(latencies, 50) * 1000:>10.0f}{percentile(latencies, 95) * 1000:>10.0f}"
+    )
+    if ttfts:
+        line += f"{percentile(ttfts, 50) * 1000:>10.0f}{percentile(ttfts, 95) * 1000:>10.0f}"
+    else:
+        line += f"{'-':>10}{'-':>10}"
+    line += f"{statistics.median(overheads):>12.1f}"
+    print(line)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the inference client against the mock Ollama server.")
+    parser.add_argument("--targets", nargs="+", default=ALL_TARGETS, choices=ALL_TARGETS)
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=32, help="requests per target and concurrency level")
+    parser.add_argument("--ttft", type=float, default=0.05)
+    parser.add_argument("--token-rate", type=float, default=200.0)
+    parser.add_argument("--chunk-size", type=int, default=1)
+    parser.add_argument("--response-tokens", type=int, default=64)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = MockConfig(ttft=args.ttft, token_rate=args.token_rate, chunk_size=args.chunk_size,
+                        response_tokens=args.response_tokens, failure_rate=args.failure_rate, seed=0)
+    server = MockOllamaServer(config=config).start()
+    # Must be set before the inference package is imported
+    os.environ["OLLAMA_ENDPOINTS"] = server.url
+    os.environ["NEUROGENIUS_MAX_IN_FLIGHT"] = str(max(args.concurrency))
+
+    from inference.engine import get_engine, shutdown_engine
+
+    # Load the model once so the cold-start delay is not counted
+    get_engine().generate(MODEL, "").result()
+    ideal = config.ttft + max(0, config.response_tokens - config.chunk_size) / config.token_rate
+
+    print(f"Mock server {server.url}: TTFT {config.ttft * 1000:.0f} ms, {config.token_rate:.0f} tokens/s, "
+          f"{config.response_tokens} tokens per reply (ideal latency {ideal * 1000:.0f} ms)")
+    print(f"{'target':<26}{'conc':>5}{'req/s':>10}{'tok/s':>10}{'p50 ms':>10}{'p95 ms':>10}"
+          f"{'ttft50':>10}{'ttft95':>10}{'overhead ms':>12}")
+    try:
+        for target in args.targets:
+            for concurrency in args.concurrency:
+                started = time.perf_counter()
+                try:
+                    results = RUNNERS[target](args.requests, concurrency)
+                except ImportError as e:
+                    print(f"{target:<26}skipped ({e})")
+                    break
+                report(target, concurrency, results, time.perf_counter() - started, ideal, config.response_tokens)
+    finally:
+        shutdown_engine()
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+"""
+Local stand-in for an Ollama server, for exercising the inference path without a GPU.
+
+Implements /api/generate, /api/chat, /api/tags, /api/ps, /api/show, /api/embeddings and
+/api/pull with configurable time to first token, token rate, chunk size, cold-load delay,
+download speed and failure injection. Interrupted pulls resume where they stopped, like
+Ollama's partial blob downloads.
+
+    python -m tools.mock_ollama --port 11434 --ttft 0.2 --token-rate 40
+"""
+import argparse
+import hashlib
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import orjson
+
+DEFAULT_MODELS = [
+    "llama2:7b", "mistral:7b", "deepseek-r1:7b",
+    "granite3.2-vision:latest", "llama3.2-vision:11b", "gemma3:4b"
+]
+
+
+class MockConfig:
+    """Behaviour knobs shared by every request the server handles."""
+
+    def __init__(self, ttft=0.1, token_rate=50.0, chunk_size=1, response_tokens=64, load_delay=0.0,
+                 failure_rate=0.0, stall_rate=0.0, models=None, model_size=4 * 1024 ** 3, pull_size=256 * 1024 ** 2,
+                 pull_rate=512 * 1024 ** 2, pull_layers=2, pull_interrupt_rate=0.0, pullable=None, seed=None):
+        self.ttft = ttft  # Seconds before the first chunk (prompt evaluation)
+        self.token_rate = token_rate  # Tokens per second after the first one
+        self.chunk_size = chunk_size  # Tokens per streamed chunk
+        self.response_tokens = response_tokens
+        self.load_delay = load_delay  # Extra delay when a model is not loaded yet
+        self.failure_rate = failure_rate  # Fraction of requests answered with 503
+        self.stall_rate = stall_rate  # Fraction of requests that never produce a token
+        self.models = list(DEFAULT_MODELS if models is None else models)
+        self.model_size = model_size
+        self.pull_size = pull_size  # Bytes downloaded by /api/pull, split over pull_layers blobs
+        self.pull_rate = pull_rate  # Download speed in bytes per second
+        self.pull_layers = pull_layers
+        self.pull_interrupt_rate = pull_interrupt_rate  # Fraction of pulls cut off mid-download
+        self.pullable = pullable  # Models the registry has, None for any name
+        self.random = random.Random(seed)
+
+
+class MockState:
+    def __init__(self, config):
+        self.config = config
+        self.loaded = {}  # model -> expiry (time.time()), None for pinned
+        self.partial = {}  # model -> bytes already downloaded by interrupted pulls
+        self.requests = 0
+        self.active = {}  # model -> generations running now
+        self.peak_active = {}  # model -> most generations that ran at once
+        self.lock = threading.Lock()
+
+    def touch(self, model, keep_alive):
+        """Mark the model loaded; returns True if it was cold."""
+        with self.lock:
+            self.requests += 1
+            cold = model not in self.loaded
+            if keep_alive == 0:
+                self.loaded.pop(model, None)
+            elif keep_alive == -1:
+                self.loaded[model] = None
+            else:
+                self.loaded[model] = time.time() + 300
+            return cold
+
+    def begin(self, model):
+        with self.lock:
+            self.active[model] = self.active.get(model, 0) + 1
+            self.peak_active[model] = max(self.peak_active.get(model, 0), self.active[model])
+
+    def end(self, model):
+        with self.lock:
+            self.active[model] -= 1
+
+    def loaded_models(self):
+        now = time.time()
+        with self.lock:
+            for model, expiry in list(self.loaded.items()):
+                if expiry is not None and expiry < now:
+                    del self.loaded[model]
+            return list(self.loaded)
+
+
+class MockOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive and chunked streaming, like Ollama
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def state(self):
+        return self.server.state
+
+    # ------------------- Helpers -------------------
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return orjson.loads(self.rfile.read(length)) if length else {}
+
+    def send_json(self, payload, status=200):
+        body = orjson.dumps(payload)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def write_chunk(self, payload):
+        data = orjson.dumps(payload) + b"\n"
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    # ------------------- Routes -------------------
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self.send_json({"models": [self.model_entry(model) for model in self.state.config.models]})
+        elif self.path == "/api/ps":
+            self.send_json({"models": [self.model_entry(model) for model in self.state.loaded_models()]})
+        else:
+            self.send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        try:
+            request = self.read_json()
+        except orjson.JSONDecodeError:
+            self.send_json({"error": "invalid JSON"}, status=400)
+            return
+        routes = {
+            "/api/generate": self.handle_generate,
+            "/api/chat": self.handle_generate,
+            "/api/embeddings": self.handle_embeddings,
+            "/api/show": self.handle_show,
+            "/api/pull": self.handle_pull
+        }
+        handler = routes.get(self.path)
+        if handler is None:
+            self.send_json({"error": "not found"}, status=404)
+            return
+        handler(request)
+
+    def model_entry(self, model):
+        config = self.state.config
+        return {
+            "name": model,
+            "model": model,
+            "size": config.model_size,
+            "digest": hashlib.sha256(model.encode()).hexdigest(),
+            "details": {"family": model.split(":")[0], "parameter_size": model.split(":")[-1].upper(),
+                        "quantization_level": "Q4_0"}
+        }
+
+    def handle_show(self, request):
+        model = request.get("model") or request.get("name")
+        if model not in self.state.config.models:
+            self.send_json({"error": f"model '{model}' not found"}, status=404)
+            return
+        entry = self.model_entry(model)
+        entry["model_info"] = {"general.context_length": 4096}
+        if "embed" in model:
+            entry["capabilities"] = ["embedding"]
+        else:
+            entry["capabilities"] = ["completion", "vision"] if "vision" in model else ["completion"]
+        self.send_json(entry)
+
+    def handle_pull(self, request):
+        """
+        Stream pull progress like Ollama: the manifest, then per-layer completed/total
+        bytes, then success. Bytes already downloaded by an interrupted pull are skipped.
+        """
+        config = self.state.config
+        model = request.get("model") or request.get("name")
+        layer_size = max(1, config.pull_size // config.pull_layers)
+        total = layer_size * config.pull_layers
+        step = max(1, layer_size // 8)
+        with self.state.lock:
+            done = self.state.partial.get(model, 0)
+        interrupt_at = None
+        if config.random.random() < config.pull_interrupt_rate:
+            interrupt_at = done + (total - done) * config.random.uniform(0.2, 0.8)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            self.write_chunk({"status": "pulling manifest"})
+            if config.pullable is not None and model not in config.pullable:
+                # Ollama reports an unknown model inside the stream
+                self.write_chunk({"error": "pull model manifest: file does not exist"})
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+                return
+            for layer in range(config.pull_layers):
+                digest = "sha256:" + hashlib.sha256(f"{model}/{layer}".encode()).hexdigest()
+                start = layer * layer_size
+                completed = min(layer_size, max(0, done - start))
+                while True:
+                    self.write_chunk({"status": f"pulling {digest[7:19]}", "digest": digest,
+                                      "total": layer_size, "completed": completed})
+                    if completed >= layer_size:
+                        break
+                    if interrupt_at is not None and start + completed >= interrupt_at:
+                        # Drop the connection mid-stream, without the closing chunk
+                        self.close_connection = True
+                        return
+                    time.sleep(min(step, layer_size - completed) / config.pull_rate)
+                    completed = min(layer_size, completed + step)
+                    with self.state.lock:
+                        self.state.partial[model] = start + completed
+            for status in ("verifying sha256 digest", "writing manifest", "success"):
+                self.write_chunk({"status": status})
+            with self.state.lock:
+                self.state.partial.pop(model, None)
+                if model not in config.models:
+                    config.models.append(model)
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def handle_embeddings(self, request):
+        seed = int(hashlib.sha256(request.get("prompt", "").encode()).hexdigest()[:8], 16)
+        rng = random.Random(seed)
+        self.send_json({"embedding": [rng.uniform(-1, 1) for _ in range(16)]})
+
+    def handle_generate(self, request):
+        config = self.state.config
+        model = request.get("model", "")
+        if model not in config.models:
+            self.send_json({"error": f"model '{model}' not found, try pulling it first"}, status=404)
+            return
+        if config.random.random() < config.failure_rate:
+            self.send_json({"error": "server overloaded (injected failure)"}, status=503)
+            return
+        chat = "messages" in request
+        if chat:
+            prompt_chars = sum(len(message.get("content", "")) for message in request["messages"])
+        else:
+            prompt_chars = len(request.get("prompt", ""))
+        cold = self.state.touch(model, request.get("keep_alive"))
+        self.state.begin(model)
+        try:
+            self.generate(request, model, chat, prompt_chars, cold)
+        finally:
+            self.state.end(model)
+
+    def generate(self, request, model, chat, prompt_chars, cold):
+        config = self.state.config
+
+        num_predict = request.get("options", {}).get("num_predict", config.response_tokens)
+        # An empty prompt only loads (or unloads) the model, like Ollama
+        tokens = 0 if (not chat and not request.get("prompt")) else max(0, min(num_predict, config.response_tokens))
+        stream = request.get("stream", True)
+
+        delay = config.ttft + (config.load_delay if cold else 0)
+        if tokens and config.random.random() < config.stall_rate:
+            delay = 3600  # Never produces a token; the client has to time out or hedge
+        started = time.perf_counter()
+        time.sleep(min(delay, 3600))
+        prompt_eval_ns = int((time.perf_counter() - started) * 1e9)
+
+        words = [f"tok{i} " for i in range(tokens)]
+        try:
+            if not stream:
+                time.sleep(tokens / config.token_rate if tokens else 0)
+                text = "".join(words)
+                body = self.content_chunk(model, chat, text)
+                body.update(self.final_chunk(model, chat, prompt_chars, tokens, prompt_eval_ns, started))
+                self.send_json(body)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for index in range(0, tokens, config.chunk_size):
+                if index:
+                    time.sleep(config.chunk_size / config.token_rate)
+                self.write_chunk(self.content_chunk(model, chat, "".join(words[index:index + config.chunk_size])))
+            final = self.content_chunk(model, chat, "")
+            final.update(self.final_chunk(model, chat, prompt_chars, tokens, prompt_eval_ns, started))
+            self.write_chunk(final)
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client cancelled: stop generating, as Ollama does
+            self.close_connection = True
+
+    def content_chunk(self, model, chat, text):
+        chunk = {"model": model, "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "done": False}
+        if chat:
+            chunk["message"] = {"role": "assistant", "content": text}
+        else:
+            chunk["response"] = text
+        return chunk
+
+    def final_chunk(self, model, chat, prompt_chars, tokens, prompt_eval_ns, started):
+        total_ns = int((time.perf_counter() - started) * 1e9)
+        return {
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": total_ns,
+            "load_duration": 0,
+            "prompt_eval_count": max(1, prompt_chars // 4),
+            "prompt_eval_duration": max(1, prompt_eval_ns),
+            "eval_count": tokens,
+            "eval_duration": max(1, total_ns - prompt_eval_ns)
+        }
+
+
+class MockOllamaServer:
+    """Run the mock on a background thread; port 0 picks a free port."""
+
+    def __init__(self, host="127.0.0.1", port=0, config=None, handler=MockOllamaHandler):
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.httpd.state = MockState(config or MockConfig())
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def state(self):
+        return self.httpd.state
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="MockOllama", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Mock Ollama server for benchmarks and local testing.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--ttft", type=float, default=0.1, help="seconds before the first token")
+    parser.add_argument("--token-rate", type=float, default=50.0, help="tokens per second")
+    parser.add_argument("--chunk-size", type=int, default=1, help="tokens per streamed chunk")
+    parser.add_argument("--response-tokens", type=int, default=64)
+    parser.add_argument("--load-delay", type=float, default=0.0, help="extra seconds on a cold model")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="fraction of requests that never respond")
+    parser.add_argument("--models", nargs="*", help="installed models (default: every model the app uses)")
+    parser.add_argument("--pull-size-mb", type=float, default=256.0, help="download size of a pulled model")
+    parser.add_argument("--pull-rate-mb", type=float, default=512.0, help="download speed in MB/s")
+    parser.add_argument("--pull-interrupt-rate", type=float, default=0.0, help="fraction of pulls cut off mid-download")
+    return parser.parse_args(argv)
+
+
+def config_from_args(args):
+    return MockConfig(
+        ttft=args.ttft, token_rate=args.token_rate, chunk_size=args.chunk_size,
+        response_tokens=args.response_tokens, load_delay=args.load_delay,
+        failure_rate=args.failure_rate, stall_rate=args.stall_rate, models=args.models,
+        pull_size=int(args.pull_size_mb * 1024 ** 2), pull_rate=args.pull_rate_mb * 1024 ** 2,
+        pull_interrupt_rate=args.pull_interrupt_rate
+    )
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    server = MockOllamaServer(args.host, args.port, config_from_args(args))
+    print(f"Mock Ollama listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,86 @@
+"""
+Install every model the app uses on each Ollama endpoint, pulling missing ones in parallel.
+
+    python -m tools.provision_models                 # endpoints from OLLAMA_ENDPOINTS
+    python -m tools.provision_models --check         # only list what is missing
+    python -m tools.provision_models --mock --interrupt-rate 0.5
+
+--mock runs against the local mock server with nothing installed, which exercises
+parallel pulls, progress reporting and resuming after interrupted downloads.
+"""
+import argparse
+import os
+import threading
+import time
+
+from tools.mock_ollama import MockConfig, MockOllamaServer
+
+
+class ConsoleProgress:
+    """Prints a line per status change or each further 10% of a pull."""
+
+    def __init__(self):
+        self.last = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, progress):
+        key = (progress.url, progress.model)
+        tenth = int(progress.fraction * 10)
+        with self.lock:
+            if self.last.get(key) == (progress.status, tenth):
+                return
+            self.last[key] = (progress.status, tenth)
+        size = f"{progress.completed / 1024 ** 2:.0f}/{progress.total / 1024 ** 2:.0f} MB" if progress.total else ""
+        print(f"{progress.url} {progress.model:<28}{progress.fraction * 100:>5.0f}%  {size:<16}{progress.status}"
+              f"{f' (attempt {progress.attempt})' if progress.attempt > 1 else ''}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Pull the Ollama models NeuroGenius needs.")
+    parser.add_argument("--check", action="store_true", help="list missing models without pulling")
+    parser.add_argument("--parallel", type=int, help="pulls at a time (default: NEUROGENIUS_MAX_PARALLEL_PULLS)")
+    parser.add_argument("--mock", action="store_true", help="pull from a local mock server with no models installed")
+    parser.add_argument("--interrupt-rate", type=float, default=0.3, help="mock: fraction of pulls cut off")
+    parser.add_argument("--pull-size-mb", type=float, default=64.0, help="mock: download size per model")
+    parser.add_argument("--pull-rate-mb", type=float, default=32.0, help="mock: download speed in MB/s")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    server = None
+    if args.mock:
+        config = MockConfig(models=[], pull_size=int(args.pull_size_mb * 1024 ** 2),
+                            pull_rate=args.pull_rate_mb * 1024 ** 2, pull_interrupt_rate=args.interrupt_rate, seed=0)
+        server = MockOllamaServer(config=config).start()
+        # Must be set before the inference package is imported
+        os.environ["OLLAMA_ENDPOINTS"] = server.url
+
+    from inference.provisioning import ModelProvisioner, MAX_PARALLEL_PULLS
+
+    provisioner = ModelProvisioner(max_parallel=args.parallel or MAX_PARALLEL_PULLS, backoff=0.5 if args.mock else 2)
+    try:
+        missing = provisioner.missing()
+        if not missing:
+            print(f"All {len(provisioner.models)} models are installed.")
+            return
+        for url, models in missing.items():
+            print(f"{url}: missing {', '.join(models)}")
+        if args.check:
+            return
+        started = time.perf_counter()
+        results = provisioner.provision(ConsoleProgress(), missing)
+        failed = [progress for progress in results if progress.error]
+        print(f"Pulled {len(results) - len(failed)} of {len(results)} models in {time.perf_counter() - started:.1f}s")
+        for progress in failed:
+            print(f"  {progress.model} on {progress.url} failed: {progress.error}")
+    except KeyboardInterrupt:
+        provisioner.cancel()
+        print("Cancelled; downloaded data is kept and the next run resumes")
+    finally:
+        if server is not None:
+            server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Find the fastest Ollama runtime options (num_thread, num_batch, num_ctx) for each chat
+model on this machine and store them for the inference engine to apply.
+
+    python -m tools.tune_ollama --models mistral:7b --num-thread 4 8 --num-batch 256 512
+    python -m tools.tune_ollama --show
+
+Every combination of the grid runs the same fixed prompt set with a fixed reply length.
+Runs are compared on the time a reference request (REFERENCE_PROMPT_TOKENS prompt
+tokens, REFERENCE_REPLY_TOKENS reply tokens) would take at the measured prompt and
+generation rates. The best combination is stored per model and host profile in
+database/tuning.db. num_predict only bounds the benchmark replies and is not stored.
+"""
+import argparse
+import os
+import time
+
+from inference.client import get_client
+from inference.endpoints import ENDPOINTS
+from inference.models import CHAT_MODELS, CONTEXT_WINDOWS, DEFAULT_CONTEXT_WINDOW
+from inference.tuning import get_tuned_options, host_profile
+
+REFERENCE_PROMPT_TOKENS = 1024
+REFERENCE_REPLY_TOKENS = 256
+DEFAULT_NUM_PREDICT = 128
+DEFAULT_NUM_BATCH = [128, 256, 512]
+REQUEST_TIMEOUT = 600  # Seconds; the first request of each combination reloads the model
+
+PROMPTS = [
+    "Explain the difference between a process and a thread in two short paragraphs.",
+    "Summarize the following notes as a bulleted list:\n"
+    + "The quarterly review covered revenue, hiring, the office move and the new support rota. " * 12,
+    "Write a Python function that merges two sorted lists, then explain its complexity.",
+    "A customer writes: 'My export keeps failing with a timeout after about a minute.' "
+    "Draft a polite reply that asks for the details you need to diagnose it."
+]
+
+
+def default_threads():
+    cpus = os.cpu_count() or 4
+    return sorted({max(1, cpus // 4), max(1, cpus // 2), cpus})
+
+
+def grid(num_ctx, num_thread, num_batch):
+    """Option combinations to try; the first for each num_ctx leaves threads and batch to Ollama."""
+    combinations = []
+    for ctx in num_ctx:
+        combinations.append({"num_ctx": ctx})
+        for threads in num_thread:
+            for batch in num_batch:
+                combinations.append({"num_ctx": ctx, "num_thread": threads, "num_batch": batch})
+    return combinations
+
+
+def measure(client, model, options, num_predict, repeats, run_id):
+    """
+    Run the prompt set with the given options. Returns (reference seconds, generation
+    tokens/s, prompt tokens/s). A unique prefix per run keeps Ollama from reusing
+    cached prompt evaluation across runs.
+    """
+    prefix = f"[tuning run {run_id}]\n"
+    # Load the model with these options first so the load is not measured
+    client.generate(model, prefix + "Reply with OK.", timeout=REQUEST_TIMEOUT,
+                    options={**options, "num_predict": 1})
+    prompt_tokens = prompt_ns = eval_tokens = eval_ns = 0
+    for index in range(repeats):
+        for number, prompt in enumerate(PROMPTS):
+            stats = client.generate(model, f"{prefix}({index}.{number}) {prompt}", timeout=REQUEST_TIMEOUT,
+                                    options={**options, "num_predict": num_predict})
+            prompt_tokens += stats.get("prompt_eval_count") or 0
+            prompt_ns += stats.get("prompt_eval_duration") or 0
+            eval_tokens += stats.get("eval_count") or 0
+            eval_ns += stats.get("eval_duration") or 0
+    if not (prompt_tokens and prompt_ns and eval_tokens and eval_ns):
+        raise RuntimeError("Ollama reported no timings")
+    prompt_rate = prompt_tokens / (prompt_ns / 1e9)
+    eval_rate = eval_tokens / (eval_ns / 1e9)
+    seconds = REFERENCE_PROMPT_TOKENS / prompt_rate + REFERENCE_REPLY_TOKENS / eval_rate
+    return seconds, eval_rate, prompt_rate
+
+
+def describe(options):
+    return ", ".join(f"{name}={value}" for name, value in options.items())
+
+
+def tune_model(client, model, args):
+    window = CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+    # The context builder budgets for the model's full window, so never tune below it
+    num_ctx = sorted({ctx for ctx in (args.num_ctx or [window]) if ctx >= window}) or [window]
+    results = []
+    for options in grid(num_ctx, args.num_thread or default_threads(), args.num_batch):
+        run_id = f"{model} {describe(options)} {time.time():.0f}"
+        try:
+            seconds, eval_rate, prompt_rate = measure(client, model, options, args.num_predict, args.repeats, run_id)
+        except Exception as e:
+            print(f"  {describe(options):<45} failed: {str(e)}")
+            continue
+        print(f"  {describe(options):<45}{seconds:>10.2f}{eval_rate:>10.1f}{prompt_rate:>12.1f}")
+        results.append((seconds, eval_rate, prompt_rate, options))
+    # Free the memory before the next model is loaded
+    try:
+        client.generate(model, "", timeout=60, keep_alive=0)
+    except Exception as e:
+        print(f"  Error unloading {model}: {str(e)}")
+    return results
+
+
+def show():
+    rows = get_tuned_options().all()
+    if not rows:
+        print("No tuned settings stored yet.")
+        return
+    for row in rows:
+        print(f"{row['host']:<35}{row['model']:<28}{describe(row['options']):<45}"
+              f"{row['reference_seconds']:>8.2f}s  {time.strftime('%Y-%m-%d %H:%M', time.localtime(row['tuned_at']))}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Tune Ollama runtime options per model on this machine.")
+    parser.add_argument("--endpoint", default=ENDPOINTS[0], help="Ollama server to tune (default: first endpoint)")
+    parser.add_argument("--models", nargs="+", default=sorted(set(CHAT_MODELS.values())))
+    parser.add_argument("--num-thread", nargs="+", type=int, help="default: a quarter, half and all CPU cores")
+    parser.add_argument("--num-batch", nargs="+", type=int, default=DEFAULT_NUM_BATCH)
+    parser.add_argument("--num-ctx", nargs="+", type=int, help="default: the model's context window")
+    parser.add_argument("--num-predict", type=int, default=DEFAULT_NUM_PREDICT, help="reply tokens per benchmark request")
+    parser.add_argument("--repeats", type=int, default=1, help="passes over the prompt set per combination")
+    parser.add_argument("--no-save", action="store_true", help="report only, keep the stored settings")
+    parser.add_argument("--show", action="store_true", help="list the stored settings and exit")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.show:
+        show()
+        return
+    client = get_client(args.endpoint)
+    host = host_profile(args.endpoint)
+    store = get_tuned_options()
+    print(f"Tuning {args.endpoint} (host profile {host}); lower reference seconds is better")
+    print(f"  {'options':<45}{'ref s':>10}{'tok/s':>10}{'prompt t/s':>12}")
+    for model in args.models:
+        print(model)
+        results = tune_model(client, model, args)
+        if not results:
+            print("  No combination completed, nothing stored")
+            continue
+        seconds, eval_rate, prompt_rate, options = min(results, key=lambda result: result[0])
+        baseline = next((result[0] for result in results if set(result[3]) == {"num_ctx"}), None)
+        gain = f", {(baseline - seconds) / baseline * 100:.0f}% faster than Ollama's defaults" if baseline else ""
+        print(f"  Best: {describe(options)} ({seconds:.2f}s{gain})")
+        if not args.no_save:
+            store.save(model, host, options, seconds, eval_rate, prompt_rate)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,17 +9,19 @@ print(sys.path)
 import uuid
 import datetime
 import json
+import threading
+import time
+from collections import deque
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QStackedWidget,
     QListWidget, QListWidgetItem, QToolButton, QMenu, QDialog, QInputDialog,
     QSizePolicy, QTextEdit, QTabWidget, QScrollArea, QFrame, QComboBox, QLineEdit,
-    QMessageBox, QApplication, QFileDialog
+    QMessageBox, QApplication, QFileDialog, QCheckBox, QProgressBar
 )
-from PySide6.QtCore import Qt, QPoint, QTimer, QByteArray, QBuffer, Signal, QThread
+from PySide6.QtCore import Qt, QPoint, QTimer, QByteArray, QBuffer, Signal, QThread, QObject
 from PySide6.QtGui import QPixmap, QPainter, QPainterPath, QIcon, QAction, QFont, QClipboard, QImage
 import speech_recognition as sr
 import pyttsx3
-import requests
 import torch
 from diffusers import StableDiffusionPipeline
 import pytesseract
@@ -33,51 +35,48 @@ import gc
 
 # Import database functions (ensure database_chat.py is available)
 from database.database_chat import (
-    get_chats_by_user, log_user_action, create_chat, update_chat_name,
-    delete_chat, get_messages, insert_message, export_chat, get_usage_statistics
+    get_chats_by_user, log_user_action, create_chat, update_chat_name, update_chat_model,
+    delete_chat, get_messages, insert_message, export_chat, get_usage_statistics,
+    get_active_message, set_active_message
 )
 from database.db_imagedata import insert_image_history, get_image_history, delete_image_history
+from database.connection import close_connections
 from document_processing.document_handler import upload_document, save_uploaded_document, list_documents
-from document_processing.integration import query_model
+from document_processing.integration import (
+    DEFAULT_DOCUMENT_QUERY_SEED, build_document_prompt, get_document_sessions
+)
+from inference.client import close_clients
+from inference.engine import get_engine, shutdown_engine, describe_error, InferenceError
+from inference.scheduler import PRIORITY_INTERACTIVE, MAX_CHAT_GENERATIONS
+from inference.models import CHAT_MODELS, VISION_MODELS, DEFAULT_CHAT_MODEL
+from inference.context import build_context, context_budget, count_tokens
+from inference.messages import MessageStore, MessageNode, MessageTree
+from inference.reasoning import ReasoningParser, split_reasoning, prompt_content, INCLUDE_REASONING
+from inference.summarizer import get_summarizer, summary_system_prompt
+from inference.prefill import get_prefiller, PREFILL_DEBOUNCE_MS
+from inference.residency import get_residency_manager
+from inference.router import get_router, AUTO_MODEL
+from inference.provisioning import ModelProvisioner
 
 IMAGE_DIR = "generated_images"
 
 # ------------------- Ollama API Integration -------------------
-def generate_ollama_response(model, prompt):
+def generate_ollama_response(model, prompt, options=None, priority=PRIORITY_INTERACTIVE):
+    engine = get_engine()
+    future = None
     try:
-        # Send the request to the Ollama API
-        response = requests.post(
-            "http://127.0.0.1:11434/api/generate",
-            json={
-                "model": model,
-                "prompt": prompt,
-                "stream": True  # Enable streaming
-            },
-            timeout=120,  # Increase timeout to 120 seconds
-            stream=True  # Enable streaming in the request
-        )
-
-        # Check if the response is successful
-        if response.status_code == 200:
-            # Process the streamed response
-            full_response = ""
-            for chunk in response.iter_lines(decode_unicode=True):
-                if chunk:
-                    try:
-                        # Parse each chunk as JSON
-                        data = json.loads(chunk)
-                        full_response += data.get("response", "")
-                    except json.JSONDecodeError:
-                        pass  # Ignore invalid JSON chunks
-            return full_response
-        else:
-            return f"Error: {response.status_code} - {response.text}"
-    except requests.exceptions.Timeout:
-        return "Error: The request timed out. Please try again later."
-    except requests.exceptions.ConnectionError:
-        return "Error: Unable to connect to the server. Please ensure the server is running."
+        # Blocking helper over the shared engine, so the request is admitted by the
+        # scheduler, bounded by adaptive timeouts and served from the response cache
+        # when reproducible
+        extra = {"options": options} if options else {}
+        future = engine.generate(model, prompt, priority=priority, **extra)
+        return future.result()["text"]
+    except InferenceError as e:
+        return f"Error: {str(e)}"
     except Exception as e:
-        return f"Connection error: {str(e)}"
+        if future is not None:
+            engine.cancel(future)
+        return f"Error: {describe_error(e)}"
 
 # ------------------- Home Page -------------------
 class HomePage(QWidget):
@@ -147,6 +146,7 @@ class DocumentScreen(QWidget):
         self.selected_file = None  # To store the currently selected file
         self.query_history = []  # To store query chat history
         self.query_histories = {}  # To store query history for each document
+        self.query_task = None  # In-flight query on the inference engine
 
         self.initUI()
 
@@ -212,9 +212,8 @@ class DocumentScreen(QWidget):
 
         # Model Selection Dropdown
         self.model_selector = QComboBox()
-        self.model_selector.addItem("NeuroVision", "granite3.2-vision:latest")
-        self.model_selector.addItem("NeuroVision1.0", "llama3.2-vision:11b")
-        self.model_selector.addItem("NeuroVision2.0", "gemma3:4b")
+        for display, model in VISION_MODELS.items():
+            self.model_selector.addItem(display, model)
         self.content_area.addWidget(QLabel("Select Model:"))
         self.content_area.addWidget(self.model_selector)
 
@@ -227,6 +226,11 @@ class DocumentScreen(QWidget):
         self.query_button.clicked.connect(self.ask_query)
         self.content_area.addWidget(self.query_button)
 
+        self.stop_query_button = QPushButton("Stop")
+        self.stop_query_button.clicked.connect(self.stop_query)
+        self.stop_query_button.setVisible(False)
+        self.content_area.addWidget(self.stop_query_button)
+
         # Query Chat History
         self.chat_history_scroll = QScrollArea()
         self.chat_history_scroll.setWidgetResizable(True)
@@ -424,6 +428,13 @@ class DocumentScreen(QWidget):
                 self.chat_history_layout.removeWidget(widget)
                 widget.deleteLater()
 
+        # Stay on the model the document was last queried with, so its evaluated prefix is reused
+        session_model = get_document_sessions().model_for(file_path)
+        if session_model:
+            index = self.model_selector.findData(session_model)
+            if index >= 0:
+                self.model_selector.setCurrentIndex(index)
+
         # Load query history for the selected document
         self.query_histories[self.selected_file] = self.load_query_history(self.selected_file)
         query_history = self.query_histories.get(self.selected_file, [])
@@ -525,6 +536,17 @@ class DocumentScreen(QWidget):
             print(f"Error loading query history: {str(e)}")
             return []
 
+    def extract_document_text(self, file_path):
+        """
+        Extract the text of a supported document (text file, PDF or image).
+        """
+        if file_path.lower().endswith(".txt"):
+            with open(file_path, "r", encoding="utf-8") as f:
+                return f.read()
+        if file_path.lower().endswith(".pdf"):
+            return self.extract_text_from_pdf(file_path)
+        return self.extract_text_from_image(file_path)
+
     def ask_query(self):
         """
         Process the query on the selected document.
@@ -538,60 +560,92 @@ class DocumentScreen(QWidget):
             QMessageBox.warning(self, "Empty Query", "Please enter a query.")
             return
 
+        if self.query_task is not None and self.query_task.isRunning():
+            QMessageBox.information(self, "Query Running", "Please wait for the current query to finish.")
+            return
+
         # Get the selected model key
         model_key = self.model_selector.currentData()
 
         try:
+            if not self.selected_file.lower().endswith((".txt", ".pdf", ".png", ".jpg", ".jpeg")):
+                QMessageBox.warning(self, "Error", "Unsupported file format.")
+                return
+
             # Show the loading indicator
             self.loading_label.setVisible(True)
             QApplication.processEvents()  # Force UI update
 
-            # Prepare input for the model
-            document_content = None
-            if self.selected_file.lower().endswith(".txt"):
-                # Read the text file
-                with open(self.selected_file, "r", encoding="utf-8") as f:
-                    document_content = f.read()
-            elif self.selected_file.lower().endswith(".pdf"):
-                # Extract text from PDF
-                document_content = self.extract_text_from_pdf(self.selected_file)
-            elif self.selected_file.lower().endswith((".png", ".jpg", ".jpeg")):
-                # Extract text from image
-                document_content = self.extract_text_from_image(self.selected_file)
-            else:
-                QMessageBox.warning(self, "Error", "Unsupported file format.")
-                return
+            # Prepare input for the model (extracted once per document version)
+            sessions = get_document_sessions()
+            document_content = sessions.content(self.selected_file, self.extract_document_text)
 
             if not document_content:
+                self.loading_label.setVisible(False)
                 QMessageBox.warning(self, "Error", "The document is empty or could not be processed.")
                 return
 
-            # Combine previous prompts with the current query
-            previous_prompts = "\n".join(
-                [f"You: {entry['query']}\nAssistant: {entry['response']}" for entry in self.query_histories.get(self.selected_file, [])]
+            # Instructions and document first, history and the new question last, so every
+            # question about this document shares the evaluated document prefix
+            file_path = self.selected_file
+            session = sessions.session(file_path, model_key, get_residency_manager().keep_alive_for(model_key))
+            input_text = build_document_prompt(document_content, self.query_histories.get(file_path, []), query)
+
+            # Run the query on the shared inference engine instead of blocking the GUI thread
+            self.append_query_message("You", query)
+            task = self.query_task = InferenceTask(
+                "generate", model_key, input_text, keep_alive=session.keep_alive,
+                options=sessions.query_options(), priority=PRIORITY_INTERACTIVE
             )
-            input_text = f"Previous Prompts:\n{previous_prompts}\n\nDocument Content:\n{document_content}\n\nQuery:\n{query}"
+            task.response_ready.connect(
+                lambda response: self.display_query_response(file_path, query, response, task, session))
+            task.response_stopped.connect(
+                lambda response: self.display_query_response(file_path, query, response, task, session))
+            task.error_occurred.connect(self.handle_query_error)
+            task.start()
+            self.query_button.setEnabled(False)
+            self.stop_query_button.setVisible(True)
 
-            # Call the query_model function
-            response = generate_ollama_response(model_key, input_text)
+        except Exception as e:
+            self.loading_label.setVisible(False)
+            QMessageBox.warning(self, "Error", f"Failed to process query: {str(e)}")
 
-            # Update chat history
-            self.append_query_message("You", query)
+    def display_query_response(self, file_path, query, response, task=None, session=None):
+        """
+        Show a finished query response and save it to the document's history.
+        """
+        self.loading_label.setVisible(False)
+        self.query_button.setEnabled(True)
+        self.stop_query_button.setVisible(False)
+        if task is not None and session is not None and task.result:
+            saved_ms = get_document_sessions().record(session, task.payload, task.result["stats"])
+            if saved_ms:
+                print(f"Reused document prefix for {os.path.basename(file_path)}: ~{saved_ms:.0f} ms of prompt evaluation saved")
+        if not response:
+            return  # Stopped before any text arrived
+        if file_path == self.selected_file:
             self.append_query_message("NeuroVision", response)
 
-            # Save the query and response for the current document
-            if self.selected_file not in self.query_histories:
-                self.query_histories[self.selected_file] = []
-            self.query_histories[self.selected_file].append({"query": query, "response": response})
+        # Save the query and response for the queried document
+        if file_path not in self.query_histories:
+            self.query_histories[file_path] = []
+        self.query_histories[file_path].append({"query": query, "response": response})
 
-            # Save the query history to a file
-            self.save_query_history(self.selected_file, self.query_histories[self.selected_file])
+        # Save the query history to a file
+        self.save_query_history(file_path, self.query_histories[file_path])
 
-        except Exception as e:
-            QMessageBox.warning(self, "Error", f"Failed to process query: {str(e)}")
-        finally:
-            # Hide the loading indicator
-            self.loading_label.setVisible(False)
+    def stop_query(self):
+        """
+        Stop the running query; the partial answer is kept in the history.
+        """
+        if self.query_task is not None:
+            self.query_task.cancel()
+
+    def handle_query_error(self, error_message):
+        self.loading_label.setVisible(False)
+        self.query_button.setEnabled(True)
+        self.stop_query_button.setVisible(False)
+        QMessageBox.warning(self, "Error", f"Failed to process query: {error_message}")
 
     
     def show_document_context_menu(self, pos, message_frame, content_label):
@@ -897,29 +951,365 @@ class ImageGenerationScreen(QWidget):
                 QMessageBox.information(self, "Download", f"Image saved to {file_path}")
 
 # ------------------- Chat Screen -------------------
-class ChatResponseThread(QThread):
-    response_ready = Signal(str)
+class InferenceTask(QObject):
+    """
+    Qt-facing handle for one request running on the shared asyncio inference engine.
+    No thread is created per request; signals are emitted from the engine loop and
+    delivered on the GUI thread through queued connections.
+    """
+    token_received = Signal(str)  # Incremental text as it streams in
+    response_ready = Signal(str)  # Full text once the stream ends
+    response_stopped = Signal(str)  # Partial text when the user stopped the generation
     error_occurred = Signal(str)
 
-    def __init__(self, model, prompt):
+    def __init__(self, kind, model, payload, **extra):
         super().__init__()
+        self.kind = kind  # "chat" (payload is a message list) or "generate" (payload is a prompt)
         self.model = model
-        self.prompt = prompt
+        self.payload = payload
+        self.extra = extra
+        self.future = None
+        self.result = None  # Engine result (text, stats, cancelled) once finished
+
+    def start(self):
+        engine = get_engine()
+        if self.kind == "chat":
+            self.future = engine.chat(self.model, self.payload, on_token=self.token_received.emit, **self.extra)
+        else:
+            self.future = engine.generate(self.model, self.payload, on_token=self.token_received.emit, **self.extra)
+        self.future.add_done_callback(self.on_done)
+
+    def on_done(self, future):
+        if future.cancelled():
+            return
+        exc = future.exception()
+        if exc is not None:
+            self.error_occurred.emit(describe_error(exc))
+            return
+        result = self.result = future.result()
+        if result["cancelled"]:
+            self.response_stopped.emit(result["text"])
+        else:
+            self.response_ready.emit(result["text"])
+
+    def cancel(self):
+        """Abort the generation; whatever has streamed so far arrives via response_stopped."""
+        if self.isRunning():
+            get_engine().cancel(self.future)
+
+    def isRunning(self):
+        return self.future is not None and not self.future.done()
+
+class ChatGenerationPool:
+    """
+    Global cap on chat replies generating at once across all chats. Used from the GUI
+    thread only; chats waiting for a slot are started in the order they asked.
+    """
+    def __init__(self, limit=MAX_CHAT_GENERATIONS):
+        self.limit = limit
+        self.running = set()
+        self.waiting = deque()  # (owner, start callback)
+
+    def request(self, owner, start):
+        """Run start() now if a slot is free, otherwise when one frees up. Returns True if started."""
+        if len(self.running) < self.limit:
+            self.running.add(owner)
+            start()
+            return True
+        self.waiting.append((owner, start))
+        return False
+
+    def release(self, owner):
+        self.running.discard(owner)
+        while self.waiting and len(self.running) < self.limit:
+            next_owner, start = self.waiting.popleft()
+            self.running.add(next_owner)
+            start()
+
+    def discard(self, owner):
+        """Forget a closed chat: drop its waiting request and free its slot."""
+        self.waiting = deque(item for item in self.waiting if item[0] is not owner)
+        self.release(owner)
+
+_generation_pool = None
+
+def get_generation_pool():
+    global _generation_pool
+    if _generation_pool is None:
+        _generation_pool = ChatGenerationPool()
+    return _generation_pool
+
+class ReasoningSection(QWidget):
+    """
+    Collapsed view of a reply's reasoning trace; hidden until there is reasoning to show.
+    """
+    def __init__(self, text=""):
+        super().__init__()
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.toggle_button = QPushButton("Show reasoning")
+        self.toggle_button.setCheckable(True)
+        self.toggle_button.setFlat(True)
+        self.toggle_button.setStyleSheet("text-align: left; color: gray;")
+        self.toggle_button.toggled.connect(self.set_expanded)
+        self.text_label = QLabel(text)
+        self.text_label.setWordWrap(True)
+        self.text_label.setStyleSheet("font-style: italic; color: gray;")
+        self.text_label.setVisible(False)
+        layout.addWidget(self.toggle_button)
+        layout.addWidget(self.text_label)
+        self.setVisible(bool(text))
+
+    def append_text(self, text):
+        self.text_label.setText(self.text_label.text() + text)
+        self.setVisible(True)
+
+    def set_expanded(self, expanded):
+        self.text_label.setVisible(expanded)
+        self.toggle_button.setText("Hide reasoning" if expanded else "Show reasoning")
+
+class ProvisioningTask(QObject):
+    """
+    Qt-facing handle for a background ModelProvisioner run. Progress is reported from
+    the pull threads and delivered on the GUI thread through queued connections.
+    """
+    progress = Signal(object)  # PullProgress of one model
+    finished = Signal(object)  # PullProgress of every pull
+
+    def __init__(self, provisioner=None):
+        super().__init__()
+        self.provisioner = provisioner or ModelProvisioner()
+
+    def start(self):
+        return self.provisioner.start(self.progress.emit, self.finished.emit)
+
+    def cancel(self):
+        self.provisioner.cancel()
+
+
+class ResidencyRefreshTask(QObject):
+    """
+    Reads the loaded models from every endpoint (/api/ps) on a worker thread, so a slow
+    or unreachable server doesn't freeze the window. finished is delivered on the GUI
+    thread through a queued connection.
+    """
+    finished = Signal()
+
+    def start(self):
+        threading.Thread(target=self.run, name="ResidencyRefresh", daemon=True).start()
 
     def run(self):
-        try:
-            response = generate_ollama_response(self.model, self.prompt)
-            self.response_ready.emit(response)
-        except Exception as e:
-            self.error_occurred.emit(str(e))
+        get_residency_manager().refresh()
+        self.finished.emit()
+
+
+class ModelSetupDialog(QDialog):
+    """
+    Download progress of the models being installed, one bar per model and endpoint.
+    Closing the dialog leaves the downloads running.
+    """
+    def __init__(self, task, parent=None):
+        super().__init__(parent)
+        self.task = task
+        self.setWindowTitle("Installing Models")
+        self.resize(560, 120)
+        self.rows = {}  # (url, model) -> (progress bar, status label)
+        layout = QVBoxLayout(self)
+        self.summary_label = QLabel("Downloading the models NeuroGenius needs...")
+        layout.addWidget(self.summary_label)
+        self.rows_layout = QVBoxLayout()
+        layout.addLayout(self.rows_layout)
+        buttons = QHBoxLayout()
+        buttons.addStretch()
+        self.cancel_button = QPushButton("Stop Downloads")
+        self.cancel_button.clicked.connect(self.cancel)
+        buttons.addWidget(self.cancel_button)
+        close_button = QPushButton("Hide")
+        close_button.clicked.connect(self.hide)
+        buttons.addWidget(close_button)
+        layout.addLayout(buttons)
+
+    def update_progress(self, progress):
+        key = (progress.url, progress.model)
+        if key not in self.rows:
+            row = QHBoxLayout()
+            name = progress.model if len(self.task.provisioner.urls) < 2 else f"{progress.model} ({progress.url})"
+            name_label = QLabel(name)
+            name_label.setMinimumWidth(200)
+            bar = QProgressBar()
+            bar.setRange(0, 1000)
+            status_label = QLabel()
+            status_label.setMinimumWidth(160)
+            row.addWidget(name_label)
+            row.addWidget(bar, 1)
+            row.addWidget(status_label)
+            self.rows_layout.addLayout(row)
+            self.rows[key] = (bar, status_label)
+        bar, status_label = self.rows[key]
+        bar.setValue(int(progress.fraction * 1000))
+        if progress.total:
+            bar.setFormat(f"%p%  {progress.completed / 1024 ** 3:.1f} / {progress.total / 1024 ** 3:.1f} GB")
+        status_label.setText(progress.error or progress.status)
+
+    def show_results(self, results):
+        failed = [progress for progress in results if progress.error]
+        if failed:
+            self.summary_label.setText(
+                f"{len(failed)} of {len(results)} models could not be installed; "
+                "they are retried (and resumed) at the next start."
+            )
+        else:
+            self.summary_label.setText(f"All {len(results)} models are installed.")
+        self.cancel_button.setEnabled(False)
+
+    def cancel(self):
+        self.task.cancel()
+        self.cancel_button.setEnabled(False)
+        self.summary_label.setText("Stopping; downloaded data is kept and resumed next time.")
+
+
+class CompareDialog(QDialog):
+    """
+    Send one prompt to several chat models at once and stream the replies side by side,
+    with each model's time to first token and generation speed. The user can keep one
+    reply; chosen is then (model, answer, reasoning).
+    """
+    def __init__(self, messages, models, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Compare Models")
+        self.resize(1100, 600)
+        self.messages = messages
+        self.models = models  # display name -> Ollama tag
+        self.panes = {}
+        self.chosen = None
+        layout = QVBoxLayout(self)
+
+        selection_layout = QHBoxLayout()
+        self.model_checks = {}
+        for display, model in models.items():
+            check = QCheckBox(display)
+            check.setChecked(True)
+            self.model_checks[model] = check
+            selection_layout.addWidget(check)
+        self.run_button = QPushButton("Run")
+        self.run_button.clicked.connect(self.run)
+        selection_layout.addWidget(self.run_button)
+        layout.addLayout(selection_layout)
+
+        self.panes_layout = QHBoxLayout()
+        layout.addLayout(self.panes_layout, 1)
+
+        # Streamed text is pushed to the panes about once per frame
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setInterval(16)
+        self.flush_timer.timeout.connect(self.flush)
+
+    def run(self):
+        models = [model for model, check in self.model_checks.items() if check.isChecked()]
+        if not models:
+            QMessageBox.warning(self, "No Models", "Select at least one model.")
+            return
+        self.run_button.setEnabled(False)
+        residency = get_residency_manager()
+        for model in models:
+            pane = self.add_pane(model)
+            pane["started"] = time.perf_counter()
+            task = pane["task"] = InferenceTask(
+                "chat", model, self.messages, keep_alive=residency.keep_alive_for(model), priority=PRIORITY_INTERACTIVE
+            )
+            task.token_received.connect(lambda token, model=model: self.handle_token(model, token))
+            task.response_ready.connect(lambda response, model=model: self.handle_done(model, response))
+            task.response_stopped.connect(lambda response, model=model: self.handle_done(model, response))
+            task.error_occurred.connect(lambda error, model=model: self.handle_error(model, error))
+        # All requests go out together; the engine schedules each on its own model
+        for model in models:
+            self.panes[model]["task"].start()
+        self.flush_timer.start()
+
+    def add_pane(self, model):
+        display = next(name for name, tag in self.models.items() if tag == model)
+        frame = QFrame()
+        frame.setFrameShape(QFrame.StyledPanel)
+        pane_layout = QVBoxLayout(frame)
+        title = QLabel(f"{display} ({model})")
+        title.setStyleSheet("font-weight: bold;")
+        stats_label = QLabel("Waiting for the first token...")
+        stats_label.setStyleSheet("color: gray;")
+        text_view = QTextEdit()
+        text_view.setReadOnly(True)
+        keep_button = QPushButton("Keep This Answer")
+        keep_button.setEnabled(False)
+        keep_button.clicked.connect(lambda: self.keep(model))
+        pane_layout.addWidget(title)
+        pane_layout.addWidget(stats_label)
+        pane_layout.addWidget(text_view, 1)
+        pane_layout.addWidget(keep_button)
+        self.panes_layout.addWidget(frame)
+        pane = {
+            "task": None, "started": None, "ttft_ms": None, "parser": ReasoningParser(), "buffer": [],
+            "text": "", "stats_label": stats_label, "text_view": text_view, "keep_button": keep_button,
+            "answer": None, "reasoning": None
+        }
+        self.panes[model] = pane
+        return pane
+
+    def handle_token(self, model, token):
+        pane = self.panes[model]
+        if pane["ttft_ms"] is None:
+            pane["ttft_ms"] = (time.perf_counter() - pane["started"]) * 1000
+            pane["stats_label"].setText(f"TTFT {pane['ttft_ms']:.0f} ms, generating...")
+        answer, _ = pane["parser"].feed(token)
+        if answer:
+            pane["buffer"].append(answer)
+
+    def flush(self):
+        for pane in self.panes.values():
+            if pane["buffer"]:
+                pane["text"] += "".join(pane["buffer"])
+                pane["buffer"].clear()
+                pane["text_view"].setPlainText(pane["text"])
+
+    def handle_done(self, model, response):
+        pane = self.panes[model]
+        pane["answer"], pane["reasoning"] = split_reasoning(response)
+        pane["buffer"].clear()
+        pane["text"] = pane["answer"]
+        pane["text_view"].setPlainText(pane["answer"])
+        stats = pane["task"].result["stats"] if pane["task"].result else {}
+        parts = [f"TTFT {pane['ttft_ms']:.0f} ms" if pane["ttft_ms"] is not None else "no tokens"]
+        if stats.get("eval_count") and stats.get("eval_duration"):
+            parts.append(f"{stats['eval_count'] / (stats['eval_duration'] / 1e9):.1f} tokens/s")
+        parts.append(f"total {(time.perf_counter() - pane['started']):.1f} s")
+        pane["stats_label"].setText(", ".join(parts))
+        pane["keep_button"].setEnabled(bool(pane["answer"]))
+
+    def handle_error(self, model, error_message):
+        self.panes[model]["stats_label"].setText(f"Error: {error_message}")
+
+    def keep(self, model):
+        pane = self.panes[model]
+        self.chosen = (model, pane["answer"], pane["reasoning"])
+        self.accept()
+
+    def done(self, result):
+        # Closing the dialog abandons any reply still streaming
+        self.flush_timer.stop()
+        for pane in self.panes.values():
+            if pane["task"] is not None:
+                pane["task"].cancel()
+        super().done(result)
 
 class ChatScreen(QWidget):
-    def __init__(self, chat_id, user_id, model="mistral:7b"):
+    reply_finished = Signal(str)  # chat_id, emitted when a reply completes (even in the background)
+
+    def __init__(self, chat_id, user_id, model=DEFAULT_CHAT_MODEL):
         super().__init__()
         self.chat_id = chat_id
         self.user_id = user_id
         self.model = model
-        self.messages = []  # Local copy of messages (in addition to DB)
+        self.messages = MessageStore()  # Messages on the active branch (in addition to DB)
+        self.tree = MessageTree()  # Every message of the chat, including other branches
+        self.path_frames = []  # Bubble of each message in self.messages, same order
         self.recognizer = sr.Recognizer()
         self.microphone = sr.Microphone()
         self.is_recording = False
@@ -928,6 +1318,28 @@ class ChatScreen(QWidget):
         self.speech_paused = False
         self.speech_text = ""
         self.speech_position = 0
+        self.response_task = None  # In-flight reply on the inference engine
+        self.response_model = None  # Model writing it (chosen by the router)
+        # Requests waiting for the in-flight reply, see enqueue_request.
+        # One reply runs per chat at a time, so replies arrive in order and each sees the last.
+        self.pending_requests = deque()
+        self.busy = False
+        self.status_text = ""  # Loading label text, shown with the queued message count
+        # Streaming state: tokens are buffered and flushed to the bubble about once per frame
+        self.stream_label = None
+        self.stream_text = ""
+        self.stream_buffer = []
+        self.stream_reasoning_buffer = []
+        self.stream_reasoning = None
+        self.stream_parser = None
+        self.stream_timer = QTimer(self)
+        self.stream_timer.setInterval(16)
+        self.stream_timer.timeout.connect(self.flush_stream_buffer)
+        # Typing-time prefill, sent after a pause in typing (opt-in)
+        self.prefill_timer = QTimer(self)
+        self.prefill_timer.setSingleShot(True)
+        self.prefill_timer.setInterval(PREFILL_DEBOUNCE_MS)
+        self.prefill_timer.timeout.connect(self.prefill_prefix)
         self.initUI()
         self.load_chat_history()
 
@@ -954,22 +1366,32 @@ class ChatScreen(QWidget):
         self.message_input = QLineEdit()
         self.message_input.setPlaceholderText("Type your message here...")
         self.message_input.returnPressed.connect(self.send_message)
+        self.message_input.textChanged.connect(self.schedule_prefill)
         input_layout.addWidget(self.message_input, 3)
         
         self.send_button = QPushButton("Send")
         self.send_button.clicked.connect(self.send_message)
         input_layout.addWidget(self.send_button, 0)
+
+        self.compare_button = QPushButton("Compare")
+        self.compare_button.setToolTip("Send this message to several models and keep the best answer")
+        self.compare_button.clicked.connect(self.compare_models)
+        input_layout.addWidget(self.compare_button, 0)
+
+        self.stop_button = QPushButton("Stop")
+        self.stop_button.clicked.connect(self.stop_generation)
+        self.stop_button.setVisible(False)
+        input_layout.addWidget(self.stop_button, 0)
         
         self.model_combo = QComboBox()
-        self.models = {
-            "NeuroGenius": "llama2:7b",
-            "NeuroGenius1": "mistral:7b",
-            "NeuroGenius2": "deepseek-r1:7b"
-        }
+        self.models = CHAT_MODELS
         for display, model in self.models.items():
             self.model_combo.addItem(display, model)
-        # Set default index (e.g., NeuroGenius1)
-        self.model_combo.setCurrentIndex(1)
+        self.model_combo.addItem("Auto (fastest fit)", AUTO_MODEL)
+        # Select the chat's model (defaults to NeuroGenius1)
+        index = self.model_combo.findData(self.model)
+        self.model_combo.setCurrentIndex(index if index >= 0 else 1)
+        self.model_combo.currentIndexChanged.connect(self.change_model)
         input_layout.addWidget(QLabel("Model:"), 0)
         input_layout.addWidget(self.model_combo, 1)
         
@@ -980,6 +1402,18 @@ class ChatScreen(QWidget):
         main_layout.addLayout(input_layout)
         self.setLayout(main_layout)
 
+    def change_model(self, index):
+        """
+        Switch the chat to the selected model and start loading it in the background.
+        """
+        model = self.model_combo.itemData(index)
+        if not model or model == self.model:
+            return
+        self.model = model
+        update_chat_model(self.chat_id, model)
+        if model != AUTO_MODEL:
+            get_residency_manager().warm(model)
+
     def toggle_recording(self):
         if self.is_recording:
             self.stop_recording()
@@ -1009,9 +1443,24 @@ class ChatScreen(QWidget):
             message_history = get_messages(self.chat_id)
             if message_history:
                 for msg in message_history:
-                    self.messages.append({"role": msg["role"], "content": msg["content"]})
-                    sender = "You" if msg["role"] == "user" else "NeuroGenius GPT"
-                    self.append_message(sender, msg["content"], suppress_db=True)
+                    content, reasoning, tokens = msg["content"], msg["reasoning"], msg["token_count"]
+                    if msg["role"] == "assistant" and reasoning is None:
+                        # Replies stored before reasoning was split out may still carry <think> blocks
+                        content, reasoning = split_reasoning(msg["content"])
+                        if reasoning:
+                            tokens = None
+                    if reasoning and INCLUDE_REASONING:
+                        tokens = None
+                    self.tree.add(MessageNode(
+                        msg["id"], msg["parent_id"], msg["role"], content, reasoning or None, tokens, msg["model"]
+                    ))
+                # Show the branch the chat was last on (the newest message for older chats)
+                leaf = get_active_message(self.chat_id)
+                if leaf not in self.tree.nodes:
+                    leaf = message_history[-1]["id"]
+                for node in self.tree.path(self.tree.select(leaf)):
+                    self.add_to_store(node)
+                    self.render_message(node)
                 QTimer.singleShot(100, lambda: self.scroll_area.verticalScrollBar().setValue(
                     self.scroll_area.verticalScrollBar().maximum()))
         except Exception as e:
@@ -1022,45 +1471,390 @@ class ChatScreen(QWidget):
         if not user_input:
             return
 
-        # Append the user's message to the chat interface
-        self.append_message("You", user_input)
+        self.prefill_timer.stop()
+
+        # Queue the message behind any reply this chat is still waiting for. Its bubble is
+        # added when the request starts, so the view shows the order the history is saved in.
+        self.enqueue_request("chat", user_input)
+
+    # ------------------- Message tree -------------------
+
+    def add_to_store(self, node):
+        """Put a stored message at the end of the active branch's prompt store."""
+        tokens = None if node.reasoning and INCLUDE_REASONING else node.tokens
+        return self.messages.append(node.role, prompt_content(node.content, node.reasoning), tokens, id=node.id)
+
+    def persist_message(self, role, content, reasoning=None, model=None):
+        """
+        Append a new message to the active branch: prompt store, database (as a child of
+        the branch's last message) and tree. model is the model that wrote a reply.
+        Returns the tree node.
+        """
+        parent_id = self.messages[-1].id if len(self.messages) else None
+        message = self.messages.append(role, prompt_content(content, reasoning))
+        tokens = None if reasoning and INCLUDE_REASONING else message.tokens
+        message.id = insert_message(
+            self.chat_id, role, content, token_count=tokens, reasoning=reasoning or None, parent_id=parent_id,
+            model=model
+        )
+        return self.tree.add(MessageNode(message.id, parent_id, role, content, reasoning or None, tokens, model))
+
+    def render_message(self, node):
+        sender = "You" if node.role == "user" else "NeuroGenius GPT"
+        content_label = self.append_message(sender, node.content, suppress_db=True, reasoning=node.reasoning)
+        if node.model:
+            content_label.parentWidget().setToolTip(f"Answered by {node.model}")
+        return self.attach_frame(content_label.parentWidget(), node)
 
-        # Show the loading indicator
+    def attach_frame(self, frame, node):
+        """
+        Register a bubble as showing node; alternatives of the message get a branch switcher.
+        """
+        self.path_frames.append(frame)
+        siblings = self.tree.siblings(node.id)
+        if len(siblings) > 1:
+            branch_layout = QHBoxLayout()
+            previous_button = QPushButton("◀")
+            next_button = QPushButton("▶")
+            for button in (previous_button, next_button):
+                button.setFlat(True)
+                button.setFixedWidth(28)
+            previous_button.clicked.connect(lambda: self.switch_branch(node.id, -1))
+            next_button.clicked.connect(lambda: self.switch_branch(node.id, 1))
+            position_label = QLabel(f"{siblings.index(node.id) + 1} / {len(siblings)}")
+            position_label.setStyleSheet("color: gray;")
+            branch_layout.addWidget(previous_button)
+            branch_layout.addWidget(position_label)
+            branch_layout.addWidget(next_button)
+            branch_layout.addStretch()
+            frame.layout().addLayout(branch_layout)
+        return frame
+
+    def truncate_branch(self, index):
+        """Drop messages from index on from the view and the prompt store (not from the database)."""
+        self.messages.truncate(index)
+        for frame in self.path_frames[index:]:
+            self.messages_layout.removeWidget(frame)
+            frame.deleteLater()
+        del self.path_frames[index:]
+
+    def switch_branch(self, node_id, step):
+        """
+        Show the previous or next alternative of a message, continuing down the branch
+        last used below it. Only the part after the fork is rebuilt, from memory.
+        """
+        if self.busy:
+            QMessageBox.information(self, "Reply Running", "Please wait for the current reply to finish.")
+            return
+        siblings = self.tree.siblings(node_id)
+        target = siblings[(siblings.index(node_id) + step) % len(siblings)]
+        leaf = self.tree.select(target)
+        path = self.tree.path(leaf)
+        index = next(position for position, node in enumerate(path) if node.id == target)
+        self.truncate_branch(index)
+        for node in path[index:]:
+            self.add_to_store(node)
+            self.render_message(node)
+        set_active_message(self.chat_id, leaf)
+
+    def compare_models(self):
+        """
+        Run the typed message against several models side by side; the kept answer
+        joins the chat history as a normal reply.
+        """
+        user_input = self.message_input.text().strip()
+        if not user_input:
+            return
+        if self.busy:
+            QMessageBox.information(self, "Reply Running", "Please wait for the current reply to finish.")
+            return
+        self.prefill_timer.stop()
+
+        # The history as the next send would assemble it, plus the new message
+        question = {"role": "user", "content": user_input}
+        summary = get_summarizer().current(self.chat_id, self.messages)
+        budget = context_budget(self.model) - count_tokens(user_input)
+        if summary:
+            history, _ = build_context(
+                self.messages, self.model, system_prompt=summary_system_prompt(summary["summary"]),
+                budget=budget, start=summary["covered_messages"]
+            )
+        else:
+            history, _ = build_context(self.messages, self.model, budget=budget)
+        dialog = CompareDialog(history + [question], self.models, self)
+        if dialog.exec() != QDialog.Accepted or dialog.chosen is None:
+            return
+
+        model, answer, reasoning = dialog.chosen
+        log_user_action(self.user_id, "Compared models", f"Chat ID: {self.chat_id}, kept: {model}")
+        self.render_message(self.persist_message("user", user_input))
+        self.render_message(self.persist_message("assistant", answer, reasoning, model))
+        get_summarizer().maybe_update(self.chat_id, self.messages)
+
+    def enqueue_request(self, kind, text=None):
+        """
+        Queue a request: ("chat", user text) sends a new message, ("reply",) answers the
+        current branch as it stands (after an edit or for a regeneration).
+        """
+        self.pending_requests.append((kind, text))
+        if not self.busy:
+            self.dispatch_next_request()
+        else:
+            self.show_status()
+
+    def show_status(self, text=None):
+        """Show text (default: the current status) with the number of messages still queued."""
+        if text is not None:
+            self.status_text = text
+        queued = sum(1 for kind, _ in self.pending_requests if kind == "chat")
+        suffix = f" ({queued} more message{'s' if queued > 1 else ''} queued)" if queued else ""
+        self.loading_label.setText(self.status_text + suffix)
+
+    def dispatch_next_request(self):
+        """
+        Start the next queued request once the global generation cap allows it.
+        """
+        if not self.pending_requests:
+            self.busy = False
+            self.loading_label.setVisible(False)
+            return
+        self.busy = True
+        self.show_status("Waiting for other chats to finish...")
         self.loading_label.setVisible(True)
+        get_generation_pool().request(self, self.start_next_request)
+
+    def start_next_request(self):
+        if not self.pending_requests:
+            # Everything queued was deleted while this chat waited for a slot
+            get_generation_pool().release(self)
+            self.dispatch_next_request()
+            return
+        kind, text = self.pending_requests.popleft()
+        if kind == "chat":
+            # Add the user's message to the active branch and persist it, so a
+            # reopened chat sends the same message prefix
+            self.render_message(self.persist_message("user", text))
+
+        # Send the conversation as structured role messages. An edit or regeneration
+        # sends the unchanged history before it first, so Ollama reuses that prefix.
+        chat_messages, report = self.context_messages()
+
+        # Let the router pick the model: Auto takes the smallest one that answers in time,
+        # a chosen model only gives way to a faster one while it is cold or busy
+        last = len(self.messages) - 1
+        decision = self.route_request(report, self.messages.tokens_between(last, last + 1))
+        if decision.model != self.model:
+            chat_messages, report = self.context_messages(decision.model)
+        status = "NeuroGenius is thinking..."
+        if decision.rerouted and self.model != AUTO_MODEL:
+            status += f" (answering with {decision.model}: {decision.reason})"
+        if report.dropped_messages:
+            status += (f" ({report.dropped_messages} older messages, "
+                       f"{report.dropped_tokens} tokens left out of the context)")
+        self.show_status(status)
+
+        # Run the generation on the shared inference engine
+        self.start_response("chat", chat_messages, decision.model)
+
+    def finish_request(self, completed=False):
+        """
+        Free this chat's generation slot and move on to its next queued request.
+        completed marks a reply that finished on its own (not failed or stopped).
+        """
+        get_generation_pool().release(self)
+        if completed:
+            self.reply_finished.emit(self.chat_id)
+        self.dispatch_next_request()
+
+    def shutdown(self):
+        """
+        Stop generating for a chat that is being closed.
+        """
+        self.pending_requests.clear()
+        self.busy = False
+        if self.response_task is not None:
+            self.response_task.cancel()
+        get_generation_pool().discard(self)
+
+    def context_messages(self, model=None):
+        """
+        The /api/chat message list for the current history: the rolling summary of older
+        turns plus the recent ones, trimmed from the oldest end to fit the context window
+        of model (default: the chat's model).
+        """
+        model = model or self.model
+        summary = get_summarizer().current(self.chat_id, self.messages)
+        if summary:
+            return build_context(
+                self.messages, model, system_prompt=summary_system_prompt(summary["summary"]),
+                start=summary["covered_messages"]
+            )
+        return build_context(self.messages, model)
+
+    def route_request(self, report, new_tokens=0):
+        """
+        Route a request whose context is report. The model that answered this chat last
+        still holds the conversation in its KV cache, all but the newest new_tokens.
+        """
+        cached = {}
+        if self.response_model is not None:
+            cached[self.response_model] = max(0, report.used_tokens - new_tokens)
+        return get_router().route(self.model, report.used_tokens, cached=cached)
 
-        # Prepare the input for the model
-        chat_history = "\n".join(
-            [f"You: {msg['content']}" if msg['role'] == "user" else f"AI: {msg['content']}" for msg in self.messages]
+    def schedule_prefill(self, text):
+        """
+        Restart the prefill debounce while the user types (only when prefill is enabled).
+        """
+        if not get_prefiller().enabled or not text.strip():
+            self.prefill_timer.stop()
+            return
+        self.prefill_timer.start()
+
+    def prefill_prefix(self):
+        """
+        Let Ollama evaluate the conversation so far while the user finishes typing.
+        """
+        if self.busy:
+            return
+        chat_messages, report = self.context_messages()
+        # Prefill the model the send is likely to be routed to
+        model = self.route_request(report).model
+        if model != self.model:
+            chat_messages, _ = self.context_messages(model)
+        get_prefiller().prefill(
+            self.chat_id, model, chat_messages, get_residency_manager().current_keep_alive(model)
         )
-        input_text = f"{chat_history}\nYou: {user_input}"
 
-        # Start the background thread for response generation
-        self.response_thread = ChatResponseThread(self.model, input_text)
-        self.response_thread.response_ready.connect(self.display_response)
-        self.response_thread.error_occurred.connect(self.handle_response_error)
-        self.response_thread.start()
+    def start_response(self, kind, payload, model=None):
+        """
+        Start a streamed reply on the inference engine at interactive priority, with
+        model (default: the chat's model).
+        """
+        model = model or self.model
+        self.response_model = model
+        get_prefiller().yield_to_interactive(model, self.chat_id)
+        self.response_task = InferenceTask(
+            kind, model, payload, keep_alive=get_residency_manager().keep_alive_for(model),
+            priority=PRIORITY_INTERACTIVE
+        )
+        self.response_task.token_received.connect(self.handle_response_token)
+        self.response_task.response_ready.connect(self.display_response)
+        self.response_task.response_stopped.connect(self.display_partial_response)
+        self.response_task.error_occurred.connect(self.handle_response_error)
+        # Reserve the reply bubble now, so messages queued meanwhile appear after it;
+        # it stays hidden until the first token arrives
+        self.stream_text = ""
+        self.stream_parser = ReasoningParser()
+        self.stream_label = self.append_message("NeuroGenius GPT", "", reasoning="")
+        self.stream_label.parentWidget().setVisible(False)
+        self.stream_label.parentWidget().setToolTip(f"Answered by {model}")
+        self.stream_reasoning = self.stream_label.parentWidget().findChild(ReasoningSection)
+        self.response_task.start()
+        self.stop_button.setVisible(True)
+
+    def handle_response_token(self, token):
+        """
+        Buffer a streamed token; the first one reveals the reply bubble. Reasoning
+        (<think> blocks) is split off into the bubble's collapsed reasoning section.
+        """
+        if self.stream_label is None:
+            return
+        if not self.stream_timer.isActive():
+            self.loading_label.setVisible(False)
+            self.stream_label.parentWidget().setVisible(True)
+            self.stream_timer.start()
+        answer, reasoning = self.stream_parser.feed(token)
+        if answer:
+            self.stream_buffer.append(answer)
+        if reasoning:
+            self.stream_reasoning_buffer.append(reasoning)
+
+    def flush_stream_buffer(self):
+        """
+        Push buffered tokens into the reply bubble (one UI update per timer tick).
+        """
+        if self.stream_label is None or not (self.stream_buffer or self.stream_reasoning_buffer):
+            return
+        if self.stream_reasoning_buffer:
+            self.stream_reasoning.append_text("".join(self.stream_reasoning_buffer))
+            self.stream_reasoning_buffer.clear()
+        if self.stream_buffer:
+            self.stream_text += "".join(self.stream_buffer)
+            self.stream_buffer.clear()
+            self.stream_label.setText(self.stream_text)
+        scroll_bar = self.scroll_area.verticalScrollBar()
+        scroll_bar.setValue(scroll_bar.maximum())
+
+    def finish_stream(self, answer=None):
+        self.stream_timer.stop()
+        self.flush_stream_buffer()
+        frame = self.stream_label.parentWidget()
+        if answer is not None:
+            # The final text, split from the full reply, replaces what was streamed
+            self.stream_label.setText(answer)
+            frame.setVisible(True)
+        elif not self.stream_text:
+            # Nothing arrived: drop the reserved bubble
+            self.messages_layout.removeWidget(frame)
+            frame.deleteLater()
+        self.stream_label = None
+        self.stream_reasoning = None
+        self.stream_parser = None
+        self.stream_text = ""
+
+    def stop_generation(self):
+        """
+        Stop the in-flight reply; the text received so far is kept as a partial message.
+        """
+        if self.response_task is not None:
+            self.response_task.cancel()
 
-        # Add the user's message to the local message list
-        self.messages.append({"role": "user", "content": user_input})
+    def display_partial_response(self, response):
+        if response:
+            self.display_response(response, completed=False)
+        else:
+            self.loading_label.setVisible(False)
+            self.stop_button.setVisible(False)
+            if self.stream_label is not None:
+                self.finish_stream()
+            self.finish_request()
 
-    def display_response(self, response):
+    def display_response(self, response, completed=True):
         # Hide the loading indicator
         self.loading_label.setVisible(False)
+        self.stop_button.setVisible(False)
 
-        # Append the AI's response to the chat interface
-        self.append_message("NeuroGenius GPT", response)
+        # Keep the reasoning trace apart from the answer; only the answer goes into later prompts
+        answer, reasoning = split_reasoning(response)
 
-        # Add the AI's response to the local message list
-        self.messages.append({"role": "assistant", "content": response})
+        # Finalize the streamed bubble, or create one if nothing was streamed
+        if self.stream_label is not None:
+            frame = self.stream_label.parentWidget()
+            self.finish_stream(answer)
+        else:
+            frame = self.append_message("NeuroGenius GPT", answer, reasoning=reasoning or None).parentWidget()
 
-        # Save the message to the database
-        insert_message(self.chat_id, "assistant", response)
+        # Measure what a typing-time prefill saved on this reply's prompt evaluation
+        if self.response_task is not None and self.response_task.result:
+            get_prefiller().record_reply(self.chat_id, self.response_task.result["stats"])
+
+        # Add the AI's response to the active branch and save it to the database
+        self.attach_frame(frame, self.persist_message("assistant", answer, reasoning, self.response_model))
+
+        # Fold older turns into the chat's summary in the background once enough have piled up
+        get_summarizer().maybe_update(self.chat_id, self.messages)
+
+        self.finish_request(completed)
 
     def handle_response_error(self, error_message):
         self.loading_label.setVisible(False)
+        self.stop_button.setVisible(False)
+        if self.stream_label is not None:
+            self.finish_stream()
+        self.finish_request()
         QMessageBox.warning(self, "Error", f"Failed to generate response: {error_message}")
 
-    def append_message(self, sender, message, suppress_db=False):
+    def append_message(self, sender, message, suppress_db=False, reasoning=None):
         message_frame = QFrame()
         message_frame.setFrameShape(QFrame.StyledPanel)
         if sender == "You":
@@ -1078,6 +1872,8 @@ class ChatScreen(QWidget):
         content_layout.addWidget(content_label)
         
         layout.addWidget(sender_label)
+        if reasoning is not None:
+            layout.addWidget(ReasoningSection(reasoning))
         layout.addLayout(content_layout)
 
         # Set context menu policy for the message frame
@@ -1085,6 +1881,7 @@ class ChatScreen(QWidget):
         message_frame.customContextMenuRequested.connect(lambda pos: self.show_message_context_menu(pos, message_frame, content_label))
 
         self.messages_layout.insertWidget(self.messages_layout.count() - 1, message_frame)
+        return content_label
 
     def show_message_context_menu(self, pos, message_frame, content_label):
         menu = QMenu()
@@ -1094,6 +1891,11 @@ class ChatScreen(QWidget):
         edit_action.triggered.connect(lambda: self.edit_chat_message(message_frame, content_label))
         menu.addAction(edit_action)
 
+        if message_frame in self.path_frames and self.messages[self.path_frames.index(message_frame)].role == "assistant":
+            regenerate_action = QAction("Regenerate", self)
+            regenerate_action.triggered.connect(lambda: self.regenerate_message(message_frame))
+            menu.addAction(regenerate_action)
+
         copy_action = QAction(QIcon("assets/copy_icon.png"), "Copy", self)
         copy_action.triggered.connect(lambda: self.copy_chat_message(content_label.text()))
         menu.addAction(copy_action)
@@ -1119,21 +1921,36 @@ class ChatScreen(QWidget):
 
     def edit_chat_message(self, message_frame, content_label):
         """
-        Edit the content of a chat message.
+        Edit the content of a chat message. The edit is saved as a new branch next to
+        the original; editing a user message regenerates the reply from the full
+        history up to it.
         """
+        if message_frame not in self.path_frames:
+            return  # Still queued, not part of the history yet
+        if self.busy:
+            QMessageBox.information(self, "Reply Running", "Please wait for the current reply to finish.")
+            return
         original_text = content_label.text()
         new_text, ok = QInputDialog.getText(self, "Edit Message", "Edit your message:", text=original_text)
-        if ok and new_text:
-            content_label.setText(new_text)
-            # Update the message in the local list and database if necessary
-            for message in self.messages:
-                if message["content"] == original_text:
-                    message["content"] = new_text
-                    break
-            # Regenerate the response based on the edited prompt
-            response = generate_ollama_response(self.model, new_text)
-            self.append_message("NeuroGenius GPT", response)
-            insert_message(self.chat_id, "assistant", response)
+        if ok and new_text and new_text != original_text:
+            index = self.path_frames.index(message_frame)
+            role = self.messages[index].role
+            self.truncate_branch(index)
+            self.render_message(self.persist_message(role, new_text))
+            if role == "user":
+                self.enqueue_request("reply")
+
+    def regenerate_message(self, message_frame):
+        """
+        Ask for a new reply in place of this one; the old reply stays available as a branch.
+        """
+        if message_frame not in self.path_frames:
+            return
+        if self.busy:
+            QMessageBox.information(self, "Reply Running", "Please wait for the current reply to finish.")
+            return
+        self.truncate_branch(self.path_frames.index(message_frame))
+        self.enqueue_request("reply")
 
 
     def copy_chat_message(self, text):
@@ -1148,6 +1965,10 @@ class ChatScreen(QWidget):
         """
         Delete a chat message from the chat interface.
         """
+        if message_frame in self.path_frames:
+            # Part of the history the bubbles are indexed by: hide it instead
+            message_frame.setVisible(False)
+            return
         self.messages_layout.removeWidget(message_frame)
         message_frame.deleteLater()
         # Remove the message from the local list and database if necessary
@@ -1177,7 +1998,7 @@ class ChatScreen(QWidget):
         QMessageBox.information(self, "Download", f"Message downloaded as {filename}")
 
     def get_chat_history(self):
-        return self.messages
+        return self.messages.as_dicts()
     
     def on_speech_finished(self, name, completed):
         """
@@ -1199,6 +2020,10 @@ class MainWindow(QWidget):
         self.setWindowTitle("NeuroGenius GPT - Dashboard")
         self.chats = {}  # Dictionary: chat_id -> {"name": str, "model": str, "widget": ChatScreen}
         self.current_chat_id = None
+        self.unread = {}  # chat_id -> replies finished while the chat was not shown
+        self.provisioning = None  # ProvisioningTask while models are being installed
+        self.model_status_task = None  # ResidencyRefreshTask while the model status is being read
+        self.model_setup_dialog = None
         self.initUI()
 
     def initUI(self):
@@ -1224,14 +2049,30 @@ class MainWindow(QWidget):
         profile_action = QAction("Profile", self)
         subscribe_action = QAction("Subscribe", self)
         history_action = QAction("History", self)
+        models_action = QAction("Loaded Models", self)
+        prefill_action = QAction("Prefill While Typing", self)
+        prefill_action.setCheckable(True)
+        prefill_action.setChecked(get_prefiller().enabled)
+        prefill_action.toggled.connect(self.set_prefill_enabled)
+        seed_action = QAction("Reproducible Document Answers", self)
+        seed_action.setCheckable(True)
+        seed_action.setChecked(get_document_sessions().seed is not None)
+        seed_action.toggled.connect(self.set_document_seed_enabled)
+        install_action = QAction("Install Missing Models", self)
+        install_action.triggered.connect(self.start_provisioning)
         logout_action = QAction("Logout", self)
         profile_action.triggered.connect(self.open_profile)
         subscribe_action.triggered.connect(self.open_subscription)
         history_action.triggered.connect(self.open_history)
+        models_action.triggered.connect(self.open_model_status)
         logout_action.triggered.connect(self.handle_logout)
         menu.addAction(profile_action)
         menu.addAction(subscribe_action)
         menu.addAction(history_action)
+        menu.addAction(models_action)
+        menu.addAction(prefill_action)
+        menu.addAction(seed_action)
+        menu.addAction(install_action)
         menu.addSeparator()
         menu.addAction(logout_action)
         self.menu_button.setMenu(menu)
@@ -1348,6 +2189,15 @@ class MainWindow(QWidget):
         log_user_action(user_id, "Logged in", f"Username: {username}")
         self.load_user_chats()
 
+        # Load the current chat's model in the background so the first reply skips the cold start
+        residency = get_residency_manager()
+        residency.start()
+        if self.current_chat_id in self.chats and self.chats[self.current_chat_id]["model"] != AUTO_MODEL:
+            residency.warm(self.chats[self.current_chat_id]["model"])
+        # Discover installed models for the router, and install any that are missing
+        get_router().refresh_async()
+        self.start_provisioning()
+
         # Initialize DocumentScreen only if username is valid
         if self.username:
             self.document_page = DocumentScreen(self.username)
@@ -1378,7 +2228,10 @@ class MainWindow(QWidget):
 
     def load_user_chats(self):
         # Clear current chats and UI list
+        for chat in self.chats.values():
+            chat["widget"].shutdown()
         self.chats = {}
+        self.unread = {}
         self.chat_list.clear()
         while self.chat_stack.count() > 0:
             widget = self.chat_stack.widget(0)
@@ -1391,6 +2244,7 @@ class MainWindow(QWidget):
                 chat_name = chat["name"]
                 model = chat["model"]
                 chat_widget = ChatScreen(chat_id, self.user_id, model)
+                chat_widget.reply_finished.connect(self.mark_chat_unread)
                 self.chats[chat_id] = {"name": chat_name, "model": model, "widget": chat_widget}
                 self.chat_stack.addWidget(chat_widget)
                 item = QListWidgetItem(chat_name)
@@ -1406,9 +2260,10 @@ class MainWindow(QWidget):
     def create_new_chat(self):
         chat_id = str(uuid.uuid4())
         chat_name = f"Chat {len(self.chats) + 1}"
-        model = "mistral:7b"
+        model = DEFAULT_CHAT_MODEL
         create_chat(self.user_id, chat_id, chat_name, model)
         chat_widget = ChatScreen(chat_id, self.user_id, model)
+        chat_widget.reply_finished.connect(self.mark_chat_unread)
         self.chats[chat_id] = {"name": chat_name, "model": model, "widget": chat_widget}
         self.chat_stack.addWidget(chat_widget)
         item = QListWidgetItem(chat_name)
@@ -1424,6 +2279,36 @@ class MainWindow(QWidget):
         if chat_id in self.chats:
             self.current_chat_id = chat_id
             self.chat_stack.setCurrentWidget(self.chats[chat_id]["widget"])
+            if self.unread.pop(chat_id, None):
+                self.refresh_chat_item(chat_id)
+            if self.chats[chat_id]["widget"].model != AUTO_MODEL:
+                get_residency_manager().warm(self.chats[chat_id]["widget"].model)
+
+    def mark_chat_unread(self, chat_id):
+        """
+        Badge a chat whose reply finished while the user was looking at something else.
+        """
+        if chat_id not in self.chats:
+            return
+        if chat_id == self.current_chat_id and self.chats[chat_id]["widget"].isVisible():
+            return
+        self.unread[chat_id] = self.unread.get(chat_id, 0) + 1
+        self.refresh_chat_item(chat_id)
+
+    def refresh_chat_item(self, chat_id):
+        """
+        Show the chat's name in the sidebar, with an unread badge and bold text if it has unread replies.
+        """
+        for i in range(self.chat_list.count()):
+            item = self.chat_list.item(i)
+            if item.data(Qt.ItemDataRole.UserRole) == chat_id:
+                count = self.unread.get(chat_id, 0)
+                name = self.chats[chat_id]["name"]
+                item.setText(f"{name}  ({count} new)" if count else name)
+                font = item.font()
+                font.setBold(bool(count))
+                item.setFont(font)
+                break
 
     def download_chat(self, chat_id):
         """
@@ -1464,16 +2349,14 @@ class MainWindow(QWidget):
         if ok and new_name:
             update_chat_name(chat_id, new_name)
             self.chats[chat_id]["name"] = new_name
-            for i in range(self.chat_list.count()):
-                item = self.chat_list.item(i)
-                if item.data(Qt.ItemDataRole.UserRole) == chat_id:
-                    item.setText(new_name)
-                    break
+            self.refresh_chat_item(chat_id)
 
     def delete_chat(self, chat_id):  # Corrected import path
         if chat_id in self.chats:
             delete_chat(chat_id)
             widget = self.chats[chat_id]["widget"]
+            widget.shutdown()
+            self.unread.pop(chat_id, None)
             self.chat_stack.removeWidget(widget)
             widget.deleteLater()
             for i in range(self.chat_list.count()):
@@ -1578,6 +2461,109 @@ class MainWindow(QWidget):
         dialog = SubscriptionDialog(self)
         dialog.exec()
 
+    def set_prefill_enabled(self, enabled):
+        get_prefiller().enabled = enabled
+
+    def set_document_seed_enabled(self, enabled):
+        # A fixed seed makes document answers reproducible, and repeated questions cached
+        get_document_sessions().seed = DEFAULT_DOCUMENT_QUERY_SEED if enabled else None
+
+    def start_provisioning(self):
+        """
+        Check the required models against every endpoint in the background and pull the
+        missing ones; the progress dialog only appears when something is downloaded.
+        """
+        if self.provisioning is not None:
+            if self.model_setup_dialog is not None:
+                self.model_setup_dialog.show()
+            return
+        self.provisioning = ProvisioningTask()
+        self.provisioning.progress.connect(self.show_provisioning_progress)
+        self.provisioning.finished.connect(self.provisioning_finished)
+        self.provisioning.start()
+
+    def show_provisioning_progress(self, progress):
+        if self.model_setup_dialog is None:
+            self.model_setup_dialog = ModelSetupDialog(self.provisioning, self)
+            self.model_setup_dialog.show()
+        self.model_setup_dialog.update_progress(progress)
+
+    def provisioning_finished(self, results):
+        self.provisioning = None
+        if self.model_setup_dialog is not None:
+            self.model_setup_dialog.show_results(results)
+            self.model_setup_dialog = None
+        if any(not progress.error for progress in results):
+            get_router().refresh_async(force=True)
+
+    def open_model_status(self):
+        """
+        Show which Ollama models are loaded (hot), pinned, and how often they were used.
+        The loaded set is refreshed in the background and the report shown once it is in.
+        """
+        if self.model_status_task is not None:
+            return  # Already on its way
+        task = self.model_status_task = ResidencyRefreshTask()
+        task.finished.connect(self.show_model_status)
+        task.start()
+
+    def show_model_status(self):
+        self.model_status_task = None
+        lines = []
+        for entry in get_residency_manager().status():
+            state = "hot" if entry["hot"] else "cold"
+            if entry["pinned"]:
+                state += ", pinned"
+            size_gb = entry["size"] / 1024 ** 3
+            lines.append(f"{entry['model']}: {state}, {size_gb:.1f} GB, {entry['uses']} requests")
+        engine = get_engine()
+        lines.append("")
+        for endpoint in engine.endpoints.status():
+            health = "healthy" if endpoint["healthy"] else "unreachable"
+            lines.append(
+                f"{endpoint['url']}: {health}, {endpoint['outstanding']} in flight, "
+                f"loaded: {', '.join(endpoint['loaded']) or 'none'}"
+            )
+        queues = engine.scheduler.stats()
+        if queues:
+            lines.append("")
+            for model, queue in queues.items():
+                lines.append(
+                    f"{model}: {queue['in_flight']}/{queue['max_in_flight']} running, {queue['queued']} queued, "
+                    f"wait avg {queue['wait_ms_avg']:.0f} ms / p95 {queue['wait_ms_p95']:.0f} ms"
+                )
+        for model, latency in engine.latency.stats().items():
+            if latency["samples"]:
+                lines.append(
+                    f"{model}: TTFT p50 {latency['ttft_p50_ms']:.0f} ms / p95 {latency['ttft_p95_ms']:.0f} ms, "
+                    f"{latency['tokens_per_s_p50'] or 0:.1f} tokens/s"
+                )
+        routed = get_router().status()
+        if routed:
+            lines.append("")
+            for entry in routed:
+                kind = "vision" if entry["vision"] else "chat" if entry["chat"] else "embedding"
+                lines.append(
+                    f"{entry['model']}: {kind}, {entry['parameters'] or '?'}B {entry['quantization'] or ''}, "
+                    f"context {entry['context_length'] or '?'}, ~{entry['estimate_ms']:.0f} ms to first token"
+                )
+        prefill = get_prefiller().stats()
+        if prefill["sent"] or prefill["skipped"]:
+            lines.append("")
+            lines.append(
+                f"Prefill: {prefill['sent']} sent, {prefill['skipped']} skipped, {prefill['cancelled']} cancelled, "
+                f"{prefill['reused']} reused by the reply (~{prefill['saved_ms']:.0f} ms saved), {prefill['missed']} missed"
+            )
+        documents = [entry for entry in get_document_sessions().stats() if entry["queries"]]
+        if documents:
+            lines.append("")
+            for entry in documents:
+                lines.append(
+                    f"{os.path.basename(entry['file_path'])} ({entry['model']}): {entry['queries']} queries, "
+                    f"~{entry['saved_ms']:.0f} ms prompt evaluation saved by prefix reuse"
+                )
+        QMessageBox.information(self, "Loaded Models", "\n".join(lines) if lines else "No models loaded.")
+
     def open_history(self):
         class HistoryDialog(QDialog):
             def __init__(self, user_id, parent=None):
@@ -1660,14 +2646,19 @@ class MainWindow(QWidget):
         """
         Ensure all threads are stopped before the window is closed.
         """
-        if hasattr(self, 'response_thread') and self.response_thread.isRunning():
-            self.response_thread.quit()
-            self.response_thread.wait()
-
         if hasattr(self, 'processor_thread') and self.processor_thread.isRunning():
             self.processor_thread.quit()
             self.processor_thread.wait()
 
+        residency = get_residency_manager()
+        residency.stop()
+        residency.release()
+        get_summarizer().stop()
+        if self.provisioning is not None:
+            self.provisioning.cancel()
+        shutdown_engine()
+        close_clients()
+        close_connections()
         event.accept()
 
 # ------------------- End of MainWindow -------------------